@@ -0,0 +1,207 @@
+"""In-process stand-in for the parts of twikit.Client the scraper uses.
+
+Bookmarks, thread parents and media URLs are generated deterministically
+from a seed, so two runs with the same settings do identical work.
+"""
+
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
+
+import httpx
+from twikit.errors import TooManyRequests, TweetNotAvailable
+
+# Bookmark IDs count down from here (newest first, like the real timeline)
+_FIRST_ID = 1_800_000_000_000_000_000
+# Thread parents live in a separate ID range
+_PARENT_BASE = 1_000_000_000_000_000_000
+# Budget reported when no rate limit is configured. Without headers the
+# scraper's limiter would pace itself to Twitter's real 15-minute budgets.
+_UNLIMITED = 1_000_000
+
+
+@dataclass
+class ApiSettings:
+    bookmarks: int = 1000
+    page_size: int = 20
+    latency: float = 0.0           # seconds per API call
+    rate_limit: int = 0            # calls per window per endpoint, 0 = unlimited
+    rate_window: float = 60.0      # seconds
+    reply_ratio: float = 0.3       # share of bookmarks that are replies
+    thread_depth: int = 3          # parents above each reply
+    photo_ratio: float = 0.3
+    video_ratio: float = 0.05
+    media_base_url: str = "http://127.0.0.1:8000"
+    photo_bytes: int = 64 * 1024
+    video_bytes: int = 1024 * 1024
+    seed: int = 0
+
+
+class _Window:
+    """Server-side request budget for one endpoint."""
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self.reset_at = time.time() + window
+        self.used = 0
+
+    def take(self) -> dict:
+        now = time.time()
+        if now >= self.reset_at:
+            self.reset_at = now + self.window
+            self.used = 0
+        self.used += 1
+        headers = {
+            "x-rate-limit-limit": str(self.limit),
+            "x-rate-limit-remaining": str(max(self.limit - self.used, 0)),
+            "x-rate-limit-reset": str(int(self.reset_at) + 1),
+        }
+        if self.used > self.limit:
+            raise TooManyRequests("Rate limit exceeded", headers=headers)
+        return headers
+
+
+class _Page(list):
+    def __init__(self, client: "FakeClient", offset: int):
+        end = min(offset + client.settings.page_size, client.settings.bookmarks)
+        super().__init__(client.bookmark(i) for i in range(offset, end))
+        self._client = client
+        self._end = end
+        self.cursor = f"cursor:{end}"
+
+    async def next(self):
+        await self._client._request("Bookmarks")
+        if self._end >= self._client.settings.bookmarks:
+            return []
+        return _Page(self._client, self._end)
+
+
+class FakeClient:
+    """Answers get_bookmarks / next / get_tweet_by_id from generated data.
+
+    Every call sleeps for ``latency`` and is counted against a per-endpoint
+    budget. Rate-limit headers are passed to the response hooks on ``http``,
+    as httpx would for the real client, so the scraper's limiter paces
+    itself from them; going over budget raises ``TooManyRequests``.
+    """
+
+    def __init__(self, settings: ApiSettings):
+        self.settings = settings
+        self.http = httpx.AsyncClient()
+        self.requests: dict[str, int] = {}
+        self._windows: dict[str, _Window] = {}
+        self._rng_seed = settings.seed
+
+    # Session handling used by scraper.auth.login
+    async def login(self, **kwargs):
+        pass
+
+    def load_cookies(self, path):
+        pass
+
+    def set_cookies(self, cookies):
+        pass
+
+    def save_cookies(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("{}")
+
+    async def _request(self, endpoint: str):
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        if self.settings.latency:
+            await asyncio.sleep(self.settings.latency)
+        window = self._windows.setdefault(
+            endpoint, _Window(self.settings.rate_limit or _UNLIMITED, self.settings.rate_window))
+        headers = window.take()
+        response = httpx.Response(
+            200, headers=headers,
+            request=httpx.Request("GET", f"https://x.com/i/api/graphql/fake/{endpoint}"),
+        )
+        for hook in self.http.event_hooks["response"]:
+            await hook(response)
+
+    def _rng(self, index: int) -> random.Random:
+        return random.Random(self._rng_seed * 1_000_003 + index)
+
+    def bookmark(self, index: int):
+        rng = self._rng(index)
+        tweet_id = str(_FIRST_ID - index)
+        in_reply_to = None
+        if rng.random() < self.settings.reply_ratio and self.settings.thread_depth:
+            in_reply_to = self._parent_id(index, self.settings.thread_depth - 1)
+        return self._tweet(tweet_id, index, in_reply_to, rng)
+
+    def _parent_id(self, index: int, depth: int) -> str:
+        return str(_PARENT_BASE + index * 100 + depth)
+
+    def _tweet(self, tweet_id: str, index: int, in_reply_to, rng: random.Random):
+        handle = f"user{index % 500}"
+        media = []
+        roll = rng.random()
+        if roll < self.settings.video_ratio:
+            media.append(self._video(tweet_id))
+        elif roll < self.settings.video_ratio + self.settings.photo_ratio:
+            media.append(self._photo(tweet_id))
+        return SimpleNamespace(
+            id=tweet_id,
+            text=f"Benchmark tweet {tweet_id} " + "lorem ipsum " * rng.randint(1, 20),
+            user=SimpleNamespace(name=f"User {handle}", screen_name=handle),
+            created_at="Fri Mar 15 12:00:00 +0000 2024",
+            favorite_count=rng.randint(0, 10_000),
+            retweet_count=rng.randint(0, 1_000),
+            reply_count=rng.randint(0, 100),
+            media=media,
+            in_reply_to=in_reply_to,
+        )
+
+    def _photo(self, tweet_id: str):
+        url = f"{self.settings.media_base_url}/media/{tweet_id}.jpg?bytes={self.settings.photo_bytes}"
+        return SimpleNamespace(type="photo", media_url=url)
+
+    def _video(self, tweet_id: str):
+        size = self.settings.video_bytes
+        streams = [
+            SimpleNamespace(
+                bitrate=bitrate, content_type="video/mp4",
+                url=f"{self.settings.media_base_url}/vid/{res}/{tweet_id}.mp4?bytes={size * scale // 4}",
+            )
+            for bitrate, res, scale in ((256_000, "480x270", 1), (832_000, "640x360", 2),
+                                        (2_176_000, "1280x720", 4))
+        ]
+        return SimpleNamespace(type="video", streams=streams, duration_millis=30_000)
+
+    async def get_bookmarks(self, count: int = 20, cursor: str | None = None):
+        await self._request("Bookmarks")
+        offset = int(cursor.split(":")[1]) if cursor else 0
+        return _Page(self, offset)
+
+    async def get_tweet_by_id(self, tweet_id: str):
+        await self._request("TweetDetail")
+        number = int(tweet_id)
+        if number >= _FIRST_ID - self.settings.bookmarks:
+            index = _FIRST_ID - number
+            tweet = self.bookmark(index)
+            depth = self.settings.thread_depth
+        elif number >= _PARENT_BASE:
+            index, depth = divmod(number - _PARENT_BASE, 100)
+            tweet = self._parent(index, depth)
+        else:
+            raise TweetNotAvailable(f"No tweet {tweet_id}")
+        # Ancestors, root first, as TweetDetail returns them
+        tweet.reply_to = [self._parent(index, d) for d in range(depth)] if tweet.in_reply_to else None
+        return tweet
+
+    def _parent(self, index: int, depth: int):
+        in_reply_to = self._parent_id(index, depth - 1) if depth else None
+        return self._tweet(self._parent_id(index, depth), index, in_reply_to,
+                           self._rng(-(index * 100 + depth) - 1))
+
+    async def close(self):
+        await self.http.aclose()
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
@@ -0,0 +1,107 @@
+"""Local HTTP server that serves synthetic media files.
+
+The response size comes from the ``bytes`` query parameter, so the fake
+API decides how large each photo and video is. The bytes are seeded from
+the URL path, so every file is distinct (as real media is) and the
+content-addressed store sees no more duplicates than it would live. Range
+requests are honoured so the downloader's resume path can be exercised too.
+"""
+
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Filler is served in repeats of a block this size
+_BLOCK_SIZE = 64 * 1024
+
+
+def _block(path: str) -> bytes:
+    """64 KiB of filler unique to ``path``."""
+    digest = hashlib.sha256(path.encode("utf-8")).digest()
+    return digest * (_BLOCK_SIZE // len(digest))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "MediaServer"
+
+    def do_GET(self):
+        self.server.count_request()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        size = int(query.get("bytes", ["1024"])[0])
+        start = 0
+        status = 200
+        range_header = self.headers.get("Range")
+        if range_header and range_header.startswith("bytes="):
+            start = int(range_header[6:].split("-")[0] or 0)
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            status = 206
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(size - start))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{size - 1}/{size}")
+        self.end_headers()
+
+        block = _block(url.path)
+        position = start
+        while position < size:
+            offset = position % _BLOCK_SIZE
+            chunk = block[offset:offset + min(size - position, _BLOCK_SIZE - offset)]
+            self.wfile.write(chunk)
+            position += len(chunk)
+        self.server.count_bytes(size - start)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MediaServer(ThreadingHTTPServer):
+    """Serves synthetic media on 127.0.0.1 from a background thread.
+
+    Use as a context manager; ``base_url`` is valid once it is entered.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0, port: int = 0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def count_bytes(self, n: int):
+        with self._lock:
+            self.bytes_sent += n
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
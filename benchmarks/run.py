@@ -0,0 +1,191 @@
+"""Run the real scrape.py pipeline against the fake API and media server.
+
+    python -m benchmarks.run                          # 1k, 10k and 100k bookmarks
+    python -m benchmarks.run --sizes 1000 --latency 0.05 --rate-limit 300
+    python -m benchmarks.run --sizes 10000 -- --media-concurrency 16
+
+Arguments after ``--`` are passed to scrape.py unchanged. Each size runs in
+its own process so peak RSS is measured per run.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from unittest.mock import patch
+
+from benchmarks.fake_api import ApiSettings, FakeClient
+from benchmarks.media_server import MediaServer
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+
+
+def _peak_rss() -> int | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_once(settings: ApiSettings, media_latency: float, scrape_args: list[str],
+             keep: bool = False) -> dict:
+    """Scrape ``settings.bookmarks`` fake bookmarks in this process."""
+    output = tempfile.mkdtemp(prefix="scraper-bench-")
+    try:
+        with MediaServer(latency=media_latency) as server:
+            settings.media_base_url = server.base_url
+            client = FakeClient(settings)
+            argv = ["scrape.py", "--output", output, "--username", "bench",
+                    "--email", "bench@example.com", "--password", "bench", *scrape_args]
+
+            import scrape
+
+            log = io.StringIO()
+            start = time.perf_counter()
+            with patch("scraper.auth.Client", return_value=client), \
+                 patch.object(sys, "argv", argv), \
+                 contextlib.redirect_stdout(log):
+                asyncio.run(scrape.main())
+            wall = time.perf_counter() - start
+            asyncio.run(client.close())
+
+        with open(os.path.join(output, "metrics.json"), encoding="utf-8") as f:
+            metrics = json.load(f)
+        api_requests = client.total_requests
+        return {
+            "bookmarks": settings.bookmarks,
+            "wall_seconds": round(wall, 3),
+            "peak_rss_bytes": _peak_rss(),
+            "api_requests": api_requests,
+            "api_requests_per_sec": round(api_requests / wall, 1),
+            "media_requests": server.requests,
+            "media_requests_per_sec": round(server.requests / wall, 1),
+            "media_bytes": server.bytes_sent,
+            "bookmarks_per_sec": round(settings.bookmarks / wall, 1),
+            "phase_seconds": metrics.get("phase_seconds", {}),
+            "output": output if keep else None,
+        }
+    finally:
+        if not keep:
+            shutil.rmtree(output, ignore_errors=True)
+
+
+def _format_bytes(n: int | None) -> str:
+    if n is None:
+        return "n/a"
+    return f"{n / (1024 * 1024):.0f} MiB"
+
+
+def print_report(results: list[dict]):
+    header = f"{'bookmarks':>10} {'wall':>9} {'peak RSS':>9} {'api req/s':>10} {'media req/s':>12} {'bm/s':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['bookmarks']:>10} {r['wall_seconds']:>8.1f}s {_format_bytes(r['peak_rss_bytes']):>9} "
+              f"{r['api_requests_per_sec']:>10} {r['media_requests_per_sec']:>12} "
+              f"{r['bookmarks_per_sec']:>9}")
+    print()
+    for r in results:
+        phases = ", ".join(f"{k} {v:.1f}s" for k, v in r["phase_seconds"].items())
+        print(f"{r['bookmarks']:>10}: {phases}")
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scraper against a local fake API")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Comma-separated bookmark counts (default: 1000,10000,100000)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per API call")
+    parser.add_argument("--media-latency", type=float, default=0.0, help="Seconds per media request")
+    parser.add_argument("--rate-limit", type=int, default=0,
+                        help="API calls per window per endpoint (default: unlimited)")
+    parser.add_argument("--rate-window", type=float, default=60.0, help="Rate limit window in seconds")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--reply-ratio", type=float, default=0.3)
+    parser.add_argument("--thread-depth", type=int, default=3)
+    parser.add_argument("--photo-ratio", type=float, default=0.3)
+    parser.add_argument("--video-ratio", type=float, default=0.05)
+    parser.add_argument("--photo-kb", type=int, default=64)
+    parser.add_argument("--video-kb", type=int, default=1024)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    parser.add_argument("--keep", action="store_true", help="Keep the scraped output folders")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    parsed, scrape_args = parser.parse_known_args(args)
+    if scrape_args[:1] == ["--"]:
+        scrape_args = scrape_args[1:]
+    return parsed, scrape_args
+
+
+def _settings(parsed, bookmarks: int) -> ApiSettings:
+    return ApiSettings(
+        bookmarks=bookmarks,
+        page_size=parsed.page_size,
+        latency=parsed.latency,
+        rate_limit=parsed.rate_limit,
+        rate_window=parsed.rate_window,
+        reply_ratio=parsed.reply_ratio,
+        thread_depth=parsed.thread_depth,
+        photo_ratio=parsed.photo_ratio,
+        video_ratio=parsed.video_ratio,
+        photo_bytes=parsed.photo_kb * 1024,
+        video_bytes=parsed.video_kb * 1024,
+        seed=parsed.seed,
+    )
+
+
+def _child_args(parsed) -> list[str]:
+    args = []
+    for name, value in vars(parsed).items():
+        if name in ("sizes", "single", "json"):
+            continue
+        flag = "--" + name.replace("_", "-")
+        if value is True:
+            args.append(flag)
+        elif value not in (False, None):
+            args.append(f"{flag}={value}")
+    return args
+
+
+def main(args=None):
+    parsed, scrape_args = parse_args(args)
+    sizes = [int(s) for s in parsed.sizes.split(",") if s]
+
+    if parsed.single:
+        result = run_once(_settings(parsed, sizes[0]), parsed.media_latency,
+                          scrape_args, keep=parsed.keep)
+        print(json.dumps(result))
+        return
+
+    results = []
+    for size in sizes:
+        print(f"Running {size} bookmarks...", file=sys.stderr)
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.run", "--single", f"--sizes={size}",
+             *_child_args(parsed), "--", *scrape_args],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            sys.stderr.write(proc.stderr)
+            sys.exit(proc.returncode)
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    print_report(results)
+    if parsed.json:
+        with open(parsed.json, "w", encoding="utf-8") as f:
+            json.dump({"settings": asdict(_settings(parsed, 0)) | {"bookmarks": sizes},
+                       "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,96 +1,205 @@
 import asyncio
 import os
+import signal
 import sys
 
 from scraper.cli import parse_args
 from scraper.auth import login
-from scraper.fetcher import fetch_bookmarks
+from scraper.batch import load_accounts, run_batch
+from scraper.cache import TweetCache
+from scraper.diskio import DiskIO
+from scraper.layout import Layout, reshard
 from scraper.media import MediaDownloader
-from scraper.renderer import render_bookmark, bookmark_filename
+from scraper.metrics import LoopLagMonitor, Metrics, ratio, write_prometheus
+from scraper.pipeline import FetchError, Pipeline, make_exporters
+from scraper.quality import MediaPolicy
+from scraper.ratelimit import RateLimiter
 from scraper.threads import ThreadResolver
+from scraper.writer import MarkdownWriter, RenderIndex
 from scraper.tracker import ProgressTracker
 
 
+def cancel_on_sigterm():
+    """Make SIGTERM cancel the running task, the way Ctrl-C does, so the
+    same cleanup (including the final checkpoint) runs for both."""
+    task = asyncio.current_task()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+    except (NotImplementedError, RuntimeError, ValueError):
+        # No loop signal handlers on Windows, or outside the main thread
+        pass
+
+
 async def main():
     config = parse_args()
+    cancel_on_sigterm()
+
+    if config.reshard:
+        main_reshard(config)
+        return
+
+    if config.accounts:
+        await main_batch(config)
+        return
 
     os.makedirs(config.output, exist_ok=True)
+    try:
+        layout = Layout.resolve(config.output, config.layout)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
 
-    tracker = ProgressTracker(config.output)
-    tracker.load()
+    metrics = Metrics()
+    monitor = LoopLagMonitor(metrics, threshold=config.loop_lag_threshold)
+    monitor.start()
+    io = DiskIO()
+    tracker = ProgressTracker(config.output, io=io,
+                              checkpoint_pages=config.checkpoint_pages,
+                              checkpoint_seconds=config.checkpoint_seconds)
+    await io.run(tracker.load)
 
     try:
-        client = await login(config)
+        with metrics.phase("login"):
+            client = await login(config, io=io)
     except Exception as e:
         print(f"Login failed: {e}", file=sys.stderr)
         sys.exit(1)
 
+    limiter = RateLimiter(metrics=metrics)
+    limiter.attach(client)
+
+    policy = MediaPolicy.from_config(config)
+    downloader = MediaDownloader(
+        config.output,
+        concurrency=config.media_concurrency,
+        per_host=config.media_per_host,
+        fsync=config.fsync_media,
+        metrics=metrics,
+        layout=layout,
+        io=io,
+    )
+    if config.verify_media:
+        corrupt = downloader.verify(checksums=config.verify_media == "checksum")
+        print(f"Media check: {corrupt} damaged files will be downloaded again")
+    tweet_cache = TweetCache.in_output(
+        config.output,
+        ttl=config.tweet_cache_ttl_days * 24 * 3600,
+        max_entries=config.tweet_cache_size,
+    )
+    pipeline = Pipeline(
+        client, config.output, tracker,
+        resolver=ThreadResolver(
+            client, concurrency=config.thread_concurrency,
+            cache=tweet_cache, limiter=limiter, policy=policy,
+        ),
+        downloader=downloader,
+        incremental=config.incremental,
+        limiter=limiter,
+        writer=MarkdownWriter(config.output, workers=config.render_workers, layout=layout),
+        policy=policy,
+        metrics=metrics,
+        exporters=make_exporters(config),
+        refresh=config.refresh,
+    )
+
     try:
-        bookmarks = await fetch_bookmarks(client, tracker=tracker)
-    except Exception as e:
+        await pipeline.run()
+    except FetchError as e:
         print(f"Failed to fetch bookmarks: {e}", file=sys.stderr)
         sys.exit(1)
+    except asyncio.CancelledError:
+        print("Interrupted, saving progress...", file=sys.stderr)
+        raise
+    finally:
+        await monitor.stop()
+        try:
+            # Checkpoint every committed page, also when failing or interrupted
+            await tracker.flush(compact=True)
+            await io.drain()
+        finally:
+            # A failed queued write still leaves everything closed and metrics written
+            io.close()
+            tweet_cache.close()
+            await downloader.aclose()
+            downloader.close()
+            metrics.write_json(os.path.join(config.output, "metrics.json"))
+            if config.prometheus_textfile:
+                write_prometheus(config.prometheus_textfile, [({}, metrics)])
 
-    # Resolve threads for reply bookmarks
-    replies = [bm for bm in bookmarks if bm.get("in_reply_to")]
-    threads = {}
-    if replies:
-        resolver = ThreadResolver(client)
-        for i, bm in enumerate(replies, 1):
-            print(f"Resolving thread {i}/{len(replies)}...")
-            try:
-                threads[bm["id"]] = await resolver.resolve(bm)
-            except Exception as e:
-                print(f"Warning: thread resolution failed for {bm['id']}: {e}")
-
-    # Write markdown files
-    total = len(bookmarks)
-    skipped_md = 0
-    written = 0
-    for i, bm in enumerate(bookmarks, 1):
-        if tracker.is_scraped(bm["id"]):
-            skipped_md += 1
-            continue
-        filename = bookmark_filename(bm)
-        filepath = os.path.join(config.output, filename)
-        if os.path.isfile(filepath):
-            skipped_md += 1
-            tracker.mark_scraped(bm["id"])
+    if pipeline.written:
+        print(f"Wrote {pipeline.written} markdown files "
+              f"({pipeline.writer.files_per_sec:.0f} files/sec)")
+    if pipeline.skipped_md:
+        print(f"Skipped {pipeline.skipped_md} existing markdown files")
+    if config.refresh:
+        writer = pipeline.writer
+        print(f"Refreshed existing markdown files: {writer.refreshed} frontmatter updates, "
+              f"{writer.rerendered} re-rendered, {writer.unchanged} unchanged")
+    for exporter in pipeline.exporters:
+        print(f"Exported {exporter.written} bookmarks to {exporter.path}")
+    if pipeline.media_found:
+        print(f"Downloaded {pipeline.downloaded} media files "
+              f"({pipeline.skipped_media} already existed)")
+    resolver = pipeline.resolver
+    if resolver.threads:
+        print(f"Threads: {resolver.threads} resolved with {resolver.requests} API calls, "
+              f"{resolver.calls_saved} saved by conversation fetches "
+              f"({ratio(resolver.calls_saved, resolver.threads):.1f} per thread), "
+              f"{resolver.derived} derived without a lookup of their own")
+    if tweet_cache.hits or tweet_cache.misses:
+        print(f"Tweet cache: {tweet_cache.hits} hits, {tweet_cache.misses} misses")
+    if monitor.stalls:
+        print(f"Event loop stalled {monitor.stalls} times, longest {monitor.max_lag:.2f}s")
+
+    print(f"Done. {pipeline.total} bookmarks saved to {config.output}/")
+
+
+def main_reshard(config):
+    outputs = [config.output]
+    if config.accounts:
+        try:
+            outputs = [account.output for _, account in load_accounts(config)]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Could not read accounts file: {e}", file=sys.stderr)
+            sys.exit(1)
+    layout = Layout(config.layout)
+    for output in outputs:
+        if not os.path.isdir(output):
             continue
-        md = render_bookmark(bm, thread=threads.get(bm["id"]))
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(md)
-        tracker.mark_scraped(bm["id"])
-        written += 1
-        if written % 10 == 0 or i == total:
-            print(f"Writing {i}/{total} markdown files...")
-
-    if skipped_md:
-        print(f"Skipped {skipped_md} existing markdown files")
-
-    # Download media
-    downloader = MediaDownloader(config.output)
-    media_count = sum(
-        len(bm.get("media_items", [])) for bm in bookmarks
-    ) + sum(
-        len(t.get("media_items", []))
-        for thread in threads.values()
-        for t in thread
-    )
-    if media_count:
-        print(f"Found {media_count} media items to download")
-        downloaded, skipped = await downloader.download_all(
-            bookmarks, threads,
-            on_progress=lambda i, total: (
-                print(f"Downloading media {i}/{total}...")
-                if i % 10 == 0 or i == total else None
-            ),
-        )
-        print(f"Downloaded {downloaded} media files ({skipped} already existed)")
+        index = RenderIndex(output)
+        index.load()
+        markdown, media = reshard(output, layout, index=index)
+        index.close()
+        print(f"Moved {markdown} markdown files and {media} media files in {output} "
+              f"into the {layout.kind} layout")
+
 
-    tracker.save()
-    print(f"Done. {total} bookmarks saved to {config.output}/")
+async def main_batch(config):
+    try:
+        accounts = load_accounts(config)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Could not read accounts file: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    results = await run_batch(config, accounts)
+    if config.prometheus_textfile:
+        write_prometheus(config.prometheus_textfile,
+                         [({"account": r.name}, r.metrics) for r in results])
+
+    for result in results:
+        if result.error:
+            print(f"[{result.name}] Failed: {result.error}")
+        else:
+            print(f"[{result.name}] {result.total} bookmarks, {result.written} markdown files written, "
+                  f"{result.downloaded} media files downloaded")
+    failed = sum(1 for r in results if r.error)
+    print(f"Done. {len(results) - failed}/{len(results)} accounts saved to {config.output}/")
+    if failed:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        sys.exit(130)
@@ -0,0 +1,181 @@
+import asyncio
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from scraper.models import Media, Tweet
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tweets (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL,
+    author TEXT NOT NULL,
+    handle TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    likes INTEGER NOT NULL DEFAULT 0,
+    retweets INTEGER NOT NULL DEFAULT 0,
+    replies INTEGER NOT NULL DEFAULT 0,
+    in_reply_to TEXT
+);
+CREATE TABLE IF NOT EXISTS bookmarks (
+    tweet_id INTEGER PRIMARY KEY REFERENCES tweets (id),
+    saved_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS thread_members (
+    bookmark_id INTEGER NOT NULL REFERENCES bookmarks (tweet_id),
+    position INTEGER NOT NULL,
+    tweet_id INTEGER NOT NULL REFERENCES tweets (id),
+    PRIMARY KEY (bookmark_id, position)
+);
+CREATE TABLE IF NOT EXISTS media (
+    tweet_id INTEGER NOT NULL REFERENCES tweets (id),
+    position INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    url TEXT,
+    filename TEXT NOT NULL,
+    PRIMARY KEY (tweet_id, position)
+);
+CREATE INDEX IF NOT EXISTS tweets_handle ON tweets (handle);
+CREATE VIRTUAL TABLE IF NOT EXISTS tweets_fts USING fts5 (
+    text, author, content='tweets', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS tweets_ai AFTER INSERT ON tweets BEGIN
+    INSERT INTO tweets_fts (rowid, text, author) VALUES (new.id, new.text, new.author);
+END;
+CREATE TRIGGER IF NOT EXISTS tweets_ad AFTER DELETE ON tweets BEGIN
+    INSERT INTO tweets_fts (tweets_fts, rowid, text, author)
+    VALUES ('delete', old.id, old.text, old.author);
+END;
+CREATE TRIGGER IF NOT EXISTS tweets_au AFTER UPDATE ON tweets BEGIN
+    INSERT INTO tweets_fts (tweets_fts, rowid, text, author)
+    VALUES ('delete', old.id, old.text, old.author);
+    INSERT INTO tweets_fts (rowid, text, author) VALUES (new.id, new.text, new.author);
+END;
+"""
+
+_UPSERT_TWEET = (
+    "INSERT INTO tweets (id, text, author, handle, created_at, likes, retweets, replies, in_reply_to)"
+    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    " ON CONFLICT (id) DO UPDATE SET"
+    " text = excluded.text, author = excluded.author, handle = excluded.handle,"
+    " created_at = excluded.created_at, likes = excluded.likes,"
+    " retweets = excluded.retweets, replies = excluded.replies,"
+    " in_reply_to = excluded.in_reply_to"
+)
+
+_TWEET_COLUMNS = "t.id, t.text, t.author, t.handle, t.created_at, t.likes, t.retweets, t.replies, t.in_reply_to"
+
+
+class SqliteArchive:
+    """Bookmarks, their threads and media references in one SQLite file.
+
+    Tweet text and author are indexed with FTS5, so ``search`` (or any
+    ``MATCH`` query against ``tweets_fts``) answers without touching the
+    markdown files. Each page is written in a single transaction on a
+    dedicated thread, keeping the event loop free. Rewriting a bookmark
+    replaces its row, so re-running over the same output is safe.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.written = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        # Only ever used from the single executor thread after this point
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    @classmethod
+    def in_output(cls, output_dir: str) -> "SqliteArchive":
+        return cls(os.path.join(output_dir, "bookmarks.sqlite3"))
+
+    async def write_page(self, items: list[tuple[Tweet, list[Tweet] | None]]):
+        """Store (bookmark, thread) pairs in one transaction."""
+        if not items:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._write, items)
+        self.written += len(items)
+
+    def _write(self, items: list[tuple[Tweet, list[Tweet] | None]]):
+        now = time.time()
+        tweets = {}
+        for bookmark, thread in items:
+            tweets[bookmark.id] = bookmark
+            for tweet in thread or ():
+                tweets.setdefault(tweet.id, tweet)
+
+        with self._conn:
+            self._conn.executemany(_UPSERT_TWEET, [
+                (int(t.id), t.text, t.author, t.handle, t.created_at,
+                 t.likes, t.retweets, t.replies, t.in_reply_to)
+                for t in tweets.values()
+            ])
+            ids = [(int(tweet_id),) for tweet_id in tweets]
+            self._conn.executemany("DELETE FROM media WHERE tweet_id = ?", ids)
+            self._conn.executemany(
+                "INSERT INTO media (tweet_id, position, type, url, filename) VALUES (?, ?, ?, ?, ?)",
+                [(int(t.id), i, m.type, m.url, m.filename)
+                 for t in tweets.values() for i, m in enumerate(t.media)],
+            )
+            self._conn.executemany(
+                "INSERT INTO bookmarks (tweet_id, saved_at) VALUES (?, ?)"
+                " ON CONFLICT (tweet_id) DO NOTHING",
+                [(int(bm.id), now) for bm, _ in items],
+            )
+            self._conn.executemany(
+                "DELETE FROM thread_members WHERE bookmark_id = ?",
+                [(int(bm.id),) for bm, _ in items],
+            )
+            self._conn.executemany(
+                "INSERT INTO thread_members (bookmark_id, position, tweet_id) VALUES (?, ?, ?)",
+                [(int(bm.id), i, int(t.id))
+                 for bm, thread in items if thread for i, t in enumerate(thread)],
+            )
+
+    def _tweet(self, row) -> Tweet:
+        tweet_id = row[0]
+        media = tuple(
+            Media(*m) for m in self._conn.execute(
+                "SELECT type, url, filename FROM media WHERE tweet_id = ? ORDER BY position",
+                (tweet_id,),
+            )
+        )
+        return Tweet(str(tweet_id), *row[1:], media=media)
+
+    def search(self, query: str, limit: int = 50) -> list[Tweet]:
+        """Bookmarked tweets matching an FTS5 query, best match first.
+
+        Only call this while no page is being written.
+        """
+        rows = self._conn.execute(
+            f"SELECT {_TWEET_COLUMNS} FROM tweets_fts"
+            " JOIN tweets t ON t.id = tweets_fts.rowid"
+            " JOIN bookmarks b ON b.tweet_id = t.id"
+            " WHERE tweets_fts MATCH ? ORDER BY rank LIMIT ?",
+            (query, limit),
+        ).fetchall()
+        return [self._tweet(row) for row in rows]
+
+    def thread(self, bookmark_id: str) -> list[Tweet]:
+        """The stored thread for a bookmark, root first; empty if none."""
+        rows = self._conn.execute(
+            f"SELECT {_TWEET_COLUMNS} FROM thread_members m"
+            " JOIN tweets t ON t.id = m.tweet_id"
+            " WHERE m.bookmark_id = ? ORDER BY m.position",
+            (int(bookmark_id),),
+        ).fetchall()
+        return [self._tweet(row) for row in rows]
+
+    def __len__(self) -> int:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM bookmarks").fetchone()
+        return count
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._conn.close()
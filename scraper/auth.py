@@ -1,22 +1,30 @@
+import asyncio
 import os
 
 from twikit import Client
 
 from scraper.cookies import load_browser_cookies
+from scraper.diskio import DiskIO
 
 
-async def login(config) -> Client:
+async def login(config, io: DiskIO | None = None) -> Client:
+    """Log in, reusing or saving ``cookies.json`` in the output folder.
+
+    Cookie files are read and written on ``io``'s thread (or a worker
+    thread without one), not on the event loop.
+    """
+    run = io.run if io is not None else asyncio.to_thread
     cookies_file = os.path.join(config.output, "cookies.json")
     client = Client("en-US")
 
     if os.path.exists(cookies_file):
         print("Using saved session...")
-        client.load_cookies(cookies_file)
+        await run(client.load_cookies, cookies_file)
     elif config.cookies:
         print("Importing browser cookies...")
-        cookies = load_browser_cookies(config.cookies)
+        cookies = await run(load_browser_cookies, config.cookies)
         client.set_cookies(cookies)
-        client.save_cookies(cookies_file)
+        await run(client.save_cookies, cookies_file)
     else:
         print("Logging in...")
         await client.login(
@@ -24,6 +32,6 @@ async def login(config) -> Client:
             auth_info_2=config.email,
             password=config.password,
         )
-        client.save_cookies(cookies_file)
+        await run(client.save_cookies, cookies_file)
 
     return client
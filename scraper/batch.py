@@ -0,0 +1,170 @@
+import asyncio
+import json
+import os
+import sys
+from dataclasses import dataclass, field, replace
+
+from scraper.auth import login
+from scraper.cache import TweetCache
+from scraper.cli import Config
+from scraper.diskio import DiskIO
+from scraper.layout import Layout
+from scraper.media import MediaDownloader, MediaPool
+from scraper.metrics import LoopLagMonitor, Metrics
+from scraper.pipeline import FetchError, Pipeline, make_exporters
+from scraper.quality import MediaPolicy
+from scraper.ratelimit import RateLimiter
+from scraper.store import MediaStore
+from scraper.threads import ThreadResolver
+from scraper.tracker import ProgressTracker
+from scraper.writer import MarkdownWriter
+
+
+@dataclass
+class AccountResult:
+    name: str
+    total: int = 0
+    written: int = 0
+    downloaded: int = 0
+    error: str | None = None
+    metrics: Metrics = field(default_factory=Metrics)
+
+
+def load_accounts(config: Config) -> list[tuple[str, Config]]:
+    """Read the ``--accounts`` file into one Config per account.
+
+    The file is a JSON list of ``{"name": ..., "cookies": ...}`` objects,
+    optionally with an ``output`` folder. Accounts without one are written
+    to ``<output>/<name>/``. Every other setting comes from ``config``.
+    """
+    with open(config.accounts, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+
+    accounts = []
+    seen = set()
+    for entry in entries:
+        name = entry["name"]
+        if name in seen:
+            raise ValueError(f"duplicate account name: {name}")
+        seen.add(name)
+        accounts.append((name, replace(
+            config,
+            output=entry.get("output") or os.path.join(config.output, name),
+            cookies=entry.get("cookies"),
+            accounts=None,
+        )))
+    return accounts
+
+
+async def _scrape_account(name: str, config: Config, pool: MediaPool, store: MediaStore,
+                          tweet_cache: TweetCache, policy: MediaPolicy, io: DiskIO) -> AccountResult:
+    os.makedirs(config.output, exist_ok=True)
+    metrics = Metrics()
+    try:
+        layout = Layout.resolve(config.output, config.layout)
+    except ValueError as e:
+        print(f"[{name}] {e}", file=sys.stderr)
+        return AccountResult(name, error=str(e), metrics=metrics)
+    tracker = ProgressTracker(config.output, io=io,
+                              checkpoint_pages=config.checkpoint_pages,
+                              checkpoint_seconds=config.checkpoint_seconds)
+    await io.run(tracker.load)
+
+    try:
+        with metrics.phase("login"):
+            client = await login(config, io=io)
+    except Exception as e:
+        print(f"[{name}] Login failed: {e}", file=sys.stderr)
+        return AccountResult(name, error=f"login failed: {e}", metrics=metrics)
+
+    # Each account has its own API budget, so a cooldown on one account
+    # only parks that account's tasks while the others keep going.
+    limiter = RateLimiter(metrics=metrics)
+    limiter.attach(client)
+
+    downloader = MediaDownloader(config.output, fsync=config.fsync_media,
+                                 store=store, pool=pool, metrics=metrics, layout=layout, io=io)
+    pipeline = Pipeline(
+        client, config.output, tracker,
+        resolver=ThreadResolver(
+            client, concurrency=config.thread_concurrency,
+            cache=tweet_cache, limiter=limiter, policy=policy,
+        ),
+        downloader=downloader,
+        incremental=config.incremental,
+        limiter=limiter,
+        writer=MarkdownWriter(config.output, workers=config.render_workers, layout=layout),
+        policy=policy,
+        metrics=metrics,
+        exporters=make_exporters(config),
+        refresh=config.refresh,
+    )
+
+    error = None
+    try:
+        await pipeline.run()
+    except FetchError as e:
+        print(f"[{name}] Failed to fetch bookmarks: {e}", file=sys.stderr)
+        error = f"fetch failed: {e}"
+    except Exception as e:
+        # A full disk or a failing exporter stops this account, not the batch
+        print(f"[{name}] Failed: {e}", file=sys.stderr)
+        error = str(e)
+    finally:
+        downloader.close()
+        try:
+            await tracker.flush(compact=True)
+        finally:
+            metrics.write_json(os.path.join(config.output, "metrics.json"))
+
+    return AccountResult(name, total=pipeline.total, written=pipeline.written,
+                         downloaded=pipeline.downloaded, error=error, metrics=metrics)
+
+
+async def run_batch(config: Config, accounts: list[tuple[str, Config]]) -> list[AccountResult]:
+    """Scrape several accounts side by side on one event loop.
+
+    Accounts keep their own tracker, session and rate limiter, and share
+    the media download pool, the content-addressed media store (under
+    ``<output>/media/store``), the thread-parent cache and the disk I/O
+    thread.
+    """
+    os.makedirs(config.output, exist_ok=True)
+    policy = MediaPolicy.from_config(config)
+    pool = MediaPool(config.media_concurrency, config.media_per_host)
+    store = MediaStore(os.path.join(config.output, "media"))
+    tweet_cache = TweetCache.in_output(
+        config.output,
+        ttl=config.tweet_cache_ttl_days * 24 * 3600,
+        max_entries=config.tweet_cache_size,
+    )
+    io = DiskIO()
+    monitor = LoopLagMonitor(threshold=config.loop_lag_threshold)
+    monitor.start()
+    try:
+        # Every account has to finish before the shared resources are closed
+        outcomes = await asyncio.gather(*(
+            _scrape_account(name, account, pool, store, tweet_cache, policy, io)
+            for name, account in accounts
+        ), return_exceptions=True)
+        results = []
+        for (name, _), outcome in zip(accounts, outcomes):
+            if isinstance(outcome, AccountResult):
+                results.append(outcome)
+            elif isinstance(outcome, Exception):
+                print(f"[{name}] Failed: {outcome}", file=sys.stderr)
+                results.append(AccountResult(name, error=str(outcome)))
+            else:
+                raise outcome
+        return results
+    finally:
+        await monitor.stop()
+        if monitor.stalls:
+            print(f"Event loop stalled {monitor.stalls} times, longest {monitor.max_lag:.2f}s")
+        try:
+            await io.drain()
+        finally:
+            io.close()
+            await pool.aclose()
+            store.close()
+            tweet_cache.close()
@@ -0,0 +1,127 @@
+import json
+import os
+import sqlite3
+import time
+
+from scraper.models import Tweet
+
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 200_000
+
+# Evict at most once per this many writes rather than on every put
+_EVICT_EVERY = 500
+
+
+class TweetCache:
+    """Persistent tweet cache keyed by tweet ID, stored in SQLite.
+
+    Entries older than ``ttl`` seconds are treated as misses. Once the
+    cache grows past ``max_entries`` the least recently read entries are
+    evicted.
+
+    Reads and writes are not committed one by one: read times are kept in
+    memory and written with any pending ``put``s in one transaction by
+    ``flush``, which thread resolution calls once per page, or on
+    ``close``. In WAL mode with ``synchronous=NORMAL`` those commits don't
+    wait for an fsync.
+    """
+
+    def __init__(self, path: str, ttl: float = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._accessed: dict[str, float] = {}
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tweets ("
+            " id TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS tweets_accessed_at ON tweets (accessed_at)"
+        )
+        self._conn.commit()
+
+    @classmethod
+    def in_output(cls, output_dir: str, **kwargs) -> "TweetCache":
+        return cls(os.path.join(output_dir, "tweet_cache.sqlite3"), **kwargs)
+
+    def get(self, tweet_id: str) -> Tweet | None:
+        row = self._conn.execute(
+            "SELECT data, fetched_at FROM tweets WHERE id = ?", (tweet_id,)
+        ).fetchone()
+        now = time.time()
+        if row is None or now - row[1] > self.ttl:
+            self.misses += 1
+            return None
+        self._accessed[tweet_id] = now
+        self.hits += 1
+        return Tweet.from_dict(json.loads(row[0]))
+
+    def put(self, tweet_id: str, tweet: Tweet):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO tweets (id, data, fetched_at, accessed_at)"
+            " VALUES (?, ?, ?, ?)",
+            (tweet_id, json.dumps(tweet.to_dict()), now, now),
+        )
+        self._writes += 1
+        if self._writes % _EVICT_EVERY == 0:
+            self.evict()
+
+    def put_many(self, tweets: list[Tweet]):
+        """Store several tweets in one statement."""
+        if not tweets:
+            return
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO tweets (id, data, fetched_at, accessed_at)"
+            " VALUES (?, ?, ?, ?)",
+            [(tweet.id, json.dumps(tweet.to_dict()), now, now) for tweet in tweets],
+        )
+        before = self._writes
+        self._writes += len(tweets)
+        if self._writes // _EVICT_EVERY > before // _EVICT_EVERY:
+            self.evict()
+
+    def flush(self):
+        """Write the read times noted since the last flush and commit them
+        along with any pending puts."""
+        if self._accessed:
+            self._conn.executemany(
+                "UPDATE tweets SET accessed_at = ? WHERE id = ?",
+                [(accessed_at, tweet_id) for tweet_id, accessed_at in self._accessed.items()],
+            )
+            self._accessed.clear()
+        self._conn.commit()
+
+    def evict(self):
+        """Drop expired entries, then the least recently read beyond max_entries."""
+        self.flush()
+        self._conn.execute(
+            "DELETE FROM tweets WHERE fetched_at < ?", (time.time() - self.ttl,)
+        )
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM tweets").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM tweets WHERE id IN ("
+                " SELECT id FROM tweets ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,),
+            )
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM tweets").fetchone()
+        return count
+
+    def close(self):
+        self.evict()
+        self._conn.close()
@@ -1,5 +1,6 @@
 import argparse
 import getpass
+import importlib.util
 from dataclasses import dataclass
 
 
@@ -10,6 +11,30 @@ class Config:
     email: str
     password: str
     cookies: str | None = None
+    accounts: str | None = None
+    media_concurrency: int = 8
+    media_per_host: int = 4
+    fsync_media: bool = False
+    verify_media: str | None = None
+    max_bitrate: int | None = None
+    max_resolution: int | None = None
+    max_video_mb: float | None = None
+    smallest_video: bool = False
+    photo_size: str | None = None
+    incremental: bool = False
+    refresh: bool = False
+    checkpoint_pages: int = 50
+    checkpoint_seconds: float = 60
+    thread_concurrency: int = 4
+    tweet_cache_ttl_days: float = 7
+    tweet_cache_size: int = 200_000
+    render_workers: int = 4
+    sqlite: bool = False
+    parquet: bool = False
+    layout: str | None = None
+    reshard: bool = False
+    prometheus_textfile: str | None = None
+    loop_lag_threshold: float = 0.25
 
 
 def parse_args(args=None) -> Config:
@@ -19,10 +44,67 @@ def parse_args(args=None) -> Config:
     parser.add_argument("--username", help="Twitter username")
     parser.add_argument("--email", help="Twitter email")
     parser.add_argument("--password", help="Twitter password")
+    parser.add_argument("--accounts",
+                        help="JSON file listing accounts to scrape together (batch mode)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only fetch bookmarks added since the last run")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Go over every bookmark again, updating existing markdown files that changed")
+    parser.add_argument("--checkpoint-pages", type=int, default=50,
+                        help="Pages between progress checkpoints (default: 50)")
+    parser.add_argument("--checkpoint-seconds", type=float, default=60,
+                        help="Seconds between progress checkpoints (default: 60)")
+    parser.add_argument("--thread-concurrency", type=int, default=4,
+                        help="Maximum simultaneous thread lookups (default: 4)")
+    parser.add_argument("--tweet-cache-ttl", type=float, default=7,
+                        help="Days a cached thread parent stays valid (default: 7)")
+    parser.add_argument("--tweet-cache-size", type=int, default=200_000,
+                        help="Maximum tweets kept in the thread cache (default: 200000)")
+    parser.add_argument("--render-workers", type=int, default=4,
+                        help="Threads rendering and writing markdown files (default: 4)")
+    parser.add_argument("--layout", choices=["flat", "date", "handle", "hash"],
+                        help="Folder layout for markdown and media (default: the archive's current one, "
+                             "or flat)")
+    parser.add_argument("--reshard", action="store_true",
+                        help="Move an existing archive's files into --layout, then exit")
+    parser.add_argument("--sqlite", action="store_true",
+                        help="Also write bookmarks to bookmarks.sqlite3 with a full-text index")
+    parser.add_argument("--parquet", action="store_true",
+                        help="Also write bookmarks.parquet and threads.parquet (needs pyarrow)")
+    parser.add_argument("--media-concurrency", type=int, default=8,
+                        help="Maximum simultaneous media downloads (default: 8)")
+    parser.add_argument("--media-per-host", type=int, default=4,
+                        help="Maximum simultaneous media downloads per host (default: 4)")
+    parser.add_argument("--fsync-media", action="store_true",
+                        help="fsync each media file before renaming it into place")
+    parser.add_argument("--verify-media", choices=["size", "checksum"],
+                        help="Re-check downloaded media against the media index before downloading")
+    parser.add_argument("--max-bitrate", type=int,
+                        help="Highest video bitrate to download, in bits/sec")
+    parser.add_argument("--max-resolution", type=int,
+                        help="Highest video resolution to download, e.g. 720 for 720p")
+    parser.add_argument("--max-video-mb", type=float,
+                        help="Largest estimated video size to download, in MB")
+    parser.add_argument("--smallest-video", action="store_true",
+                        help="Always download the lowest-bitrate video variant")
+    parser.add_argument("--photo-size", choices=["small", "medium", "large", "orig"],
+                        help="Photo size variant to download (default: the plain URL)")
+    parser.add_argument("--prometheus-textfile",
+                        help="Also write run metrics to this Prometheus textfile")
+    parser.add_argument("--loop-lag-threshold", type=float, default=0.25,
+                        help="Report event-loop stalls longer than this many seconds (default: 0.25)")
 
     parsed = parser.parse_args(args)
+    if parsed.parquet and importlib.util.find_spec("pyarrow") is None:
+        parser.error("--parquet needs pyarrow: pip install pyarrow")
 
-    if parsed.cookies:
+    if parsed.refresh and parsed.incremental:
+        parser.error("--refresh and --incremental cannot be combined")
+
+    if parsed.reshard and not parsed.layout:
+        parser.error("--reshard needs --layout")
+
+    if parsed.cookies or parsed.accounts or parsed.reshard:
         username = parsed.username or ""
         email = parsed.email or ""
         password = parsed.password or ""
@@ -37,4 +119,28 @@ def parse_args(args=None) -> Config:
         email=email,
         password=password,
         cookies=parsed.cookies,
+        accounts=parsed.accounts,
+        media_concurrency=parsed.media_concurrency,
+        media_per_host=parsed.media_per_host,
+        fsync_media=parsed.fsync_media,
+        verify_media=parsed.verify_media,
+        max_bitrate=parsed.max_bitrate,
+        max_resolution=parsed.max_resolution,
+        max_video_mb=parsed.max_video_mb,
+        smallest_video=parsed.smallest_video,
+        photo_size=parsed.photo_size,
+        incremental=parsed.incremental,
+        refresh=parsed.refresh,
+        checkpoint_pages=parsed.checkpoint_pages,
+        checkpoint_seconds=parsed.checkpoint_seconds,
+        thread_concurrency=parsed.thread_concurrency,
+        tweet_cache_ttl_days=parsed.tweet_cache_ttl,
+        tweet_cache_size=parsed.tweet_cache_size,
+        render_workers=parsed.render_workers,
+        sqlite=parsed.sqlite,
+        parquet=parsed.parquet,
+        layout=parsed.layout,
+        reshard=parsed.reshard,
+        prometheus_textfile=parsed.prometheus_textfile,
+        loop_lag_threshold=parsed.loop_lag_threshold,
     )
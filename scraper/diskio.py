@@ -0,0 +1,54 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# Writes queued on the I/O thread before ``write`` makes its caller wait
+MAX_PENDING = 256
+
+
+class DiskIO:
+    """Runs blocking file I/O on one dedicated thread, off the event loop.
+
+    ``run`` waits for the call's result. ``write`` is write-behind: it
+    returns as soon as the call is queued, and only waits while
+    ``max_pending`` writes are already queued. Calls run one at a time in
+    the order they were made, so a ``run`` always sees the effect of the
+    writes queued before it. An exception raised by a queued write is
+    raised again by the next ``drain``.
+    """
+
+    def __init__(self, max_pending: int = MAX_PENDING):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="disk-io")
+        self._slots = asyncio.Semaphore(max(1, max_pending))
+        self._pending: set[asyncio.Future] = set()
+        self._error: BaseException | None = None
+
+    async def run(self, fn, *args, **kwargs):
+        """Call ``fn`` on the I/O thread and return its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def write(self, fn, *args, **kwargs):
+        """Queue a call to ``fn`` on the I/O thread without waiting for it."""
+        await self._slots.acquire()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        self._pending.add(future)
+        future.add_done_callback(self._written)
+
+    def _written(self, future: asyncio.Future):
+        self._pending.discard(future)
+        self._slots.release()
+        if not future.cancelled() and future.exception() is not None and self._error is None:
+            self._error = future.exception()
+
+    async def drain(self):
+        """Wait for every queued write, raising the first one that failed."""
+        if self._pending:
+            await asyncio.wait(list(self._pending))
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def close(self):
+        self._executor.shutdown(wait=True)
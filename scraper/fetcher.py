@@ -1,83 +1,126 @@
-import asyncio
-import time
-from typing import Callable
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable
 
-from twikit.errors import TooManyRequests
+from scraper.models import Tweet
+from scraper.quality import MediaPolicy
+from scraper.ratelimit import RateLimiter
 
 
-def _extract_tweets(result) -> list[dict]:
-    bookmarks = []
-    for tweet in result:
-        bookmarks.append({
-            "id": tweet.id,
-            "text": tweet.text,
-            "author": f"{tweet.user.name} (@{tweet.user.screen_name})",
-            "handle": tweet.user.screen_name,
-            "created_at": tweet.created_at,
-            "likes": tweet.favorite_count,
-            "retweets": tweet.retweet_count,
-            "replies": tweet.reply_count,
-            "url": f"https://x.com/{tweet.user.screen_name}/status/{tweet.id}",
-            "has_media": bool(tweet.media),
-            "is_reply": tweet.in_reply_to is not None,
-            "in_reply_to": tweet.in_reply_to,
-            "media_items": [
-                {
-                    "type": media.type,
-                    "url": media.media_url if media.type == "photo"
-                           else (media.streams[-1].url if media.streams else None),
-                    "filename": f"{tweet.id}_{i}.{'jpg' if media.type == 'photo' else 'mp4'}",
-                }
-                for i, media in enumerate(tweet.media or [])
-            ],
-        })
-    return bookmarks
+def _extract_tweets(result, policy: MediaPolicy | None = None) -> list[Tweet]:
+    return [Tweet.from_twikit(tweet, policy) for tweet in result]
 
 
-async def fetch_bookmarks(client, on_progress: Callable[[int], None] | None = None, tracker=None) -> list[dict]:
-    # Resume from saved cursor if tracker has one
-    kwargs = {"count": 20}
-    if tracker and tracker.get_cursor():
-        kwargs["cursor"] = tracker.get_cursor()
+@dataclass
+class BookmarkPage:
+    bookmarks: list[Tweet]
+    cursor: str | None = None
+    high_water: str | None = None
+
+    def commit(self, tracker):
+        """Record this page as processed in the tracker."""
+        if self.cursor is not None:
+            tracker.save_cursor(self.cursor)
+        if self.high_water is not None:
+            tracker.save_high_water(self.high_water)
+
 
-    result = await client.get_bookmarks(**kwargs)
+def _all_known(bookmarks: list[Tweet], tracker) -> bool:
+    return all(tracker.is_scraped(bm.id) for bm in bookmarks)
 
-    new_tweets = _extract_tweets(result)
 
-    if tracker and hasattr(result, "cursor"):
-        tracker.save_cursor(result.cursor)
+async def iter_bookmark_pages(
+    client,
+    tracker=None,
+    cursor: str | None = None,
+    incremental: bool = False,
+    commit: bool = True,
+    limiter: RateLimiter | None = None,
+    policy: MediaPolicy | None = None,
+    from_top: bool = False,
+) -> AsyncIterator[BookmarkPage]:
+    """Yield bookmarks one page at a time.
 
-    bookmarks = list(new_tweets)
-    if on_progress:
-        on_progress(len(bookmarks))
-    print(f"Fetched {len(bookmarks)} bookmarks so far...")
+    Paging starts from ``cursor``, or from the tracker's saved cursor. When a
+    tracker is given, a page's cursor is saved only once the consumer asks
+    for the following page, i.e. after it has finished with this one. Pass
+    ``commit=False`` to leave that to the consumer via ``BookmarkPage.commit``.
+
+    In ``incremental`` mode paging always starts from the newest bookmark and
+    stops at the first page whose IDs the tracker has all seen before. The
+    saved cursor is left alone and the newest ID is recorded as the
+    tracker's high-water mark instead. ``from_top`` does the same without
+    stopping early, to go over every bookmark again.
+
+    Requests are paced and retried by ``limiter`` under the "Bookmarks"
+    endpoint budget. Media variants are chosen by ``policy``.
+    """
+    if incremental and tracker is None:
+        raise ValueError("incremental sync needs a tracker")
+
+    limiter = limiter or RateLimiter()
+    kwargs = {"count": 20}
+    from_top = from_top or incremental
+    if not from_top:
+        cursor = cursor or (tracker.get_cursor() if tracker else None)
+        if cursor:
+            kwargs["cursor"] = cursor
+
+    result = await limiter.call("Bookmarks", client.get_bookmarks, **kwargs)
+    new_tweets = _extract_tweets(result, policy)
+    fetched = 0
 
     while True:
-        await asyncio.sleep(2)
-        try:
-            next_result = await result.next()
-        except TooManyRequests as e:
-            wait_seconds = 60
-            if e.rate_limit_reset is not None:
-                wait_seconds = max(e.rate_limit_reset - int(time.time()), 1)
-            print(f"Rate limited, waiting {wait_seconds}s...")
-            await asyncio.sleep(wait_seconds)
-            next_result = await result.next()
+        if incremental and new_tweets and _all_known(new_tweets, tracker):
+            print("Reached already-scraped bookmarks, stopping incremental sync")
+            break
+
+        first_page = fetched == 0
+        fetched += len(new_tweets)
+        print(f"Fetched {fetched} bookmarks so far...")
+        if new_tweets:
+            page = BookmarkPage(new_tweets)
+            if not from_top:
+                page.cursor = getattr(result, "cursor", None)
+            elif first_page:
+                page.high_water = new_tweets[0].id
+            yield page
+            if tracker and commit:
+                page.commit(tracker)
+
+        next_result = await limiter.call("Bookmarks", result.next)
 
         if not next_result:
             break
 
         result = next_result
-        new_tweets = _extract_tweets(result)
+        new_tweets = _extract_tweets(result, policy)
         if not new_tweets:
             break
 
-        if tracker and hasattr(result, "cursor"):
-            tracker.save_cursor(result.cursor)
 
-        bookmarks.extend(new_tweets)
+async def iter_bookmarks(client, tracker=None, cursor: str | None = None,
+                         limiter: RateLimiter | None = None,
+                         policy: MediaPolicy | None = None) -> AsyncIterator[Tweet]:
+    """Yield bookmarks one at a time, paging lazily underneath."""
+    async for page in iter_bookmark_pages(client, tracker=tracker, cursor=cursor,
+                                          limiter=limiter, policy=policy):
+        for bookmark in page.bookmarks:
+            yield bookmark
+
+
+async def fetch_bookmarks(
+    client,
+    on_progress: Callable[[int], None] | None = None,
+    tracker=None,
+    incremental: bool = False,
+    limiter: RateLimiter | None = None,
+    policy: MediaPolicy | None = None,
+) -> list[Tweet]:
+    bookmarks = []
+    pages = iter_bookmark_pages(client, tracker=tracker, incremental=incremental,
+                                limiter=limiter, policy=policy)
+    async for page in pages:
+        bookmarks.extend(page.bookmarks)
         if on_progress:
             on_progress(len(bookmarks))
-        print(f"Fetched {len(bookmarks)} bookmarks so far...")
-
     return bookmarks
@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+import posixpath
+import re
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from scraper.models import Tweet, parse_created_at
+
+LAYOUTS = ("flat", "date", "handle", "hash")
+
+# Twitter's snowflake IDs carry their creation time in milliseconds since this epoch
+_SNOWFLAKE_EPOCH_MS = 1288834974657
+
+_MARKDOWN_NAME = re.compile(r"^@(.+)-([^-]+)\.md$")
+_MEDIA_NAME = re.compile(r"^(\d+)_\d+\.\w+(\.part)?$")
+_MEDIA_LINK = re.compile(r"\]\((?:\.\./)*media/(?:[^)/]+/)*([^)/]+)\)")
+
+
+def bookmark_filename(bookmark: Tweet) -> str:
+    return f"@{bookmark.handle}-{bookmark.id}.md"
+
+
+def _hash_shard(tweet_id: str) -> str:
+    return hashlib.sha1(tweet_id.encode()).hexdigest()[:2]
+
+
+def _month_shard(when: datetime | None) -> str:
+    return f"{when:%Y}/{when:%m}" if when is not None else "undated"
+
+
+def _snowflake_time(tweet_id: str) -> datetime | None:
+    try:
+        ms = (int(tweet_id) >> 22) + _SNOWFLAKE_EPOCH_MS
+    except ValueError:
+        return None
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+
+
+@dataclass(frozen=True)
+class Layout:
+    """Where markdown and media files go inside the output folder.
+
+    ``flat`` keeps every file in the output folder and ``media/``. The
+    sharded layouts put markdown in subfolders by month of posting
+    (``date``: ``2024/03/``), by lowercased author handle (``handle``), or
+    by a two-character hash of the tweet ID (``hash``). Media is sharded
+    by the tweet ID in its filename, so its folder never depends on which
+    bookmark or thread it came from: by month of the ID's snowflake
+    timestamp for ``date``, by ID hash otherwise.
+    """
+
+    kind: str = "flat"
+
+    def __post_init__(self):
+        if self.kind not in LAYOUTS:
+            raise ValueError(f"unknown layout: {self.kind}")
+
+    def markdown_path(self, bookmark: Tweet) -> str:
+        """The bookmark's markdown file, relative to the output folder."""
+        filename = bookmark_filename(bookmark)
+        if self.kind == "flat":
+            return filename
+        if self.kind == "date":
+            shard = _month_shard(parse_created_at(bookmark.created_at))
+        elif self.kind == "handle":
+            shard = bookmark.handle.lower()
+        else:
+            shard = _hash_shard(bookmark.id)
+        return posixpath.join(shard, filename)
+
+    def media_path(self, filename: str) -> str:
+        """A media file's path relative to the ``media`` folder."""
+        if self.kind == "flat":
+            return filename
+        tweet_id = filename.split("_", 1)[0]
+        if self.kind == "date":
+            shard = _month_shard(_snowflake_time(tweet_id))
+        else:
+            shard = _hash_shard(tweet_id)
+        return posixpath.join(shard, filename)
+
+    def media_link(self, bookmark: Tweet, filename: str) -> str:
+        """The link from the bookmark's markdown file to a media file."""
+        depth = self.markdown_path(bookmark).count("/")
+        return "../" * depth + "media/" + self.media_path(filename)
+
+    @staticmethod
+    def _path(output_dir: str) -> str:
+        return os.path.join(output_dir, "layout.json")
+
+    @classmethod
+    def load(cls, output_dir: str) -> "Layout | None":
+        """The layout recorded in ``output_dir``, or None if none is."""
+        path = cls._path(output_dir)
+        if not os.path.isfile(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f)["layout"])
+
+    def save(self, output_dir: str):
+        with open(self._path(output_dir), "w", encoding="utf-8") as f:
+            json.dump({"layout": self.kind}, f)
+
+    @classmethod
+    def resolve(cls, output_dir: str, requested: str | None) -> "Layout":
+        """The layout to scrape into, recording it for later runs.
+
+        Archives from before layouts were recorded are flat. Raises
+        ValueError if ``requested`` differs from an existing archive's
+        layout, which has to be changed with ``reshard``.
+        """
+        recorded = cls.load(output_dir)
+        if recorded is None and os.path.isfile(os.path.join(output_dir, "manifest.json")):
+            recorded = cls("flat")
+        if requested is None:
+            layout = recorded or cls("flat")
+        else:
+            layout = cls(requested)
+            if recorded is not None and recorded != layout:
+                raise ValueError(
+                    f"{output_dir} uses the {recorded.kind} layout; "
+                    f"run with --reshard --layout {layout.kind} to convert it"
+                )
+        layout.save(output_dir)
+        return layout
+
+
+def _frontmatter_date(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        if f.readline().strip() != "---":
+            return ""
+        for line in f:
+            if line.strip() == "---":
+                break
+            if line.startswith("date: "):
+                return line[len("date: "):].strip().strip('"')
+    return ""
+
+
+def _walk_files(root: str, skip: set[str]):
+    """Yield (directory, filename) under ``root``, not descending into ``skip``."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        if dirpath == root:
+            dirnames[:] = [d for d in dirnames if d not in skip]
+        for filename in filenames:
+            yield dirpath, filename
+
+
+def _move(src: str, dest: str) -> bool:
+    if os.path.abspath(src) == os.path.abspath(dest):
+        return False
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    os.replace(src, dest)
+    return True
+
+
+def _remove_empty_dirs(root: str, skip: set[str]):
+    for dirpath, dirnames, _ in os.walk(root, topdown=False):
+        relative = os.path.relpath(dirpath, root)
+        if relative == "." or relative.split(os.sep)[0] in skip:
+            continue
+        if not os.listdir(dirpath):
+            os.rmdir(dirpath)
+
+
+def reshard(output_dir: str, layout: Layout, index=None) -> tuple[int, int]:
+    """Move an existing archive's files into ``layout``, in place.
+
+    Markdown files are rewritten with media links for the new layout, and
+    their entries in ``index`` (the archive's loaded ``RenderIndex``) are
+    carried over so ``--refresh`` doesn't take the new links for changes.
+    Returns the number of markdown and media files moved.
+    """
+    previous = Layout.load(output_dir) or Layout()
+    media_dir = os.path.join(output_dir, "media")
+    media_moved = 0
+    if os.path.isdir(media_dir):
+        for dirpath, filename in list(_walk_files(media_dir, skip={"store"})):
+            match = _MEDIA_NAME.match(filename)
+            if not match:
+                continue
+            name = filename[:-len(".part")] if match.group(2) else filename
+            dest = os.path.join(media_dir, layout.media_path(name) + (match.group(2) or ""))
+            media_moved += _move(os.path.join(dirpath, filename), dest)
+        _remove_empty_dirs(media_dir, skip={"store"})
+
+    markdown_moved = 0
+    for dirpath, filename in list(_walk_files(output_dir, skip={"media"})):
+        match = _MARKDOWN_NAME.match(filename)
+        if not match:
+            continue
+        src = os.path.join(dirpath, filename)
+        bookmark = Tweet(id=match.group(2), text="", author="", handle=match.group(1),
+                         created_at=_frontmatter_date(src))
+        dest = os.path.join(output_dir, layout.markdown_path(bookmark))
+        with open(src, "r", encoding="utf-8") as f:
+            text = f.read()
+        relinked = _MEDIA_LINK.sub(
+            lambda m: f"]({layout.media_link(bookmark, m.group(1))})", text)
+        if index is not None and relinked != text:
+            index.relinked(bookmark.id, text, relinked, previous.kind, layout.kind)
+        if os.path.abspath(src) == os.path.abspath(dest):
+            if relinked != text:
+                with open(src, "w", encoding="utf-8") as f:
+                    f.write(relinked)
+            continue
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp_path = dest + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(relinked)
+        os.replace(tmp_path, dest)
+        os.remove(src)
+        markdown_moved += 1
+    _remove_empty_dirs(output_dir, skip={"media"})
+
+    layout.save(output_dir)
+    return markdown_moved, media_moved
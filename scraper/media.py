@@ -1,69 +1,406 @@
 import asyncio
+import hashlib
+import importlib.util
 import os
+import time
+from urllib.parse import urlsplit
 
 import httpx
 
+from scraper.diskio import DiskIO
+from scraper.layout import Layout
+from scraper.metrics import Metrics
+from scraper.models import Media
+from scraper.store import MediaIndex, MediaStore, normalize_url
+
+# HTTP/2 needs the optional h2 package (pip install httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+THROTTLE_STATUSES = {429, 500, 502, 503, 504}
+
+CHUNK_SIZE = 64 * 1024
+
+
+class AdaptivePacer:
+    """Spaces out request starts, backing off when the server pushes back.
+
+    The delay starts at ``min_delay`` and doubles on every 429/5xx response,
+    then halves again on each success until it is back at the floor.
+    """
+
+    def __init__(self, min_delay: float = 0.0, max_delay: float = 30.0):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.delay = min_delay
+        self._next_start = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        start = max(now, self._next_start)
+        self._next_start = start + self.delay
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def on_success(self):
+        self.delay = max(self.min_delay, self.delay / 2)
+        if self.delay < 0.05:
+            self.delay = self.min_delay
+
+    def on_throttle(self, retry_after: float | None = None):
+        self.delay = min(self.max_delay, max(self.delay * 2, 0.5))
+        if retry_after:
+            self._next_start = max(self._next_start, time.monotonic() + retry_after)
+
+
+def _retry_after(response) -> float | None:
+    value = response.headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _hash_file(path: str, digest):
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest
+
+
+class _PartFile:
+    """A download's ``.part`` file, written from the I/O thread.
+
+    A failed write is kept and raised by ``close``, so chunks can be
+    written behind without losing the error.
+    """
+
+    def __init__(self, path: str, mode: str):
+        self._file = open(path, mode)
+        self._error: OSError | None = None
+
+    def write(self, chunk: bytes):
+        if self._error is not None:
+            return
+        try:
+            self._file.write(chunk)
+        except OSError as e:
+            self._error = e
+
+    def close(self, fsync: bool = False):
+        try:
+            if fsync and self._error is None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+        finally:
+            self._file.close()
+        if self._error is not None:
+            raise self._error
+
+
+class MediaPool:
+    """Download capacity shared by several ``MediaDownloader``s.
+
+    Holds one pooled HTTP client, a cap of ``concurrency`` downloads in
+    flight across every downloader using it, the per-host limits, the
+    pacer and the per-URL locks. Used in batch mode so that accounts
+    scraped side by side stay within one set of limits and never fetch
+    the same URL twice at once; a downloader made without one gets a pool
+    of its own. The client is made on first use and kept open, so its
+    connections are reused across pages, until ``aclose``.
+    """
+
+    def __init__(self, concurrency: int = 8, per_host: int = 4):
+        self.concurrency = max(1, concurrency)
+        self.per_host = max(1, per_host)
+        self.slots = asyncio.Semaphore(self.concurrency)
+        self.pacer = AdaptivePacer()
+        self.url_locks: dict[str, asyncio.Lock] = {}
+        self._host_limits: dict[str, asyncio.Semaphore] = {}
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=60,
+                http2=HTTP2_AVAILABLE,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=self.concurrency,
+                    max_keepalive_connections=self.concurrency,
+                ),
+            )
+        return self._client
+
+    def host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).hostname or ""
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        return self._host_limits[host]
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
 
 class MediaDownloader:
-    def __init__(self, output_dir: str):
+    def __init__(self, output_dir: str, concurrency: int = 8, per_host: int = 4,
+                 fsync: bool = False, store: MediaStore | None = None,
+                 pool: MediaPool | None = None, metrics: Metrics | None = None,
+                 layout: Layout | None = None, io: DiskIO | None = None):
         self.media_dir = os.path.join(output_dir, "media")
+        self.layout = layout if layout is not None else Layout()
+        self._dirs = {self.media_dir}
         os.makedirs(self.media_dir, exist_ok=True)
+        # A store, pool or I/O thread passed in belongs to the caller, who closes it
+        self._owns_store = store is None
+        self._owns_io = io is None
+        self.io = io if io is not None else DiskIO()
+        self.store = store if store is not None else MediaStore(self.media_dir)
+        self.index = MediaIndex(self.media_dir)
+        self._shared = pool is not None
+        self._pool = pool if pool is not None else MediaPool(concurrency, per_host)
+        self.concurrency = self._pool.concurrency
+        self.per_host = self._pool.per_host
+        self.fsync = fsync
+        self.metrics = metrics if metrics is not None else Metrics()
         self._downloaded = 0
         self._skipped = 0
 
-    async def download_all(self, bookmarks, threads, on_progress=None):
-        """Download media for all bookmarks and their thread parents."""
-        # Collect all tweet dicts, deduplicate by tweet ID
+    def _collect_items(self, bookmarks, threads) -> list[Media]:
+        # Collect all tweets, deduplicate by tweet ID
         seen = set()
         all_tweets = []
         for bm in bookmarks:
-            if bm["id"] not in seen:
-                seen.add(bm["id"])
+            if bm.id not in seen:
+                seen.add(bm.id)
                 all_tweets.append(bm)
         for thread in threads.values():
             for tweet in thread:
-                if tweet["id"] not in seen:
-                    seen.add(tweet["id"])
+                if tweet.id not in seen:
+                    seen.add(tweet.id)
                     all_tweets.append(tweet)
 
-        # Collect all media items
         items = []
         for tweet in all_tweets:
-            for item in tweet.get("media_items", []):
-                if item.get("url"):
+            for item in tweet.media:
+                if item.url:
                     items.append(item)
+        return items
+
+    async def download_all(self, bookmarks, threads, on_progress=None):
+        """Download media for all bookmarks and their thread parents.
 
+        Up to ``concurrency`` downloads run at once over the pool's client,
+        with at most ``per_host`` of them against any one host. The client
+        stays open between calls. With a shared ``MediaPool`` those limits
+        and the client are shared with the pool's other downloaders.
+        ``on_progress(i, total)`` fires as each item is started.
+        """
+        items = self._collect_items(bookmarks, threads)
         total = len(items)
-        for i, item in enumerate(items, 1):
-            if on_progress:
-                on_progress(i, total)
-            await self._download_item(item)
-            if i < total:
-                await asyncio.sleep(0.5)
+        if not total:
+            return self._downloaded, self._skipped
+
+        pending = iter(items)
+        started = 0
+
+        async def worker(client):
+            nonlocal started
+            for item in pending:
+                started += 1
+                if on_progress:
+                    on_progress(started, total)
+                async with self._pool.slots:
+                    await self._download_item(client, item)
+
+        workers = min(self.concurrency, total)
+        await asyncio.gather(*(worker(self._pool.client) for _ in range(workers)))
 
         return self._downloaded, self._skipped
 
-    async def _download_item(self, item: dict) -> bool:
+    def verify(self, checksums: bool = False) -> int:
+        """Check every finished file against its indexed size (and SHA-256
+        if ``checksums``). Mismatched files are removed and marked corrupt so
+        the next download_all fetches them again. Returns the number found.
+        """
+        corrupt = 0
+        for filename, entry in self.index.items():
+            if entry.get("status") != "done":
+                continue
+            path = self._path(filename)
+            ok = os.path.exists(path) and os.path.getsize(path) == entry.get("size")
+            if ok and checksums and entry.get("sha256"):
+                ok = _hash_file(path, hashlib.sha256()).hexdigest() == entry["sha256"]
+            if ok:
+                continue
+            corrupt += 1
+            # Per-tweet files are hardlinks, so the stored blob is damaged too
+            blob_path = self.store.lookup(entry["url"]) if entry.get("url") else None
+            for p in (path, blob_path):
+                if p and os.path.lexists(p):
+                    os.remove(p)
+            self.index.record(filename, status="corrupt")
+        return corrupt
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.media_dir, self.layout.media_path(filename))
+
+    def _ensure_dir(self, path: str):
+        directory = os.path.dirname(path)
+        if directory not in self._dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._dirs.add(directory)
+
+    def close(self):
+        if self._owns_store:
+            self.store.close()
+        self.index.close()
+        if self._owns_io:
+            self.io.close()
+
+    async def aclose(self):
+        """Close the HTTP client of a pool this downloader made itself."""
+        if not self._shared:
+            await self._pool.aclose()
+
+    async def _download_item(self, client: httpx.AsyncClient, item: Media) -> bool:
         """Download a single media item. Returns True if downloaded, False if skipped."""
-        filepath = os.path.join(self.media_dir, item["filename"])
-        if os.path.exists(filepath):
+        filepath = self._path(item.filename)
+        if self.index.is_done(item.filename):
+            self._skipped += 1
+            return False
+        if self.index.get(item.filename) is None and os.path.exists(filepath):
+            # Downloaded before the index existed: adopt it without refetching
+            await self.io.run(self._adopt, item, filepath)
+            self._skipped += 1
+            return False
+
+        # Items sharing a URL wait for the first download, then link to it
+        key = normalize_url(item.url)
+        lock = self._pool.url_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            return await self._fetch_or_link(client, item, filepath)
+
+    async def _fetch_or_link(self, client: httpx.AsyncClient, item: Media, filepath: str) -> bool:
+        blob_path = self.store.lookup(item.url)
+        if blob_path and os.path.exists(blob_path):
+            await self.io.run(self._link, item, blob_path, filepath)
             self._skipped += 1
             return False
 
-        for attempt in range(3):
-            try:
-                async with httpx.AsyncClient(timeout=60) as client:
-                    resp = await client.get(item["url"], follow_redirects=True)
-                    resp.raise_for_status()
-                    with open(filepath, "wb") as f:
-                        f.write(resp.content)
-                self._downloaded += 1
-                return True
-            except (httpx.ReadTimeout, httpx.ConnectTimeout, httpx.HTTPStatusError) as e:
-                if attempt < 2:
-                    wait = (attempt + 1) * 5
-                    print(f"Download failed for {item['filename']}, retrying in {wait}s: {e}")
-                    await asyncio.sleep(wait)
-                else:
-                    print(f"Download failed for {item['filename']} after 3 attempts, skipping: {e}")
-                    return False
+        part_path = filepath + ".part"
+        await self.io.run(self._ensure_dir, filepath)
+        await self.io.run(self._claim_part, item, part_path)
+        async with self._pool.host_limit(item.url):
+            for attempt in range(3):
+                await self._pool.pacer.wait()
+                try:
+                    digest = await self._stream_to_file(client, item.url, part_path)
+                    await self.io.run(self._store, item, part_path, digest, filepath)
+                    self._pool.pacer.on_success()
+                    self._downloaded += 1
+                    return True
+                except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                    if isinstance(e, httpx.HTTPStatusError) and e.response.status_code in THROTTLE_STATUSES:
+                        self._pool.pacer.on_throttle(_retry_after(e.response))
+                    if attempt < 2:
+                        self.metrics.add("media_retries")
+                        wait = (attempt + 1) * 5
+                        print(f"Download failed for {item.filename}, retrying in {wait}s: {e}")
+                        await asyncio.sleep(wait)
+                    else:
+                        print(f"Download failed for {item.filename} after 3 attempts, skipping: {e}")
+                        await self.io.run(self.index.record, item.filename,
+                                          url=item.url, status="failed")
+                        self.metrics.add("media_failed")
+                        return False
+
+    # The methods below run on the I/O thread
+
+    def _claim_part(self, item: Media, part_path: str):
+        """Keep a leftover ``.part`` only if the index says it was being
+        downloaded from ``item.url``, and note the URL for the next run.
+
+        A media policy change can point the same filename at another
+        variant, whose bytes must not be appended to the old ones.
+        """
+        entry = self.index.get(item.filename) or {}
+        ours = (entry.get("status") == "partial" and entry.get("url") is not None
+                and normalize_url(entry["url"]) == normalize_url(item.url))
+        if ours:
+            return
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        self.index.record(item.filename, url=item.url, status="partial")
+
+    def _adopt(self, item: Media, filepath: str):
+        self.index.record(item.filename, url=item.url, sha256=None,
+                          size=os.path.getsize(filepath), status="done")
+
+    def _link(self, item: Media, blob_path: str, filepath: str):
+        self._ensure_dir(filepath)
+        if os.path.lexists(filepath):
+            os.remove(filepath)
+        self.store.link(blob_path, filepath)
+        self._record_done(item, blob_path)
+
+    def _store(self, item: Media, part_path: str, digest: str, filepath: str):
+        blob_path = self.store.add(item.url, part_path, digest)
+        if os.path.lexists(filepath):
+            os.remove(filepath)
+        self.store.link(blob_path, filepath)
+        self._record_done(item, blob_path)
+
+    def _record_done(self, item: Media, blob_path: str):
+        sha256 = os.path.splitext(os.path.basename(blob_path))[0]
+        self.index.record(item.filename, url=item.url, sha256=sha256,
+                          size=os.path.getsize(blob_path), status="done")
+
+    async def _stream_to_file(self, client: httpx.AsyncClient, url: str, part_path: str) -> str:
+        """Stream ``url`` into ``part_path`` in fixed-size chunks and return
+        the SHA-256 of the complete file.
+
+        Chunks are written behind on the I/O thread. An existing ``.part``
+        file is resumed with a Range request; if the server ignores the
+        range the file is rewritten from the start, and if it answers with
+        a range starting anywhere else the file is fetched again whole.
+        """
+        while True:
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            headers = {"Range": f"bytes={offset}-"} if offset else None
+            async with client.stream("GET", url, headers=headers) as resp:
+                if (offset and resp.status_code == 206
+                        and not resp.headers.get("content-range", "").startswith(f"bytes {offset}-")):
+                    # Appending a range that starts elsewhere would splice the file
+                    await self.io.run(os.remove, part_path)
+                    continue
+                return await self._write_part(resp, offset, part_path)
+
+    async def _write_part(self, resp, offset: int, part_path: str) -> str:
+        """Write the body of ``resp`` to ``part_path`` and return the
+        SHA-256 of the complete file."""
+        if offset and resp.status_code == 416:
+            # Nothing left to fetch if the .part already holds the full body
+            if resp.headers.get("content-range") == f"bytes */{offset}":
+                digest = await self.io.run(_hash_file, part_path, hashlib.sha256())
+                return digest.hexdigest()
+            await self.io.run(os.remove, part_path)
+        resp.raise_for_status()
+
+        digest = hashlib.sha256()
+        if offset and resp.status_code == 206:
+            mode = "ab"
+            await self.io.run(_hash_file, part_path, digest)
+        else:
+            mode = "wb"
+        part = await self.io.run(_PartFile, part_path, mode)
+        try:
+            async for chunk in resp.aiter_bytes(CHUNK_SIZE):
+                await self.io.write(part.write, chunk)
+                digest.update(chunk)
+                self.metrics.add("media_bytes", len(chunk))
+        finally:
+            await self.io.run(part.close, self.fsync)
+        return digest.hexdigest()
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import os
+import time
+from contextlib import contextmanager
+
+# Prefix for metric names in the Prometheus textfile
+PROMETHEUS_PREFIX = "bookmarks_scraper_"
+
+
+class Metrics:
+    """Counters, gauges and phase timers for one run.
+
+    Each metric is a number, or a set of numbers keyed by one label (the
+    phase or API endpoint). ``to_dict`` gives the JSON form written to
+    ``metrics.json``; ``write_prometheus`` writes the node_exporter
+    textfile form.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._values: dict[str, dict[str, float]] = {}
+        self._label_names: dict[str, str] = {}
+
+    def _slot(self, name: str, labels: dict) -> tuple[dict, str]:
+        if len(labels) > 1:
+            raise ValueError("metrics take at most one label")
+        label_name, label = next(iter(labels.items()), ("", ""))
+        if label_name:
+            self._label_names[name] = label_name
+        return self._values.setdefault(name, {}), label
+
+    def add(self, name: str, amount: float = 1, **labels):
+        values, label = self._slot(name, labels)
+        values[label] = values.get(label, 0) + amount
+
+    def set(self, name: str, value: float, **labels):
+        values, label = self._slot(name, labels)
+        values[label] = value
+
+    def get(self, name: str, **labels) -> float:
+        values, label = self._slot(name, labels)
+        return values.get(label, 0)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Add the wall time spent inside the block to ``phase_seconds``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add("phase_seconds", time.perf_counter() - start, phase=name)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    def to_dict(self) -> dict:
+        data = {
+            "started_at": self.started_at,
+            "run_seconds": round(self.elapsed, 3),
+        }
+        for name, values in sorted(self._values.items()):
+            if name in self._label_names:
+                data[name] = {label: _round(v) for label, v in sorted(values.items())}
+            else:
+                data[name] = _round(values.get("", 0))
+        return data
+
+    def samples(self, **const_labels):
+        """Yield (metric name, labels, value) for every recorded value."""
+        values = {**self._values, "run_seconds": {"": self.elapsed}}
+        for name, by_label in sorted(values.items()):
+            for label, value in sorted(by_label.items()):
+                labels = dict(const_labels)
+                if label:
+                    labels[self._label_names[name]] = label
+                yield PROMETHEUS_PREFIX + name, labels, value
+
+    def write_json(self, path: str):
+        _write_atomic(path, json.dumps(self.to_dict(), indent=2) + "\n")
+
+
+class LoopLagMonitor:
+    """Watches for stalls of the event loop while a run is in progress.
+
+    Every ``interval`` seconds a timer is set and the lateness of its
+    callback is measured: time the loop spent blocked in some synchronous
+    call instead of serving other tasks. Lateness above ``threshold`` is
+    printed and counted in ``loop_stalls``; the worst seen is kept in
+    ``loop_lag_max_seconds``.
+    """
+
+    def __init__(self, metrics: Metrics | None = None, threshold: float = 0.25,
+                 interval: float = 0.05):
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls = 0
+        self.max_lag = 0.0
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.metrics.set("loop_stalls", self.stalls)
+        self.metrics.set("loop_lag_max_seconds", self.max_lag)
+
+    async def _watch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # A plain timer rather than asyncio.sleep, which tests patch out
+            woken = loop.create_future()
+            due = loop.time() + self.interval
+            handle = loop.call_at(due, woken.set_result, None)
+            try:
+                await woken
+            finally:
+                handle.cancel()
+            self._observe(loop.time() - due)
+
+    def _observe(self, lag: float):
+        self.max_lag = max(self.max_lag, lag)
+        if lag > self.threshold:
+            self.stalls += 1
+            print(f"Event loop stalled for {lag:.2f}s")
+
+
+def write_prometheus(path: str, runs: list[tuple[dict, Metrics]]):
+    """Write a node_exporter textfile for one or more runs.
+
+    Each run's samples carry its own constant labels (e.g. the account in
+    batch mode). The file is replaced atomically so it is never read half
+    written.
+    """
+    families: dict[str, list[str]] = {}
+    for const_labels, metrics in runs:
+        for name, labels, value in metrics.samples(**const_labels):
+            families.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value:g}")
+    lines = []
+    for name, samples in families.items():
+        lines.append(f"# TYPE {name} gauge")
+        lines.extend(samples)
+    _write_atomic(path, "\n".join(lines) + "\n")
+
+
+def ratio(part: float, whole: float) -> float:
+    return part / whole if whole else 0.0
+
+
+def _round(value: float) -> float:
+    return round(value, 3) if isinstance(value, float) else value
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    body = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+    return "{" + body + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write_atomic(path: str, text: str):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
@@ -0,0 +1,151 @@
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+
+from scraper.quality import DEFAULT_POLICY, MediaPolicy
+
+
+# Text of the stand-in for a deleted or unavailable thread tweet
+UNAVAILABLE_TEXT = "[Tweet unavailable]"
+
+# Twitter's created_at format, e.g. "Fri Mar 15 12:00:00 +0000 2024"
+_CREATED_AT_FORMAT = "%a %b %d %H:%M:%S %z %Y"
+
+
+def parse_created_at(value: str) -> datetime | None:
+    """A tweet's created_at as a datetime, or None if it cannot be parsed.
+
+    Accepts Twitter's format and ISO dates.
+    """
+    try:
+        return datetime.strptime(value, _CREATED_AT_FORMAT)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+@dataclass(frozen=True, slots=True)
+class Media:
+    type: str
+    url: str | None
+    filename: str
+
+
+def media_item(tweet_id: str, index: int, media, policy: MediaPolicy | None = None) -> Media:
+    """The download entry for one twikit attachment, picked by ``policy``."""
+    policy = policy or DEFAULT_POLICY
+    if media.type == "photo":
+        url = policy.photo_url(media.media_url)
+    else:
+        url = policy.video_url(media.streams, getattr(media, "duration_millis", None))
+    ext = "jpg" if media.type == "photo" else "mp4"
+    return Media(sys.intern(media.type), url, f"{tweet_id}_{index}.{ext}")
+
+
+@dataclass(frozen=True, slots=True)
+class Tweet:
+    """One bookmark or thread tweet.
+
+    Frozen and slotted to keep large archives small in memory: there is no
+    per-instance ``__dict__``, handles and author names are interned so
+    repeat authors share one string, and media is a tuple. The tweet URL
+    and the has_media/is_reply flags are derived rather than stored.
+    """
+
+    id: str
+    text: str
+    author: str
+    handle: str
+    created_at: str
+    likes: int = 0
+    retweets: int = 0
+    replies: int = 0
+    in_reply_to: str | None = None
+    media: tuple[Media, ...] = ()
+
+    @classmethod
+    def create(cls, id: str, text: str, name: str, handle: str, created_at: str, **kwargs) -> "Tweet":
+        return cls(
+            id=id,
+            text=text,
+            author=sys.intern(f"{name} (@{handle})"),
+            handle=sys.intern(handle),
+            created_at=created_at,
+            **kwargs,
+        )
+
+    @classmethod
+    def from_twikit(cls, tweet, policy: MediaPolicy | None = None) -> "Tweet":
+        return cls.create(
+            tweet.id,
+            tweet.text,
+            tweet.user.name,
+            tweet.user.screen_name,
+            tweet.created_at,
+            likes=tweet.favorite_count,
+            retweets=tweet.retweet_count,
+            replies=tweet.reply_count,
+            in_reply_to=tweet.in_reply_to,
+            media=tuple(
+                media_item(tweet.id, i, media, policy)
+                for i, media in enumerate(tweet.media or [])
+            ),
+        )
+
+    @classmethod
+    def placeholder(cls, tweet_id: str) -> "Tweet":
+        """Stand-in for a thread tweet that was deleted or is unavailable."""
+        return cls.create(tweet_id, UNAVAILABLE_TEXT, "Unknown", "unknown", "")
+
+    @property
+    def url(self) -> str:
+        return f"https://x.com/{self.handle}/status/{self.id}"
+
+    @property
+    def has_media(self) -> bool:
+        return bool(self.media)
+
+    @property
+    def is_reply(self) -> bool:
+        return self.in_reply_to is not None
+
+    @property
+    def is_placeholder(self) -> bool:
+        return self.handle == "unknown" and self.text == UNAVAILABLE_TEXT
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "text": self.text,
+            "author": self.author,
+            "handle": self.handle,
+            "created_at": self.created_at,
+            "likes": self.likes,
+            "retweets": self.retweets,
+            "replies": self.replies,
+            "in_reply_to": self.in_reply_to,
+            "media": [[m.type, m.url, m.filename] for m in self.media],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Tweet":
+        # Caches written before these records existed use "media_items"
+        if "media_items" in data:
+            media = tuple(Media(m["type"], m["url"], m["filename"]) for m in data["media_items"])
+        else:
+            media = tuple(Media(*m) for m in data.get("media", ()))
+        return cls(
+            id=data["id"],
+            text=data["text"],
+            author=sys.intern(data["author"]),
+            handle=sys.intern(data["handle"]),
+            created_at=data["created_at"],
+            likes=data.get("likes", 0),
+            retweets=data.get("retweets", 0),
+            replies=data.get("replies", 0),
+            in_reply_to=data.get("in_reply_to"),
+            media=media,
+        )
@@ -0,0 +1,166 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from scraper.models import Tweet, parse_created_at
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency, only needed for --parquet
+    pa = pc = pq = None
+
+# Rows buffered per table before they are written out as one row group
+ROW_GROUP_SIZE = 10_000
+
+
+def _tweet_fields():
+    media = pa.list_(pa.struct([
+        ("type", pa.string()),
+        ("url", pa.string()),
+        ("filename", pa.string()),
+    ]))
+    return [
+        pa.field("id", pa.string(), nullable=False),
+        pa.field("text", pa.string()),
+        pa.field("author", pa.string()),
+        pa.field("handle", pa.string()),
+        pa.field("created_at", pa.string()),
+        pa.field("created_at_utc", pa.timestamp("ms", tz="UTC")),
+        pa.field("likes", pa.int64()),
+        pa.field("retweets", pa.int64()),
+        pa.field("replies", pa.int64()),
+        pa.field("in_reply_to", pa.string()),
+        pa.field("url", pa.string()),
+        pa.field("media", media),
+    ]
+
+
+def bookmark_schema():
+    """One row per bookmark: the tweet plus the length of its thread."""
+    return pa.schema(_tweet_fields() + [pa.field("thread_length", pa.int32())])
+
+
+def thread_schema():
+    """One row per thread tweet, keyed by bookmark and position (root is 0)."""
+    return pa.schema([
+        pa.field("bookmark_id", pa.string(), nullable=False),
+        pa.field("position", pa.int32(), nullable=False),
+    ] + _tweet_fields())
+
+
+def _tweet_row(tweet: Tweet) -> dict:
+    return {
+        "id": tweet.id,
+        "text": tweet.text,
+        "author": tweet.author,
+        "handle": tweet.handle,
+        "created_at": tweet.created_at,
+        "created_at_utc": parse_created_at(tweet.created_at),
+        "likes": tweet.likes,
+        "retweets": tweet.retweets,
+        "replies": tweet.replies,
+        "in_reply_to": tweet.in_reply_to,
+        "url": tweet.url,
+        "media": [{"type": m.type, "url": m.url, "filename": m.filename} for m in tweet.media],
+    }
+
+
+class _Table:
+    """Streams rows of one schema to ``<path>.part`` a row group at a time.
+
+    On ``finish`` the previous file's rows are copied over, one row group
+    at a time, except those whose key was replaced in this run (by default
+    the keys written). The result then replaces the old file, so each key
+    appears with its latest values only.
+    """
+
+    def __init__(self, path: str, schema, key: str, row_group_size: int):
+        self.path = path
+        self.schema = schema
+        self.key = key
+        self.row_group_size = row_group_size
+        self._part_path = path + ".part"
+        self._writer = pq.ParquetWriter(self._part_path, schema)
+        self._columns: dict[str, list] = {name: [] for name in schema.names}
+        self._rows = 0
+        self.keys: set[str] = set()
+
+    def append(self, row: dict):
+        for name, values in self._columns.items():
+            values.append(row[name])
+        self.keys.add(row[self.key])
+        self._rows += 1
+        if self._rows >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        self._writer.write_table(pa.Table.from_pydict(self._columns, schema=self.schema))
+        for values in self._columns.values():
+            values.clear()
+        self._rows = 0
+
+    def finish(self, replaced: set[str] | None = None):
+        self.flush()
+        if os.path.isfile(self.path):
+            previous = pq.ParquetFile(self.path)
+            keys = pa.array(list(self.keys if replaced is None else replaced), pa.string())
+            for i in range(previous.num_row_groups):
+                group = previous.read_row_group(i).cast(self.schema)
+                keep = pc.invert(pc.is_in(group[self.key], value_set=keys))
+                self._writer.write_table(group.filter(keep))
+            previous.close()
+        self._writer.close()
+        os.replace(self._part_path, self.path)
+
+
+class ParquetExporter:
+    """Writes bookmarks and their threads as Parquet files for analytics.
+
+    ``bookmarks.parquet`` holds one row per bookmark and
+    ``threads.parquet`` one row per thread tweet; see ``bookmark_schema``
+    and ``thread_schema``. Rows are buffered and written in row groups of
+    ``row_group_size``, so memory stays bounded however large the account
+    is. Rows from earlier runs are carried over when the files are closed;
+    bookmarks exported again replace their old rows.
+    """
+
+    name = "parquet"
+
+    def __init__(self, output_dir: str, row_group_size: int = ROW_GROUP_SIZE):
+        if pa is None:
+            raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+        self.path = os.path.join(output_dir, "bookmarks.parquet")
+        self.written = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="parquet")
+        self._bookmarks = _Table(self.path, bookmark_schema(), "id", row_group_size)
+        self._threads = _Table(os.path.join(output_dir, "threads.parquet"),
+                               thread_schema(), "bookmark_id", row_group_size)
+
+    async def write_page(self, items: list[tuple[Tweet, list[Tweet] | None]]):
+        """Buffer (bookmark, thread) pairs, writing any full row groups."""
+        if not items:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._write, items)
+        self.written += len(items)
+
+    def _write(self, items: list[tuple[Tweet, list[Tweet] | None]]):
+        for bookmark, thread in items:
+            row = _tweet_row(bookmark)
+            row["thread_length"] = len(thread) if thread else 1
+            self._bookmarks.append(row)
+            for position, tweet in enumerate(thread or ()):
+                row = _tweet_row(tweet)
+                row["bookmark_id"] = bookmark.id
+                row["position"] = position
+                self._threads.append(row)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._bookmarks.finish()
+        # A re-exported bookmark's old thread rows go, even if it has no thread now
+        self._threads.finish(replaced=self._bookmarks.keys)
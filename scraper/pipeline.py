@@ -0,0 +1,240 @@
+import asyncio
+
+from scraper.archive import SqliteArchive
+from scraper.fetcher import iter_bookmark_pages
+from scraper.metrics import Metrics, ratio
+from scraper.parquet import ParquetExporter
+from scraper.quality import MediaPolicy
+from scraper.writer import MarkdownWriter
+
+# Pages buffered between two stages before the upstream stage blocks
+QUEUE_SIZE = 4
+
+_DONE = object()
+
+
+class FetchError(Exception):
+    """Raised when paging through bookmarks fails."""
+
+
+def make_exporters(config) -> list:
+    """The export stages enabled by ``--sqlite`` and ``--parquet``."""
+    exporters = []
+    if config.sqlite:
+        exporters.append(SqliteArchive.in_output(config.output))
+    if config.parquet:
+        exporters.append(ParquetExporter(config.output))
+    return exporters
+
+
+class Pipeline:
+    """Runs fetching, thread resolution, rendering and media download as
+    concurrent stages connected by bounded queues.
+
+    Each page of bookmarks flows through every stage as soon as it is
+    fetched, so files start landing on disk while pagination is still
+    running. A full queue blocks the stage feeding it. A page is marked
+    as scraped and its cursor committed only after its media has been
+    downloaded, so an interrupted run never skips media on restart.
+
+    Every page is also handed to each of ``exporters`` (the SQLite
+    archive, Parquet files) as it passes the render stage, including
+    bookmarks whose markdown already exists. Time spent working in each
+    stage is added to ``metrics`` as that stage's phase time.
+
+    With ``refresh``, paging starts from the newest bookmark and goes
+    through all of them, and bookmarks whose markdown exists are brought up
+    to date by ``MarkdownWriter.refresh_all`` instead of being skipped.
+
+    If paging fails, the pages already fetched still go through every
+    stage and are committed before ``run`` raises ``FetchError``, so a
+    restart resumes from the last page fetched.
+    """
+
+    def __init__(self, client, output_dir: str, tracker, resolver, downloader,
+                 queue_size: int = QUEUE_SIZE, incremental: bool = False, limiter=None,
+                 writer: MarkdownWriter | None = None, policy: MediaPolicy | None = None,
+                 metrics: Metrics | None = None, exporters: list | None = None,
+                 refresh: bool = False):
+        self.client = client
+        self.output_dir = output_dir
+        self.tracker = tracker
+        self.resolver = resolver
+        self.downloader = downloader
+        self.queue_size = queue_size
+        self.incremental = incremental
+        self.refresh = refresh
+        self.limiter = limiter
+        self.policy = policy
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.writer = writer or MarkdownWriter(output_dir)
+        self.exporters = exporters or []
+
+        self.total = 0
+        self.written = 0
+        self.skipped_md = 0
+        self.media_found = 0
+        self.downloaded = 0
+        self.skipped_media = 0
+        self._replies_seen = 0
+        self._replies_resolved = 0
+        self._fetch_error: Exception | None = None
+
+    async def run(self):
+        fetched = asyncio.Queue(self.queue_size)
+        resolved = asyncio.Queue(self.queue_size)
+        rendered = asyncio.Queue(self.queue_size)
+
+        await self.writer.prepare()
+        tasks = [
+            asyncio.create_task(self._fetch(fetched)),
+            asyncio.create_task(self._resolve(fetched, resolved)),
+            asyncio.create_task(self._render(resolved, rendered)),
+            asyncio.create_task(self._download(rendered)),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            self.writer.close()
+            for exporter in self.exporters:
+                exporter.close()
+            self.record_metrics()
+        if self._fetch_error is not None:
+            raise FetchError(self._fetch_error) from self._fetch_error
+
+    def record_metrics(self):
+        """Copy the run's totals and derived rates into ``metrics``."""
+        m = self.metrics
+        m.set("bookmarks", self.total)
+        m.set("markdown_written", self.written)
+        m.set("markdown_skipped", self.skipped_md)
+        m.set("markdown_files_per_sec", self.writer.files_per_sec)
+        if self.refresh:
+            m.set("markdown_unchanged", self.writer.unchanged)
+            m.set("markdown_frontmatter_updated", self.writer.refreshed)
+            m.set("markdown_rerendered", self.writer.rerendered)
+        for exporter in self.exporters:
+            m.set(f"{exporter.name}_written", exporter.written)
+        m.set("checkpoints", getattr(self.tracker, "checkpoints", 0))
+        m.set("media_found", self.media_found)
+        m.set("media_downloaded", self.downloaded)
+        m.set("media_skipped", self.skipped_media)
+
+        requests = getattr(self.resolver, "requests", 0)
+        coalesced = getattr(self.resolver, "coalesced", 0)
+        m.set("thread_requests", requests)
+        m.set("thread_requests_coalesced", coalesced)
+        m.set("thread_coalesce_ratio", ratio(coalesced, requests + coalesced))
+        threads = getattr(self.resolver, "threads", 0)
+        saved = getattr(self.resolver, "calls_saved", 0)
+        m.set("thread_calls_saved", saved)
+        m.set("thread_calls_saved_per_thread", ratio(saved, threads))
+        m.set("threads_derived", getattr(self.resolver, "derived", 0))
+        cache = getattr(self.resolver, "cache", None)
+        if cache is not None:
+            m.set("tweet_cache_hits", cache.hits)
+            m.set("tweet_cache_misses", cache.misses)
+            m.set("tweet_cache_hit_ratio", ratio(cache.hits, cache.hits + cache.misses))
+
+    async def _fetch(self, outbox: asyncio.Queue):
+        # Pages are committed by the download stage once their files and
+        # media are written, not when the generator moves on to the next page.
+        pages = iter_bookmark_pages(
+            self.client, tracker=self.tracker,
+            incremental=self.incremental, commit=False, limiter=self.limiter,
+            policy=self.policy, from_top=self.refresh,
+        )
+        try:
+            while True:
+                with self.metrics.phase("fetch"):
+                    page = await anext(pages, None)
+                if page is None:
+                    break
+                await outbox.put(page)
+        except Exception as e:
+            # Let the pages fetched so far finish; run() raises once they have
+            self._fetch_error = e
+        await outbox.put(_DONE)
+
+    async def _resolve(self, inbox: asyncio.Queue, outbox: asyncio.Queue):
+        while (page := await inbox.get()) is not _DONE:
+            self._replies_seen += sum(1 for bm in page.bookmarks if bm.in_reply_to)
+            # The whole page goes in: bookmarks can be other bookmarks' ancestors
+            with self.metrics.phase("resolve"):
+                threads = await self.resolver.resolve_many(page.bookmarks, on_progress=self._on_resolved)
+            await outbox.put((page, threads))
+        await outbox.put(_DONE)
+
+    def _on_resolved(self, i: int, total: int):
+        self._replies_resolved += 1
+        print(f"Resolving thread {self._replies_resolved}/{self._replies_seen}...")
+
+    async def _render(self, inbox: asyncio.Queue, outbox: asyncio.Queue):
+        while (item := await inbox.get()) is not _DONE:
+            page, threads = item
+            to_write = []
+            to_refresh = []
+            for bm in page.bookmarks:
+                self.total += 1
+                if self.refresh and self.writer.exists(bm):
+                    to_refresh.append((bm, threads.get(bm.id)))
+                    continue
+                if self.tracker.is_scraped(bm.id):
+                    self.skipped_md += 1
+                    continue
+                if self.writer.exists(bm):
+                    self.skipped_md += 1
+                    continue
+                to_write.append((bm, threads.get(bm.id)))
+
+            if to_write:
+                with self.metrics.phase("render"):
+                    await self.writer.write_all(to_write)
+                self.written += len(to_write)
+                print(f"Written {self.written} markdown files "
+                      f"({self.writer.files_per_sec:.0f} files/sec)...")
+            if to_refresh:
+                with self.metrics.phase("refresh"):
+                    await self.writer.refresh_all(to_refresh)
+                w = self.writer
+                print(f"Checked {w.unchanged + w.refreshed + w.rerendered} existing markdown files, "
+                      f"{w.refreshed + w.rerendered} updated...")
+            if self.exporters:
+                items = [(bm, threads.get(bm.id)) for bm in page.bookmarks]
+                with self.metrics.phase("export"):
+                    for exporter in self.exporters:
+                        await exporter.write_page(items)
+            await outbox.put(item)
+        await outbox.put(_DONE)
+
+    async def _download(self, inbox: asyncio.Queue):
+        while (item := await inbox.get()) is not _DONE:
+            page, threads = item
+            media_count = sum(len(bm.media) for bm in page.bookmarks) + sum(
+                len(t.media) for thread in threads.values() for t in thread
+            )
+            if media_count:
+                self.media_found += media_count
+                print(f"Found {media_count} media items to download")
+                with self.metrics.phase("download"):
+                    self.downloaded, self.skipped_media = await self.downloader.download_all(
+                        page.bookmarks, threads,
+                        on_progress=lambda i, total: (
+                            print(f"Downloading media {i}/{total}...")
+                            if i % 10 == 0 or i == total else None
+                        ),
+                    )
+            await self._commit(page)
+
+    async def _commit(self, page):
+        # Only once a page's files and media are all on disk may a restart
+        # skip it, so the last stage records it as done.
+        for bm in page.bookmarks:
+            self.tracker.mark_scraped(bm.id)
+        page.commit(self.tracker)
+        await self.tracker.flush()
@@ -0,0 +1,133 @@
+import asyncio
+import random
+import time
+
+import httpx
+from twikit.errors import ServerError, TooManyRequests
+
+from scraper.metrics import Metrics
+
+# Twitter rate limits are enforced over 15-minute windows
+WINDOW = 15 * 60
+
+# Requests per window for the GraphQL operations we call. These are only a
+# starting point: real budgets are taken from x-rate-limit-* headers.
+DEFAULT_BUDGETS = {
+    "Bookmarks": 500,
+    "TweetDetail": 150,
+}
+FALLBACK_BUDGET = 50
+
+
+class TokenBucket:
+    def __init__(self, limit: int, window: float = WINDOW):
+        self.capacity = float(limit)
+        self.rate = limit / window
+        self.tokens = float(limit)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """Take a token and return how many seconds to wait before using it.
+
+        Tokens may go negative, so callers queue up behind each other
+        instead of all waking at once when a token frees up.
+        """
+        self._refill()
+        wait = max(0.0, self._blocked_until - time.monotonic())
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        self.tokens -= 1
+        return wait
+
+    def block_for(self, seconds: float):
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class RateLimiter:
+    """Per-endpoint token buckets shared by every API caller.
+
+    Callers go through ``call(endpoint, fn, ...)``, which waits for a token
+    before each request and retries 429 and 5xx errors with jittered
+    exponential backoff, up to ``max_retries`` times. Once ``attach``-ed to
+    a twikit client, the limiter also reads the x-rate-limit-* headers on
+    every response, so it runs at whatever budget the server reports rather
+    than at a guessed one.
+
+    Calls, retries and time spent waiting are counted per endpoint in
+    ``metrics``.
+    """
+
+    def __init__(self, budgets: dict[str, int] | None = None, max_retries: int = 5,
+                 base_backoff: float = 2.0, max_backoff: float = WINDOW,
+                 metrics: Metrics | None = None):
+        self._budgets = {**DEFAULT_BUDGETS, **(budgets or {})}
+        self._buckets: dict[str, TokenBucket] = {}
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.metrics = metrics if metrics is not None else Metrics()
+
+    def bucket(self, endpoint: str) -> TokenBucket:
+        if endpoint not in self._buckets:
+            self._buckets[endpoint] = TokenBucket(self._budgets.get(endpoint, FALLBACK_BUDGET))
+        return self._buckets[endpoint]
+
+    def attach(self, client):
+        """Track budgets from the headers of every response ``client`` receives."""
+        http = getattr(client, "http", None)
+        if isinstance(http, httpx.AsyncClient):
+            http.event_hooks["response"].append(self._on_response)
+
+    async def _on_response(self, response: httpx.Response):
+        endpoint = response.url.path.rsplit("/", 1)[-1]
+        self.update(endpoint, response.headers)
+
+    def update(self, endpoint: str, headers):
+        """Sync an endpoint's bucket with x-rate-limit-* response headers."""
+        try:
+            limit = int(headers["x-rate-limit-limit"])
+            remaining = int(headers["x-rate-limit-remaining"])
+            reset = int(headers["x-rate-limit-reset"])
+        except (KeyError, TypeError, ValueError):
+            return
+        bucket = self.bucket(endpoint)
+        bucket.capacity = float(limit)
+        bucket.rate = limit / WINDOW
+        bucket.tokens = float(remaining)
+        if remaining <= 0:
+            bucket.block_for(max(reset - time.time(), 1))
+
+    async def acquire(self, endpoint: str):
+        wait = self.bucket(endpoint).reserve()
+        if wait > 0:
+            self.metrics.add("rate_limit_sleep_seconds", wait, endpoint=endpoint)
+            await asyncio.sleep(wait)
+
+    def backoff(self, attempt: int) -> float:
+        ceiling = min(self.max_backoff, self.base_backoff * 2 ** attempt)
+        return random.uniform(ceiling / 2, ceiling)
+
+    async def call(self, endpoint: str, fn, *args, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(endpoint)
+            self.metrics.add("api_calls", endpoint=endpoint)
+            try:
+                return await fn(*args, **kwargs)
+            except (TooManyRequests, ServerError) as e:
+                if attempt == self.max_retries:
+                    raise
+                self.metrics.add("api_retries", endpoint=endpoint)
+                wait = self.backoff(attempt)
+                reset = getattr(e, "rate_limit_reset", None)
+                if reset is not None:
+                    wait = max(reset - time.time(), 1) + random.uniform(0, 1)
+                label = "Rate limited" if isinstance(e, TooManyRequests) else "Server error"
+                print(f"{label} on {endpoint}, waiting {wait:.0f}s...")
+                # Blocks every caller of this endpoint, not just this one
+                self.bucket(endpoint).block_for(wait)
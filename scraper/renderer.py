@@ -1,25 +1,55 @@
-def render_bookmark(bookmark: dict, thread: list[dict] | None = None) -> str:
-    is_thread = thread is not None and len(thread) > 1
-    thread_length = len(thread) if is_thread else 1
+# bookmark_filename moved to scraper.layout; re-exported for existing imports
+from scraper.layout import Layout, bookmark_filename  # noqa: F401
+from scraper.models import Tweet
+
+FLAT = Layout()
+
+
+def _media_lines(tweet: Tweet, bookmark: Tweet, layout: Layout) -> list[str]:
+    lines = []
+    for item in tweet.media:
+        link = layout.media_link(bookmark, item.filename)
+        if item.type == "photo":
+            lines.append(f"![image]({link})")
+        else:
+            lines.append(f"[{item.type}]({link})")
+        lines.append("")
+    return lines
+
 
-    # YAML frontmatter
-    text_escaped = bookmark["text"].replace("\\", "\\\\").replace('"', '\\"')
+def render_frontmatter(bookmark: Tweet, thread: list[Tweet] | None = None,
+                       thread_length: int | None = None) -> str:
+    """The YAML frontmatter block of a bookmark's markdown, ending in a newline.
+
+    ``thread_length`` overrides the length taken from ``thread``.
+    """
+    if thread_length is None:
+        thread_length = len(thread) if thread is not None else 1
+    is_thread = thread_length > 1
     lines = [
         "---",
-        f'author: "{bookmark["author"]}"',
-        f'handle: "{bookmark["handle"]}"',
-        f'tweet_url: "{bookmark["url"]}"',
-        f'date: "{bookmark["created_at"]}"',
-        f"likes: {bookmark['likes']}",
-        f"retweets: {bookmark['retweets']}",
-        f"replies: {bookmark['replies']}",
+        f'author: "{bookmark.author}"',
+        f'handle: "{bookmark.handle}"',
+        f'tweet_url: "{bookmark.url}"',
+        f'date: "{bookmark.created_at}"',
+        f"likes: {bookmark.likes}",
+        f"retweets: {bookmark.retweets}",
+        f"replies: {bookmark.replies}",
         f"is_thread: {'true' if is_thread else 'false'}",
         f"thread_length: {thread_length}",
         "---",
-        "",
     ]
+    return "\n".join(lines) + "\n"
+
+
+def render_body(bookmark: Tweet, thread: list[Tweet] | None = None,
+                layout: Layout = FLAT) -> str:
+    """Everything after the frontmatter: the tweet or thread and its media."""
+    is_thread = thread is not None and len(thread) > 1
+    lines = [""]
 
     if is_thread:
+        thread_length = len(thread)
         for i, tweet in enumerate(thread, 1):
             label = f"## Tweet {i} of {thread_length}"
             if i == 1:
@@ -28,31 +58,24 @@ def render_bookmark(bookmark: dict, thread: list[dict] | None = None) -> str:
                 label += " (bookmarked)"
             lines.append(label)
             lines.append("")
-            lines.append(tweet["text"])
+            lines.append(tweet.text)
             lines.append("")
-            for item in tweet.get("media_items", []):
-                if item["type"] == "photo":
-                    lines.append(f'![image](media/{item["filename"]})')
-                else:
-                    lines.append(f'[{item["type"]}](media/{item["filename"]})')
-                lines.append("")
+            lines.extend(_media_lines(tweet, bookmark, layout))
             if i < thread_length:
                 lines.append("---")
                 lines.append("")
     else:
-        lines.append(f"# @{bookmark['handle']} — {bookmark['created_at']}")
+        lines.append(f"# @{bookmark.handle} — {bookmark.created_at}")
         lines.append("")
-        lines.append(bookmark["text"])
+        lines.append(bookmark.text)
         lines.append("")
-        for item in bookmark.get("media_items", []):
-            if item["type"] == "photo":
-                lines.append(f'![image](media/{item["filename"]})')
-            else:
-                lines.append(f'[{item["type"]}](media/{item["filename"]})')
-            lines.append("")
+        lines.extend(_media_lines(bookmark, bookmark, layout))
 
     return "\n".join(lines)
 
 
-def bookmark_filename(bookmark: dict) -> str:
-    return f"@{bookmark['handle']}-{bookmark['id']}.md"
+def render_bookmark(bookmark: Tweet, thread: list[Tweet] | None = None,
+                    layout: Layout = FLAT) -> str:
+    """Markdown for a bookmark, with media links relative to where
+    ``layout`` puts its file."""
+    return render_frontmatter(bookmark, thread) + render_body(bookmark, thread, layout)
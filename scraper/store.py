@@ -0,0 +1,161 @@
+import json
+import os
+import shutil
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only vary the request, not the bytes served
+_VOLATILE_PARAMS = {"tag"}
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a media URL for deduplication."""
+    parts = urlsplit(url)
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in _VOLATILE_PARAMS
+    )
+    return urlunsplit((
+        parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(query), "",
+    ))
+
+
+class MediaStore:
+    """Content-addressed media blobs shared by every tweet that uses them.
+
+    Blobs live under ``media/store/`` and are named by the SHA-256 of their
+    bytes. Per-tweet media files are hardlinks to a blob, with a symlink or
+    a copy as fallbacks. ``index.jsonl`` maps each normalized source URL to
+    its blob, so a URL that has been downloaded once is never fetched again.
+    """
+
+    def __init__(self, media_dir: str):
+        self.root = os.path.join(media_dir, "store")
+        os.makedirs(self.root, exist_ok=True)
+        self._index_path = os.path.join(self.root, "index.jsonl")
+        self._by_url: dict[str, str] = {}  # normalized url -> blob path relative to root
+        self._index = None
+        self._load()
+
+    def _load(self):
+        if not os.path.isfile(self._index_path):
+            return
+        with open(self._index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                self._by_url[record["url"]] = record["blob"]
+
+    def __len__(self) -> int:
+        return len(self._by_url)
+
+    def lookup(self, url: str) -> str | None:
+        """Absolute path of the blob already stored for ``url``, if any."""
+        blob = self._by_url.get(normalize_url(url))
+        return os.path.join(self.root, blob) if blob else None
+
+    def add(self, url: str, path: str, sha256: str) -> str:
+        """Move the finished download at ``path`` into the store.
+
+        If identical bytes are already stored (e.g. under another URL), the
+        new copy is discarded. Returns the blob's absolute path.
+        """
+        ext = os.path.splitext(path.removesuffix(".part"))[1]
+        blob = os.path.join(sha256[:2], sha256 + ext)
+        blob_path = os.path.join(self.root, blob)
+        if os.path.exists(blob_path):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.replace(path, blob_path)
+
+        key = normalize_url(url)
+        self._by_url[key] = blob
+        if self._index is None:
+            self._index = open(self._index_path, "a", encoding="utf-8")
+        self._index.write(json.dumps({"url": key, "blob": blob, "sha256": sha256}) + "\n")
+        self._index.flush()
+        return blob_path
+
+    @staticmethod
+    def link(blob_path: str, dest: str):
+        """Make ``dest`` refer to ``blob_path`` without copying when possible."""
+        try:
+            os.link(blob_path, dest)
+            return
+        except OSError:
+            pass
+        try:
+            os.symlink(os.path.relpath(blob_path, os.path.dirname(dest)), dest)
+        except OSError:
+            shutil.copyfile(blob_path, dest)
+
+    def close(self):
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+
+
+class MediaIndex:
+    """Per-file media records, loaded once at startup.
+
+    Maps each media filename to its size, SHA-256, source URL and status
+    ("done", "partial" while a download is under way, "failed" or
+    "corrupt"), so skip decisions are dictionary lookups instead of a
+    stat per file. Changes are appended to ``media/index.jsonl``; the file
+    is compacted on close once it has accumulated many superseded records.
+    """
+
+    def __init__(self, media_dir: str):
+        self._path = os.path.join(media_dir, "index.jsonl")
+        self._entries: dict[str, dict] = {}
+        self._records = 0
+        self._file = None
+        self._load()
+
+    def _load(self):
+        if not os.path.isfile(self._path):
+            return
+        with open(self._path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                self._entries[record["filename"]] = record
+                self._records += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, filename: str) -> dict | None:
+        return self._entries.get(filename)
+
+    def items(self):
+        return list(self._entries.items())
+
+    def is_done(self, filename: str) -> bool:
+        entry = self._entries.get(filename)
+        return entry is not None and entry.get("status") == "done"
+
+    def record(self, filename: str, **fields):
+        entry = {**self._entries.get(filename, {}), **fields, "filename": filename}
+        self._entries[filename] = entry
+        if self._file is None:
+            self._file = open(self._path, "a", encoding="utf-8")
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        self._records += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._records > 2 * len(self._entries):
+            tmp_path = self._path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for entry in self._entries.values():
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp_path, self._path)
+            self._records = len(self._entries)
@@ -1,117 +1,218 @@
 import asyncio
-import time
-
-from twikit.errors import TooManyRequests, TweetNotAvailable
-
-
-def _tweet_to_dict(tweet) -> dict:
-    return {
-        "id": tweet.id,
-        "text": tweet.text,
-        "author": f"{tweet.user.name} (@{tweet.user.screen_name})",
-        "handle": tweet.user.screen_name,
-        "created_at": tweet.created_at,
-        "likes": tweet.favorite_count,
-        "retweets": tweet.retweet_count,
-        "replies": tweet.reply_count,
-        "url": f"https://x.com/{tweet.user.screen_name}/status/{tweet.id}",
-        "has_media": bool(tweet.media),
-        "is_reply": tweet.in_reply_to is not None,
-        "in_reply_to": tweet.in_reply_to,
-        "media_items": [
-            {
-                "type": media.type,
-                "url": media.media_url if media.type == "photo"
-                       else (media.streams[-1].url if media.streams else None),
-                "filename": f"{tweet.id}_{i}.{'jpg' if media.type == 'photo' else 'mp4'}",
-            }
-            for i, media in enumerate(tweet.media or [])
-        ],
-    }
-
-
-def _placeholder(tweet_id: str) -> dict:
-    return {
-        "id": tweet_id,
-        "text": "[Tweet unavailable]",
-        "author": "Unknown (@unknown)",
-        "handle": "unknown",
-        "created_at": "",
-        "likes": 0,
-        "retweets": 0,
-        "replies": 0,
-        "url": f"https://x.com/i/status/{tweet_id}",
-        "has_media": False,
-        "is_reply": False,
-        "in_reply_to": None,
-        "media_items": [],
-    }
-
-
-async def _fetch_tweet_with_backoff(client, tweet_id: str):
-    try:
-        return await client.get_tweet_by_id(tweet_id)
-    except TooManyRequests as e:
-        wait_seconds = 60
-        if e.rate_limit_reset is not None:
-            wait_seconds = max(e.rate_limit_reset - int(time.time()), 1)
-        print(f"Rate limited during thread resolution, waiting {wait_seconds}s...")
-        await asyncio.sleep(wait_seconds)
-        return await client.get_tweet_by_id(tweet_id)
 
+from twikit.errors import TweetNotAvailable
 
-class ThreadResolver:
-    def __init__(self, client):
-        self.client = client
-        self._cache = {}  # tweet_id -> tweet dict
+from scraper.models import Tweet
+from scraper.quality import MediaPolicy
+from scraper.ratelimit import RateLimiter
 
-    async def resolve(self, bookmark: dict) -> list[dict]:
-        """Returns ordered list of tweet dicts [root, ..., parent, bookmark].
-        For non-replies, returns [bookmark]."""
-        if bookmark["in_reply_to"] is None:
-            return [bookmark]
 
-        # Fetch the full tweet object to access .reply_to
-        try:
-            tweet_obj = await _fetch_tweet_with_backoff(self.client, bookmark["id"])
-        except TweetNotAvailable:
-            return [bookmark]
+async def _fetch_tweet_with_backoff(client, tweet_id: str, limiter: RateLimiter):
+    return await limiter.call("TweetDetail", client.get_tweet_by_id, tweet_id)
 
-        parents = []
 
-        # Primary: use .reply_to attribute (list of parent tweets from API)
-        if hasattr(tweet_obj, "reply_to") and tweet_obj.reply_to:
-            for parent_tweet in tweet_obj.reply_to:
-                pid = parent_tweet.id
-                if pid not in self._cache:
-                    self._cache[pid] = _tweet_to_dict(parent_tweet)
-                parents.append(self._cache[pid])
-        else:
-            # Fallback: walk in_reply_to chain manually
-            current_reply_to = bookmark["in_reply_to"]
-            while current_reply_to:
-                if current_reply_to in self._cache:
-                    parents.append(self._cache[current_reply_to])
-                    # Continue walking from cached tweet's parent
-                    current_reply_to = self._cache[current_reply_to].get("in_reply_to")
+class ThreadResolver:
+    """Resolves reply bookmarks into their full thread.
+
+    Each lookup is a conversation fetch: the TweetDetail response for a
+    tweet also carries its ancestors and its author's self-thread, and all
+    of them are cached in one go. Walking up a thread therefore only
+    costs another request where the chain leaves what earlier responses
+    covered; against a client that returns no ancestors this degrades to
+    one request per hop. ``calls_saved`` counts the requests a hop-by-hop
+    walk would have made for ancestors served from those bulk responses.
+
+    Lookups from concurrent ``resolve`` calls share one budget: at most
+    ``concurrency`` requests in flight, paced by the limiter's "TweetDetail"
+    endpoint budget. Concurrent lookups of the same tweet ID are
+    coalesced into a single request. An optional persistent ``TweetCache``
+    is consulted before any parent tweet is fetched. Media variants of
+    fetched parents are chosen by ``policy``.
+
+    Only thread members (ancestors and replies) are kept in memory for
+    the rest of the run; the other bookmarks of a page are known only
+    while that page is being resolved.
+    """
+
+    def __init__(self, client, concurrency: int = 4, cache=None,
+                 limiter: RateLimiter | None = None, policy: MediaPolicy | None = None):
+        self.client = client
+        self._cache: dict[str, Tweet] = {}
+        self._store = cache
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._limit = asyncio.Semaphore(max(1, concurrency))
+        self._limiter = limiter or RateLimiter()
+        self.policy = policy
+        self.requests = 0
+        self.coalesced = 0
+        self.threads = 0
+        self.calls_saved = 0
+        self.derived = 0
+        # Tweets cached from a conversation response rather than fetched
+        # by ID; the first thread to use one counts it as a saved request
+        self._bulk: set[str] = set()
+        self._absent: set[str] = set()
+
+    @property
+    def cache(self):
+        return self._store
+
+    def _cached(self, tweet_id: str, page: dict[str, Tweet] | None = None) -> Tweet | None:
+        if tweet_id in self._cache:
+            return self._cache[tweet_id]
+        if page and tweet_id in page:
+            # A bookmark of the batch that is also an ancestor
+            return self._cache.setdefault(tweet_id, page[tweet_id])
+        if self._store is not None and tweet_id not in self._absent:
+            tweet = self._store.get(tweet_id)
+            if tweet is not None:
+                return self._cache.setdefault(tweet_id, tweet)
+            # Planning and the walk both ask; count the miss only once
+            self._absent.add(tweet_id)
+        return None
+
+    def _remember(self, tweet_id: str, tweet: Tweet) -> Tweet:
+        if tweet_id in self._cache:
+            return self._cache[tweet_id]
+        self._cache[tweet_id] = tweet
+        if self._store is not None:
+            self._store.put(tweet_id, tweet)
+        return tweet
+
+    def _remember_conversation(self, detail):
+        """Cache, in bulk, the ancestors and self-thread a TweetDetail
+        response carried. Replies are left out: they are rarely anyone's
+        ancestor and would crowd useful entries out of the cache."""
+        fresh = []
+        for related in (getattr(detail, "reply_to", None), getattr(detail, "thread", None)):
+            for other in related or ():
+                if other.id in self._cache:
                     continue
+                self._cache[other.id] = Tweet.from_twikit(other, self.policy)
+                self._bulk.add(other.id)
+                fresh.append(self._cache[other.id])
+        if self._store is not None:
+            self._store.put_many(fresh)
+
+    async def _request(self, tweet_id: str):
+        async with self._limit:
+            self.requests += 1
+            return await _fetch_tweet_with_backoff(self.client, tweet_id, self._limiter)
+
+    async def _get_tweet(self, tweet_id: str):
+        task = self._inflight.get(tweet_id)
+        if task is None:
+            task = asyncio.ensure_future(self._request(tweet_id))
+            self._inflight[tweet_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(tweet_id, None))
+        else:
+            self.coalesced += 1
+        # Shielded so one cancelled waiter doesn't cancel the shared lookup
+        return await asyncio.shield(task)
+
+    def _frontier(self, bookmark: Tweet, page: dict[str, Tweet]) -> str | None:
+        """The first ancestor of ``bookmark`` not already known, or None if
+        its whole chain is."""
+        seen = {bookmark.id}
+        current = bookmark.in_reply_to
+        while current and current not in seen:
+            seen.add(current)
+            tweet = self._cached(current, page)
+            if tweet is None:
+                return current
+            current = tweet.in_reply_to
+        return None
+
+    async def resolve_many(self, bookmarks: list[Tweet], on_progress=None) -> dict[str, list[Tweet]]:
+        """Resolve threads for the replies among ``bookmarks`` concurrently.
+
+        A planning pass runs first. Every bookmark in the batch counts as
+        a known tweet, so a reply to another bookmark needs no lookup for
+        it. Replies are then grouped by their first unknown ancestor: a
+        group's conversation is fetched once and every member's chain is
+        derived from it, and replies whose chain is already known cost no
+        request at all (counted in ``derived``).
+
+        Returns {bookmark_id: thread} for the replies. Bookmarks whose
+        resolution fails are reported and left out. ``on_progress(i,
+        total)`` fires as each reply finishes.
+        """
+        page = {bm.id: bm for bm in bookmarks}
+        self._absent.clear()
+        replies = [bm for bm in bookmarks if bm.in_reply_to is not None]
+        groups: dict[str | None, list[Tweet]] = {}
+        for bm in replies:
+            groups.setdefault(self._frontier(bm, page), []).append(bm)
+        known = groups.pop(None, [])
+        self.derived += len(known) + sum(len(g) - 1 for g in groups.values())
+
+        threads = {}
+        done = 0
+
+        async def resolve_one(bm):
+            nonlocal done
+            try:
+                threads[bm.id] = await self.resolve(bm, page)
+            except Exception as e:
+                print(f"Warning: thread resolution failed for {bm.id}: {e}")
+            done += 1
+            if on_progress:
+                on_progress(done, len(replies))
+
+        async def resolve_group(members):
+            # The first member fetches the shared conversation; the rest
+            # then find their chains in the cache
+            for bm in members:
+                await resolve_one(bm)
+
+        await asyncio.gather(*(resolve_one(bm) for bm in known),
+                             *(resolve_group(members) for members in groups.values()))
+        if self._store is not None:
+            # One commit per page rather than one per lookup
+            self._store.flush()
+        return threads
+
+    async def resolve(self, bookmark: Tweet, page: dict[str, Tweet] | None = None) -> list[Tweet]:
+        """Returns ordered list of tweets [root, ..., parent, bookmark].
+        For non-replies, returns [bookmark].
+
+        Walks up from the bookmark's parent through the cache and only
+        fetches where the chain leaves it, so a bookmark whose ancestors
+        are all known costs no request. ``page`` maps the IDs of other
+        bookmarks being resolved alongside it to the bookmarks.
+        """
+        if bookmark.in_reply_to is None:
+            return [bookmark]
 
-                await asyncio.sleep(1)
+        parents = []
+        saved = 0
+        seen = {bookmark.id}
+        current_reply_to = bookmark.in_reply_to
+        while current_reply_to and current_reply_to not in seen:
+            seen.add(current_reply_to)
+            parent = self._cached(current_reply_to, page)
+            if parent is None:
                 try:
-                    parent_obj = await _fetch_tweet_with_backoff(self.client, current_reply_to)
-                    parent_dict = _tweet_to_dict(parent_obj)
-                    self._cache[current_reply_to] = parent_dict
-                    parents.append(parent_dict)
-                    current_reply_to = parent_obj.in_reply_to
+                    detail = await self._get_tweet(current_reply_to)
+                    # A concurrent walk may have cached it meanwhile
+                    parent = self._remember(current_reply_to, Tweet.from_twikit(detail, self.policy))
+                    self._remember_conversation(detail)
                 except TweetNotAvailable:
-                    placeholder = _placeholder(current_reply_to)
-                    self._cache[current_reply_to] = placeholder
-                    parents.append(placeholder)
+                    parents.append(self._remember(current_reply_to, Tweet.placeholder(current_reply_to)))
                     break
+            elif current_reply_to in self._bulk:
+                self._bulk.discard(current_reply_to)
+                saved += 1
+            parents.append(parent)
+            current_reply_to = parent.in_reply_to
+        parents.reverse()
 
-            parents.reverse()
+        self.threads += 1
+        self.calls_saved += saved
 
         # Cache the bookmark itself
-        self._cache[bookmark["id"]] = bookmark
+        self._cache[bookmark.id] = bookmark
+        if self._store is not None:
+            self._store.put(bookmark.id, bookmark)
 
         return parents + [bookmark]
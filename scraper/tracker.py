@@ -1,39 +1,196 @@
 import json
 import os
+import time
+
+from scraper.diskio import DiskIO
+
+# Journal records written before save() is triggered automatically
+COMPACT_EVERY = 10_000
+
+# Pages, or seconds, between checkpoints taken by flush()
+CHECKPOINT_PAGES = 50
+CHECKPOINT_SECONDS = 60.0
 
 
 class ProgressTracker:
-    def __init__(self, output_dir: str):
+    """Tracks scraped bookmark IDs and the pagination cursor.
+
+    State lives in two files: ``manifest.json``, a snapshot, and
+    ``manifest.journal``, an append-only log of changes made since that
+    snapshot. Every ``mark_scraped``/``save_cursor`` call appends one line
+    to the journal and flushes it, so progress survives a crash without
+    rewriting the whole manifest. ``save`` folds the journal back into the
+    snapshot. A manifest.json from older versions loads as-is.
+
+    With ``io``, journal lines are buffered instead and handed to its I/O
+    thread by ``flush``, which the pipeline calls once per page. ``flush``
+    also takes a checkpoint (a fresh snapshot) every ``checkpoint_pages``
+    pages or ``checkpoint_seconds``, whichever comes first, so a long run
+    never has much journal to replay or lose.
+    """
+
+    def __init__(self, output_dir: str, compact_every: int = COMPACT_EVERY,
+                 io: DiskIO | None = None, checkpoint_pages: int = CHECKPOINT_PAGES,
+                 checkpoint_seconds: float = CHECKPOINT_SECONDS):
         self._path = os.path.join(output_dir, "manifest.json")
+        self._journal_path = os.path.join(output_dir, "manifest.journal")
+        self._compact_every = compact_every
+        self._checkpoint_pages = checkpoint_pages
+        self._checkpoint_seconds = checkpoint_seconds
+        self._pages = 0
+        self._checkpointed_at = time.monotonic()
+        self.checkpoints = 0
+        self._io = io
+        self._buffer: list[str] = []
+        self._journal = None
+        self._journal_records = 0
         self._scraped_ids: set[str] = set()
         self._cursor: str | None = None
+        self._high_water: str | None = None
 
     def load(self):
+        self._scraped_ids = set()
+        self._cursor = None
+        self._high_water = None
         if os.path.isfile(self._path):
             with open(self._path, "r", encoding="utf-8") as f:
                 data = json.load(f)
             self._scraped_ids = set(data.get("scraped_ids", []))
             self._cursor = data.get("cursor")
+            self._high_water = data.get("high_water")
+        self._journal_records = self._replay_journal()
+
+    def _replay_journal(self) -> int:
+        if not os.path.isfile(self._journal_path):
+            return 0
+        count = 0
+        with open(self._journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-write
+                    break
+                if "id" in record:
+                    self._scraped_ids.add(record["id"])
+                if "cursor" in record:
+                    self._cursor = record["cursor"]
+                if "high_water" in record:
+                    self._high_water = record["high_water"]
+                count += 1
+        return count
+
+    def _append(self, record: dict):
+        line = json.dumps(record) + "\n"
+        self._journal_records += 1
+        if self._io is not None:
+            self._buffer.append(line)
+            return
+        self._write_journal(line)
+        if self._journal_records >= self._compact_every:
+            self.save()
+
+    def _write_journal(self, text: str):
+        if self._journal is None:
+            self._journal = open(self._journal_path, "a", encoding="utf-8")
+        self._journal.write(text)
+        self._journal.flush()
+
+    def _checkpoint_due(self) -> bool:
+        if not self._journal_records:
+            return False
+        return (self._journal_records >= self._compact_every
+                or self._pages >= self._checkpoint_pages
+                or time.monotonic() - self._checkpointed_at >= self._checkpoint_seconds)
+
+    def _checkpointed(self):
+        self._journal_records = 0
+        self._pages = 0
+        self._checkpointed_at = time.monotonic()
+        self.checkpoints += 1
+
+    async def flush(self, compact: bool = False):
+        """Write out the changes made since the last call, once per page.
+
+        With ``io`` the buffered journal lines, and the snapshot when a
+        checkpoint is due, are queued write-behind on the I/O thread.
+        ``compact`` forces a checkpoint and waits for it to be written.
+        Without ``io`` the journal is already on disk and a checkpoint
+        just calls ``save``.
+        """
+        self._pages += 1
+        due = compact or self._checkpoint_due()
+        if self._io is None:
+            if due:
+                self.save()
+            return
+        if self._buffer:
+            text = "".join(self._buffer)
+            self._buffer = []
+            await self._io.write(self._write_journal, text)
+        if not due:
+            return
+        data = self._snapshot()
+        self._checkpointed()
+        if compact:
+            await self._io.run(self._write_snapshot, data)
         else:
-            self._scraped_ids = set()
-            self._cursor = None
+            await self._io.write(self._write_snapshot, data)
 
     def is_scraped(self, tweet_id: str) -> bool:
         return tweet_id in self._scraped_ids
 
     def mark_scraped(self, tweet_id: str):
+        if tweet_id in self._scraped_ids:
+            return
         self._scraped_ids.add(tweet_id)
+        self._append({"id": tweet_id})
 
     def save_cursor(self, cursor: str | None):
         self._cursor = cursor
+        self._append({"cursor": cursor})
 
     def get_cursor(self) -> str | None:
         return self._cursor
 
+    def save_high_water(self, tweet_id: str | None):
+        self._high_water = tweet_id
+        self._append({"high_water": tweet_id})
+
+    def get_high_water(self) -> str | None:
+        return self._high_water
+
     def save(self):
-        data = {
-            "scraped_ids": sorted(self._scraped_ids),
+        """Compact the journal into a fresh manifest.json snapshot.
+
+        With ``io``, only call this once its queued writes are done; use
+        ``flush(compact=True)`` while the loop is running.
+        """
+        self._buffer = []
+        self._write_snapshot(self._snapshot())
+        self._checkpointed()
+
+    def _snapshot(self) -> dict:
+        return {
+            "scraped_ids": list(self._scraped_ids),
             "cursor": self._cursor,
+            "high_water": self._high_water,
         }
-        with open(self._path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
+
+    def _write_snapshot(self, data: dict):
+        tmp_path = self._path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path)
+
+        # Only drop the journal once the snapshot covering it is in place
+        self.close()
+        if os.path.exists(self._journal_path):
+            os.remove(self._journal_path)
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
@@ -0,0 +1,308 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from scraper.layout import Layout
+from scraper.models import Tweet
+from scraper.renderer import render_body, render_frontmatter
+
+# What refresh_file did with an existing markdown file
+UNCHANGED = "unchanged"
+FRONTMATTER = "frontmatter"
+RERENDERED = "rerendered"
+
+
+_THREAD_LENGTH = re.compile(r"^thread_length: (\d+)$", re.MULTILINE)
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def split_frontmatter(text: str) -> tuple[str, str]:
+    """Split markdown into its frontmatter block and the body after it."""
+    if text.startswith("---\n"):
+        end = text.find("\n---\n", 3)
+        if end != -1:
+            return text[:end + 5], text[end + 5:]
+    return "", text
+
+
+class RenderIndex:
+    """SHA-1 hashes of each bookmark's frontmatter and body as last written.
+
+    Lets a refresh tell which files changed without reading them. Records
+    are appended to ``markdown_index.jsonl`` in the output folder from the
+    writer's threads, and the file is compacted on close once it has
+    accumulated many superseded records.
+    """
+
+    def __init__(self, output_dir: str):
+        self._path = os.path.join(output_dir, "markdown_index.jsonl")
+        self._entries: dict[str, dict] = {}
+        self._records = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if not os.path.isfile(self._path):
+            return
+        with open(self._path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                self._entries[record["id"]] = record
+                self._records += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, tweet_id: str) -> dict | None:
+        return self._entries.get(tweet_id)
+
+    def record(self, tweet_id: str, meta: str, body: str, layout: str | None = None):
+        entry = {"id": tweet_id, "meta": meta, "body": body}
+        if layout is not None:
+            entry["layout"] = layout
+        with self._lock:
+            self._entries[tweet_id] = entry
+            if self._file is None:
+                self._file = open(self._path, "a", encoding="utf-8")
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            self._records += 1
+
+    def relinked(self, tweet_id: str, old_text: str, new_text: str,
+                 old_layout: str, new_layout: str):
+        """Carry a bookmark's entry over a reshard that rewrote the media
+        links in its file from ``old_text`` to ``new_text``.
+
+        If the body on disk was as last rendered, the rewritten body's hash
+        is recorded. An edited body says nothing about what a render in
+        the new layout hashes to, so the entry keeps its hash and notes
+        the layout it was rendered in, for ``refresh_file`` to compare with.
+        """
+        entry = self._entries.get(tweet_id)
+        if entry is None:
+            return
+        layout = entry.get("layout")
+        if layout is None and _digest(split_frontmatter(old_text)[1]) == entry["body"]:
+            self.record(tweet_id, entry["meta"], _digest(split_frontmatter(new_text)[1]))
+        elif layout is None:
+            self.record(tweet_id, entry["meta"], entry["body"], layout=old_layout)
+        elif layout == new_layout:
+            self.record(tweet_id, entry["meta"], entry["body"])
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._records > 2 * len(self._entries):
+            tmp_path = self._path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for entry in self._entries.values():
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp_path, self._path)
+            self._records = len(self._entries)
+
+
+def _stored_thread_length(meta: str) -> int:
+    match = _THREAD_LENGTH.search(meta)
+    return int(match.group(1)) if match else 1
+
+
+def _loses_thread(bookmark: Tweet, thread: list[Tweet] | None, stored_length: int) -> bool:
+    """Whether rendering ``thread`` would drop tweets a file already holds:
+    the reply's thread failed to resolve, came back shorter, or now has
+    deleted tweets in it."""
+    if bookmark.in_reply_to is None and stored_length <= 1:
+        return False
+    if thread is None:
+        return True
+    return len(thread) < stored_length or any(t.is_placeholder for t in thread)
+
+
+def _replace_file(path: str, text: str):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class MarkdownWriter:
+    """Renders bookmarks and writes their markdown files on a thread pool.
+
+    Files are placed according to ``layout``. The output folder is listed
+    once in ``prepare`` (walked, for sharded layouts); after that, "already
+    written?" checks are set lookups rather than a stat call per file. At
+    most ``max_pending`` files are queued on the pool at any time.
+
+    The hashes of every file written go to a ``RenderIndex``, which
+    ``refresh_all`` uses to bring existing files up to date while only
+    touching the ones that changed.
+    """
+
+    def __init__(self, output_dir: str, workers: int = 4, max_pending: int = 64,
+                 layout: Layout | None = None):
+        self.output_dir = output_dir
+        self.layout = layout if layout is not None else Layout()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers),
+                                            thread_name_prefix="markdown")
+        self._pending = asyncio.Semaphore(max_pending)
+        self._existing: set[str] = set()
+        self.index = RenderIndex(output_dir)
+        self.written = 0
+        self.unchanged = 0
+        self.refreshed = 0
+        self.rerendered = 0
+        # Seconds spent inside write_all, idle time between pages excluded
+        self._write_time = 0.0
+
+    async def prepare(self):
+        loop = asyncio.get_running_loop()
+        self._existing = await loop.run_in_executor(self._executor, self._list_existing)
+        await loop.run_in_executor(self._executor, self.index.load)
+
+    def _list_existing(self) -> set[str]:
+        if self.layout.kind == "flat":
+            return set(os.listdir(self.output_dir))
+        existing = set()
+        for dirpath, dirnames, filenames in os.walk(self.output_dir):
+            if dirpath == self.output_dir:
+                dirnames[:] = [d for d in dirnames if d != "media"]
+            relative = os.path.relpath(dirpath, self.output_dir).replace(os.sep, "/")
+            prefix = "" if relative == "." else relative + "/"
+            existing.update(prefix + f for f in filenames if f.endswith(".md"))
+        return existing
+
+    def exists(self, bookmark: Tweet) -> bool:
+        return self.layout.markdown_path(bookmark) in self._existing
+
+    def _write_file(self, relative: str, bookmark: Tweet, thread: list[Tweet] | None):
+        path = os.path.join(self.output_dir, relative)
+        meta = render_frontmatter(bookmark, thread)
+        body = render_body(bookmark, thread, self.layout)
+        if "/" in relative:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(meta + body)
+        self.index.record(bookmark.id, _digest(meta), _digest(body))
+
+    def refresh_file(self, relative: str, bookmark: Tweet, thread: list[Tweet] | None) -> str:
+        """Bring an existing file up to date, touching it only if it changed.
+
+        If the body renders as it did last time, only the frontmatter
+        (engagement counts) can differ; it is swapped in front of the body
+        already on disk, and the file is not touched at all if it matches
+        too. A changed body means a full rewrite, unless ``thread`` would
+        lose tweets the file holds (see ``_loses_thread``): archived
+        threads are never overwritten from a worse copy, so only the
+        counts are updated and the stored thread length is kept. Files
+        written before hashes were kept are read once to get their hashes,
+        and edited files whose links a reshard moved are compared with a
+        render in the layout they were hashed in.
+        """
+        path = os.path.join(self.output_dir, relative)
+        meta = render_frontmatter(bookmark, thread)
+        body = render_body(bookmark, thread, self.layout)
+        meta_hash, body_hash = _digest(meta), _digest(body)
+
+        entry = self.index.get(bookmark.id)
+        # The entry has to be written out even if the file isn't touched
+        stale = entry is None
+        layout = None
+        if entry is not None and "layout" in entry:
+            # Hashed before a reshard moved the file's media links: if a
+            # render in that layout still matches, only the links differ
+            # and the body on disk is already up to date
+            stored = render_body(bookmark, thread, Layout(entry["layout"]))
+            if _digest(stored) == entry["body"]:
+                entry = {**entry, "body": body_hash}
+                stale = True
+        old_meta = old_body = None
+        if entry is None:
+            with open(path, "r", encoding="utf-8") as f:
+                old_meta, old_body = split_frontmatter(f.read())
+            entry = {"meta": _digest(old_meta), "body": _digest(old_body)}
+
+        if body_hash != entry["body"]:
+            if old_body is None:
+                with open(path, "r", encoding="utf-8") as f:
+                    old_meta, old_body = split_frontmatter(f.read())
+            stored_length = _stored_thread_length(old_meta)
+            if _loses_thread(bookmark, thread, stored_length):
+                # The stored body stays, and so does its hash: a later run
+                # that resolves the whole thread again still compares
+                # against what was last rendered
+                meta = render_frontmatter(bookmark, thread, thread_length=stored_length)
+                meta_hash, body_hash = _digest(meta), entry["body"]
+                layout = entry.get("layout")
+                status = UNCHANGED if meta_hash == entry["meta"] else FRONTMATTER
+                if status == FRONTMATTER:
+                    _replace_file(path, meta + old_body)
+            else:
+                _replace_file(path, meta + body)
+                status = RERENDERED
+        elif meta_hash != entry["meta"]:
+            if old_body is None:
+                with open(path, "r", encoding="utf-8") as f:
+                    _, old_body = split_frontmatter(f.read())
+            _replace_file(path, meta + old_body)
+            status = FRONTMATTER
+        else:
+            status = UNCHANGED
+        if status != UNCHANGED or stale:
+            self.index.record(bookmark.id, meta_hash, body_hash, layout=layout)
+        return status
+
+    async def refresh_all(self, items: list[tuple[Tweet, list[Tweet] | None]]):
+        """Run ``refresh_file`` for (bookmark, thread) pairs concurrently."""
+        loop = asyncio.get_running_loop()
+
+        async def refresh_one(bookmark, thread):
+            relative = self.layout.markdown_path(bookmark)
+            async with self._pending:
+                status = await loop.run_in_executor(self._executor, self.refresh_file,
+                                                    relative, bookmark, thread)
+            if status == FRONTMATTER:
+                self.refreshed += 1
+            elif status == RERENDERED:
+                self.rerendered += 1
+            else:
+                self.unchanged += 1
+
+        await asyncio.gather(*(refresh_one(bm, thread) for bm, thread in items))
+
+    async def write_all(self, items: list[tuple[Tweet, list[Tweet] | None]]):
+        """Render and write (bookmark, thread) pairs concurrently."""
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+
+        async def write_one(bookmark, thread):
+            relative = self.layout.markdown_path(bookmark)
+            async with self._pending:
+                await loop.run_in_executor(self._executor, self._write_file,
+                                           relative, bookmark, thread)
+            self._existing.add(relative)
+            self.written += 1
+
+        await asyncio.gather(*(write_one(bm, thread) for bm, thread in items))
+        self._write_time += time.monotonic() - started
+
+    @property
+    def files_per_sec(self) -> float:
+        """Files written per second of writing, not of the whole run."""
+        if not self.written:
+            return 0.0
+        return self.written / max(self._write_time, 1e-6)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.index.close()
@@ -0,0 +1,55 @@
+import pytest
+
+from scraper.archive import SqliteArchive
+from scraper.models import Media, Tweet
+
+
+def make_tweet(id="123", text="Hello", handle="test", in_reply_to=None, media=()):
+    return Tweet(id=id, text=text, author=f"Test (@{handle})", handle=handle,
+                 created_at="2024-03-15", likes=10, retweets=5, replies=2,
+                 in_reply_to=in_reply_to, media=media)
+
+
+@pytest.mark.asyncio
+async def test_write_page_and_search(tmp_path):
+    archive = SqliteArchive.in_output(str(tmp_path))
+    photo = Media("photo", "https://pbs.twimg.com/media/a.jpg", "1_0.jpg")
+    await archive.write_page([
+        (make_tweet(id="1", text="Async Rust is great", media=(photo,)), None),
+        (make_tweet(id="2", text="Python packaging tips", handle="pyfan"), None),
+    ])
+
+    assert len(archive) == 2
+    assert archive.written == 2
+    [hit] = archive.search("rust")
+    assert hit == make_tweet(id="1", text="Async Rust is great", media=(photo,))
+    assert [t.id for t in archive.search("pyfan")] == ["2"]
+    assert archive.search("golang") == []
+    archive.close()
+
+
+@pytest.mark.asyncio
+async def test_threads_are_stored_but_only_bookmarks_are_searched(tmp_path):
+    archive = SqliteArchive.in_output(str(tmp_path))
+    root = make_tweet(id="1", text="Root about databases")
+    reply = make_tweet(id="2", text="Reply about indexes", in_reply_to="1")
+    await archive.write_page([(reply, [root, reply])])
+
+    assert [t.id for t in archive.thread("2")] == ["1", "2"]
+    assert archive.search("databases") == []
+    assert [t.id for t in archive.search("indexes")] == ["2"]
+    archive.close()
+
+
+@pytest.mark.asyncio
+async def test_rewriting_a_bookmark_updates_it(tmp_path):
+    archive = SqliteArchive.in_output(str(tmp_path))
+    await archive.write_page([(make_tweet(id="1", text="Old wording"), None)])
+    await archive.write_page([(make_tweet(id="1", text="New wording"), None)])
+    archive.close()
+
+    reopened = SqliteArchive.in_output(str(tmp_path))
+    assert len(reopened) == 1
+    assert reopened.search("old") == []
+    assert [t.text for t in reopened.search("new")] == ["New wording"]
+    reopened.close()
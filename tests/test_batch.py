@@ -0,0 +1,136 @@
+import asyncio
+import json
+import os
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from scraper.batch import load_accounts, run_batch
+from scraper.cli import Config
+from scraper.writer import MarkdownWriter
+
+
+def make_config(output, accounts=None):
+    return Config(output=output, username="", email="", password="", accounts=accounts)
+
+
+def make_mock_tweet(id, screen_name):
+    tweet = MagicMock()
+    tweet.id = id
+    tweet.text = f"Tweet {id}"
+    tweet.user.name = screen_name
+    tweet.user.screen_name = screen_name
+    tweet.created_at = "2024-03-15"
+    tweet.favorite_count = 1
+    tweet.retweet_count = 0
+    tweet.reply_count = 0
+    tweet.media = None
+    tweet.in_reply_to = None
+    return tweet
+
+
+def make_client(tweets):
+    result = MagicMock()
+    result.__iter__ = MagicMock(return_value=iter(tweets))
+    result.next = AsyncMock(return_value=None)
+    result.cursor = None
+    client = MagicMock()
+    client.get_bookmarks = AsyncMock(return_value=result)
+    return client
+
+
+def write_accounts(tmp_path, entries):
+    path = tmp_path / "accounts.json"
+    path.write_text(json.dumps(entries))
+    return str(path)
+
+
+def test_load_accounts(tmp_path):
+    path = write_accounts(tmp_path, [
+        {"name": "alice", "cookies": "alice.json"},
+        {"name": "bob", "cookies": "bob.json", "output": "/data/bob"},
+    ])
+    accounts = load_accounts(make_config("out", accounts=path))
+
+    assert [name for name, _ in accounts] == ["alice", "bob"]
+    alice, bob = accounts[0][1], accounts[1][1]
+    assert alice.output == os.path.join("out", "alice")
+    assert alice.cookies == "alice.json"
+    assert alice.accounts is None
+    assert bob.output == "/data/bob"
+
+
+def test_load_accounts_rejects_duplicates(tmp_path):
+    path = write_accounts(tmp_path, [{"name": "alice"}, {"name": "alice"}])
+    with pytest.raises(ValueError):
+        load_accounts(make_config("out", accounts=path))
+
+
+@pytest.mark.asyncio
+async def test_run_batch_scrapes_each_account(tmp_path):
+    output = str(tmp_path / "out")
+    path = write_accounts(tmp_path, [{"name": "alice"}, {"name": "bob"}])
+    config = make_config(output, accounts=path)
+
+    clients = {
+        "alice": make_client([make_mock_tweet("1", "a")]),
+        "bob": make_client([make_mock_tweet("2", "b"), make_mock_tweet("3", "b")]),
+    }
+
+    async def fake_login(account, io=None):
+        return clients[os.path.basename(account.output)]
+
+    with patch("scraper.batch.login", side_effect=fake_login):
+        results = await run_batch(config, load_accounts(config))
+
+    assert [(r.name, r.total, r.error) for r in results] == [("alice", 1, None), ("bob", 2, None)]
+    assert os.path.isfile(os.path.join(output, "alice", "@a-1.md"))
+    assert os.path.isfile(os.path.join(output, "bob", "@b-3.md"))
+    assert os.path.isfile(os.path.join(output, "bob", "manifest.json"))
+    assert os.path.isdir(os.path.join(output, "media", "store"))
+
+
+@pytest.mark.asyncio
+async def test_failed_login_does_not_stop_other_accounts(tmp_path):
+    output = str(tmp_path / "out")
+    path = write_accounts(tmp_path, [{"name": "alice"}, {"name": "bob"}])
+    config = make_config(output, accounts=path)
+
+    async def fake_login(account, io=None):
+        if account.output.endswith("alice"):
+            raise RuntimeError("bad cookies")
+        return make_client([make_mock_tweet("2", "b")])
+
+    with patch("scraper.batch.login", side_effect=fake_login):
+        results = await run_batch(config, load_accounts(config))
+
+    assert "bad cookies" in results[0].error
+    assert results[1].error is None
+    assert os.path.isfile(os.path.join(output, "bob", "@b-2.md"))
+
+
+@pytest.mark.asyncio
+async def test_unexpected_error_does_not_stop_other_accounts(tmp_path):
+    output = str(tmp_path / "out")
+    path = write_accounts(tmp_path, [{"name": "alice"}, {"name": "bob"}])
+    config = make_config(output, accounts=path)
+
+    async def fake_login(account, io=None):
+        return make_client([make_mock_tweet("1", "a")])
+
+    write_all = MarkdownWriter.write_all
+
+    async def failing_write_all(self, items):
+        if self.output_dir.endswith("alice"):
+            raise OSError("No space left on device")
+        await asyncio.sleep(0.05)
+        await write_all(self, items)
+
+    with patch("scraper.batch.login", side_effect=fake_login), \
+         patch.object(MarkdownWriter, "write_all", failing_write_all):
+        results = await run_batch(config, load_accounts(config))
+
+    assert "No space left" in results[0].error
+    assert results[1].error is None
+    with open(os.path.join(output, "bob", "manifest.json"), encoding="utf-8") as f:
+        assert "1" in json.load(f)["scraped_ids"]
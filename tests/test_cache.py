@@ -0,0 +1,112 @@
+import json
+import sqlite3
+import time
+from unittest.mock import patch
+
+from scraper.cache import TweetCache
+from scraper.models import Media, Tweet
+
+
+def make_tweet(id="1", text="Hello", **kwargs):
+    return Tweet(id=id, text=text, author="Test (@test)", handle="test",
+                 created_at="2024-03-15", **kwargs)
+
+
+def test_put_and_get(tmp_path):
+    cache = TweetCache.in_output(str(tmp_path))
+    cache.put("1", make_tweet())
+
+    assert cache.get("1") == make_tweet()
+    assert cache.get("2") is None
+    assert cache.hits == 1
+    assert cache.misses == 1
+    cache.close()
+
+
+def test_put_many(tmp_path):
+    cache = TweetCache.in_output(str(tmp_path))
+    cache.put_many([make_tweet(id="1"), make_tweet(id="2", text="Second")])
+
+    assert len(cache) == 2
+    assert cache.get("2").text == "Second"
+    cache.close()
+
+
+def test_reads_and_writes_are_committed_on_flush(tmp_path):
+    cache = TweetCache.in_output(str(tmp_path))
+    cache.put("1", make_tweet())
+    cache.flush()
+    other = sqlite3.connect(cache.path)
+
+    def accessed_at():
+        return other.execute("SELECT accessed_at FROM tweets WHERE id = '1'").fetchone()[0]
+
+    before = accessed_at()
+    with patch("scraper.cache.time.time", return_value=before + 60):
+        cache.get("1")
+        cache.put("2", make_tweet("2"))
+    assert accessed_at() == before
+    assert other.execute("SELECT COUNT(*) FROM tweets").fetchone()[0] == 1
+
+    cache.flush()
+    assert accessed_at() == before + 60
+    assert other.execute("SELECT COUNT(*) FROM tweets").fetchone()[0] == 2
+    other.close()
+    cache.close()
+
+
+def test_persists_across_instances(tmp_path):
+    cache = TweetCache.in_output(str(tmp_path))
+    tweet = make_tweet(in_reply_to="0", media=(Media("photo", "https://pbs.twimg.com/a.jpg", "1_0.jpg"),))
+    cache.put("1", tweet)
+    cache.close()
+
+    cache2 = TweetCache.in_output(str(tmp_path))
+    assert cache2.get("1") == tweet
+    cache2.close()
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = TweetCache.in_output(str(tmp_path), ttl=60)
+    cache.put("1", make_tweet("1"))
+
+    with patch("scraper.cache.time.time", return_value=time.time() + 120):
+        assert cache.get("1") is None
+        cache.evict()
+    assert len(cache) == 0
+    cache.close()
+
+
+def test_evicts_least_recently_read(tmp_path):
+    cache = TweetCache.in_output(str(tmp_path), max_entries=2)
+    now = time.time()
+    with patch("scraper.cache.time.time", side_effect=[now, now + 1, now + 2, now + 3]):
+        cache.put("1", make_tweet("1"))
+        cache.put("2", make_tweet("2"))
+        cache.get("1")  # "2" is now the least recently read
+        cache.put("3", make_tweet("3"))
+    cache.evict()
+
+    assert len(cache) == 2
+    assert cache.get("2") is None
+    assert cache.get("1") is not None
+    cache.close()
+
+
+def test_reads_entries_from_before_tweet_records(tmp_path):
+    cache = TweetCache.in_output(str(tmp_path))
+    legacy = {
+        "id": "1", "text": "Old", "author": "Test (@test)", "handle": "test",
+        "created_at": "2024-03-15", "likes": 1, "retweets": 2, "replies": 3,
+        "url": "https://x.com/test/status/1", "has_media": True, "is_reply": False,
+        "in_reply_to": None,
+        "media_items": [{"type": "photo", "url": "https://pbs.twimg.com/a.jpg", "filename": "1_0.jpg"}],
+    }
+    cache._conn.execute(
+        "INSERT INTO tweets VALUES (?, ?, ?, ?)", ("1", json.dumps(legacy), time.time(), time.time())
+    )
+
+    tweet = cache.get("1")
+    assert tweet.text == "Old"
+    assert tweet.media == (Media("photo", "https://pbs.twimg.com/a.jpg", "1_0.jpg"),)
+    cache.close()
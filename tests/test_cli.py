@@ -39,3 +39,102 @@ def test_cookies_flag_skips_credentials():
     assert config.username == ""
     assert config.email == ""
     assert config.password == ""
+
+
+def test_media_concurrency_defaults():
+    config = parse_args(["--output", "./out", "--cookies", "c.json"])
+    assert config.media_concurrency == 8
+    assert config.media_per_host == 4
+
+
+def test_media_concurrency_flags():
+    config = parse_args([
+        "--output", "./out",
+        "--cookies", "c.json",
+        "--media-concurrency", "16",
+        "--media-per-host", "2",
+    ])
+    assert config.media_concurrency == 16
+    assert config.media_per_host == 2
+
+
+def test_fsync_media_flag():
+    config = parse_args(["--output", "./out", "--cookies", "c.json", "--fsync-media"])
+    assert config.fsync_media is True
+
+
+def test_incremental_flag():
+    config = parse_args(["--output", "./out", "--cookies", "c.json", "--incremental"])
+    assert config.incremental is True
+
+
+def test_thread_concurrency_flag():
+    config = parse_args(["--output", "./out", "--cookies", "c.json", "--thread-concurrency", "8"])
+    assert config.thread_concurrency == 8
+
+
+def test_render_workers_flag():
+    config = parse_args(["--output", "./out", "--cookies", "c.json", "--render-workers", "8"])
+    assert config.render_workers == 8
+
+
+def test_sqlite_flag():
+    assert parse_args(["--output", "./out", "--cookies", "c.json"]).sqlite is False
+    config = parse_args(["--output", "./out", "--cookies", "c.json", "--sqlite"])
+    assert config.sqlite is True
+
+
+def test_parquet_flag_needs_pyarrow(monkeypatch):
+    monkeypatch.setattr("scraper.cli.importlib.util.find_spec", lambda name: None)
+    with pytest.raises(SystemExit):
+        parse_args(["--output", "./out", "--cookies", "c.json", "--parquet"])
+
+
+def test_layout_flags():
+    config = parse_args(["--output", "./out", "--layout", "date", "--reshard"])
+    assert config.layout == "date"
+    assert config.reshard is True
+    with pytest.raises(SystemExit):
+        parse_args(["--output", "./out", "--reshard"])
+
+
+def test_refresh_flag():
+    assert parse_args(["--output", "./out", "--cookies", "c.json", "--refresh"]).refresh is True
+    with pytest.raises(SystemExit):
+        parse_args(["--output", "./out", "--cookies", "c.json", "--refresh", "--incremental"])
+
+
+def test_checkpoint_flags():
+    config = parse_args(["--output", "./out", "--cookies", "c.json",
+                         "--checkpoint-pages", "10", "--checkpoint-seconds", "5"])
+    assert config.checkpoint_pages == 10
+    assert config.checkpoint_seconds == 5
+
+
+def test_loop_lag_threshold_flag():
+    config = parse_args(["--output", "./out", "--cookies", "c.json", "--loop-lag-threshold", "0.5"])
+    assert config.loop_lag_threshold == 0.5
+    assert parse_args(["--output", "./out", "--cookies", "c.json"]).loop_lag_threshold == 0.25
+
+
+def test_verify_media_flag():
+    config = parse_args(["--output", "./out", "--cookies", "c.json", "--verify-media", "checksum"])
+    assert config.verify_media == "checksum"
+    assert parse_args(["--output", "./out", "--cookies", "c.json"]).verify_media is None
+
+
+def test_media_quality_flags():
+    config = parse_args(["--output", "./out", "--cookies", "c.json",
+                         "--max-bitrate", "1000000", "--max-resolution", "720",
+                         "--max-video-mb", "50", "--smallest-video", "--photo-size", "medium"])
+    assert config.max_bitrate == 1_000_000
+    assert config.max_resolution == 720
+    assert config.max_video_mb == 50
+    assert config.smallest_video is True
+    assert config.photo_size == "medium"
+
+
+def test_accounts_flag_skips_credentials():
+    config = parse_args(["--output", "./out", "--accounts", "accounts.json"])
+    assert config.accounts == "accounts.json"
+    assert config.username == ""
@@ -0,0 +1,29 @@
+import pytest
+
+from scraper.diskio import DiskIO
+
+
+@pytest.mark.asyncio
+async def test_writes_run_in_order_before_later_calls():
+    io = DiskIO(max_pending=2)
+    seen = []
+    for i in range(10):
+        await io.write(seen.append, i)
+    assert await io.run(len, seen) == 10
+    assert seen == list(range(10))
+    io.close()
+
+
+@pytest.mark.asyncio
+async def test_drain_raises_a_failed_write():
+    io = DiskIO()
+
+    def fail():
+        raise OSError("disk full")
+
+    await io.write(fail)
+    with pytest.raises(OSError, match="disk full"):
+        await io.drain()
+    # Reported once
+    await io.drain()
+    io.close()
@@ -3,7 +3,7 @@ from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
-from scraper.fetcher import fetch_bookmarks
+from scraper.fetcher import fetch_bookmarks, iter_bookmark_pages, iter_bookmarks
 
 
 def make_mock_tweet(id="123", text="Hello world", name="Test User",
@@ -46,24 +46,24 @@ async def test_fetch_bookmarks_converts_tweets():
     client = MagicMock()
     client.get_bookmarks = AsyncMock(return_value=result)
 
-    with patch("scraper.fetcher.asyncio.sleep", new_callable=AsyncMock):
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
         bookmarks = await fetch_bookmarks(client)
 
     assert len(bookmarks) == 2
-    assert bookmarks[0]["id"] == "123"
-    assert bookmarks[0]["text"] == "Hello world"
-    assert bookmarks[0]["author"] == "Test User (@testuser)"
-    assert bookmarks[0]["url"] == "https://x.com/testuser/status/123"
-    assert bookmarks[0]["has_media"] is False
-    assert bookmarks[0]["is_reply"] is False
-
-    assert bookmarks[0]["in_reply_to"] is None
-    assert bookmarks[0]["media_items"] == []
-    assert bookmarks[1]["has_media"] is True
-    assert bookmarks[1]["is_reply"] is True
-    assert bookmarks[1]["in_reply_to"] == "789"
-    assert len(bookmarks[1]["media_items"]) == 1
-    assert bookmarks[1]["media_items"][0]["type"] == "photo"
+    assert bookmarks[0].id == "123"
+    assert bookmarks[0].text == "Hello world"
+    assert bookmarks[0].author == "Test User (@testuser)"
+    assert bookmarks[0].url == "https://x.com/testuser/status/123"
+    assert bookmarks[0].has_media is False
+    assert bookmarks[0].is_reply is False
+
+    assert bookmarks[0].in_reply_to is None
+    assert bookmarks[0].media == ()
+    assert bookmarks[1].has_media is True
+    assert bookmarks[1].is_reply is True
+    assert bookmarks[1].in_reply_to == "789"
+    assert len(bookmarks[1].media) == 1
+    assert bookmarks[1].media[0].type == "photo"
 
 
 @pytest.mark.asyncio
@@ -72,7 +72,7 @@ async def test_fetch_bookmarks_empty():
     client = MagicMock()
     client.get_bookmarks = AsyncMock(return_value=result)
 
-    with patch("scraper.fetcher.asyncio.sleep", new_callable=AsyncMock):
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
         bookmarks = await fetch_bookmarks(client)
     assert bookmarks == []
 
@@ -88,27 +88,47 @@ async def test_fetch_bookmarks_pagination():
     client = MagicMock()
     client.get_bookmarks = AsyncMock(return_value=page1_result)
 
-    with patch("scraper.fetcher.asyncio.sleep", new_callable=AsyncMock):
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
         bookmarks = await fetch_bookmarks(client)
 
     assert len(bookmarks) == 3
-    assert [b["id"] for b in bookmarks] == ["1", "2", "3"]
+    assert [b.id for b in bookmarks] == ["1", "2", "3"]
 
 
 @pytest.mark.asyncio
-async def test_fetch_bookmarks_delay_between_pages():
+async def test_fetch_bookmarks_paced_by_limiter():
+    from scraper.ratelimit import RateLimiter
+
     page2_result = make_mock_result([make_mock_tweet(id="2")], next_result=None)
     page1_result = make_mock_result([make_mock_tweet(id="1")], next_result=page2_result)
 
     client = MagicMock()
     client.get_bookmarks = AsyncMock(return_value=page1_result)
 
-    with patch("scraper.fetcher.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
-        await fetch_bookmarks(client)
+    # A budget of one request per window: every later request has to wait
+    limiter = RateLimiter(budgets={"Bookmarks": 1})
 
-    # sleep(2) called at least once between pages
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        await fetch_bookmarks(client, limiter=limiter)
+
+    # get_bookmarks, then page1.next() and page2.next()
     sleep_args = [call.args[0] for call in mock_sleep.call_args_list]
-    assert 2 in sleep_args
+    assert len(sleep_args) == 2
+    assert 2 < sleep_args[0] < sleep_args[1]
+
+
+@pytest.mark.asyncio
+async def test_fetch_bookmarks_no_sleep_within_budget():
+    page2_result = make_mock_result([make_mock_tweet(id="2")], next_result=None)
+    page1_result = make_mock_result([make_mock_tweet(id="1")], next_result=page2_result)
+
+    client = MagicMock()
+    client.get_bookmarks = AsyncMock(return_value=page1_result)
+
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        await fetch_bookmarks(client)
+
+    mock_sleep.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -128,7 +148,7 @@ async def test_fetch_bookmarks_429_backoff():
     client = MagicMock()
     client.get_bookmarks = AsyncMock(return_value=page1_result)
 
-    with patch("scraper.fetcher.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
         bookmarks = await fetch_bookmarks(client)
 
     assert len(bookmarks) == 2
@@ -147,7 +167,7 @@ async def test_fetch_bookmarks_progress_callback():
 
     progress_counts = []
 
-    with patch("scraper.fetcher.asyncio.sleep", new_callable=AsyncMock):
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
         await fetch_bookmarks(client, on_progress=lambda n: progress_counts.append(n))
 
     assert progress_counts == [1, 2]
@@ -171,19 +191,19 @@ async def test_media_items_extracted():
     client = MagicMock()
     client.get_bookmarks = AsyncMock(return_value=result)
 
-    with patch("scraper.fetcher.asyncio.sleep", new_callable=AsyncMock):
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
         bookmarks = await fetch_bookmarks(client)
 
-    items = bookmarks[0]["media_items"]
+    items = bookmarks[0].media
     assert len(items) == 2
 
-    assert items[0]["type"] == "photo"
-    assert items[0]["url"] == "https://pbs.twimg.com/media/photo1.jpg"
-    assert items[0]["filename"] == "500_0.jpg"
+    assert items[0].type == "photo"
+    assert items[0].url == "https://pbs.twimg.com/media/photo1.jpg"
+    assert items[0].filename == "500_0.jpg"
 
-    assert items[1]["type"] == "video"
-    assert items[1]["url"] == "https://video.twimg.com/vid.mp4"
-    assert items[1]["filename"] == "500_1.mp4"
+    assert items[1].type == "video"
+    assert items[1].url == "https://video.twimg.com/vid.mp4"
+    assert items[1].filename == "500_1.mp4"
 
 
 @pytest.mark.asyncio
@@ -199,7 +219,7 @@ async def test_fetch_bookmarks_saves_cursor(tmp_path):
     client = MagicMock()
     client.get_bookmarks = AsyncMock(return_value=result)
 
-    with patch("scraper.fetcher.asyncio.sleep", new_callable=AsyncMock):
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
         await fetch_bookmarks(client, tracker=tracker)
 
     assert tracker.get_cursor() == "scroll:abc123"
@@ -219,7 +239,7 @@ async def test_fetch_bookmarks_resumes_from_cursor(tmp_path):
     client = MagicMock()
     client.get_bookmarks = AsyncMock(return_value=result)
 
-    with patch("scraper.fetcher.asyncio.sleep", new_callable=AsyncMock):
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
         await fetch_bookmarks(client, tracker=tracker)
 
     client.get_bookmarks.assert_called_once_with(count=20, cursor="scroll:saved_cursor")
@@ -233,8 +253,165 @@ async def test_fetch_bookmarks_no_tracker():
     client = MagicMock()
     client.get_bookmarks = AsyncMock(return_value=result)
 
-    with patch("scraper.fetcher.asyncio.sleep", new_callable=AsyncMock):
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
         bookmarks = await fetch_bookmarks(client)
 
     assert len(bookmarks) == 1
     client.get_bookmarks.assert_called_once_with(count=20)
+
+
+
+@pytest.mark.asyncio
+async def test_iter_bookmark_pages_yields_per_page():
+    page2_result = make_mock_result([make_mock_tweet(id="3")], next_result=None)
+    page1_result = make_mock_result(
+        [make_mock_tweet(id="1"), make_mock_tweet(id="2")], next_result=page2_result,
+    )
+    page1_result.cursor = "scroll:p1"
+    page2_result.cursor = "scroll:p2"
+
+    client = MagicMock()
+    client.get_bookmarks = AsyncMock(return_value=page1_result)
+
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
+        pages = [page async for page in iter_bookmark_pages(client)]
+
+    assert [[b.id for b in p.bookmarks] for p in pages] == [["1", "2"], ["3"]]
+    assert [p.cursor for p in pages] == ["scroll:p1", "scroll:p2"]
+
+
+@pytest.mark.asyncio
+async def test_iter_bookmark_pages_saves_cursor_after_consumer(tmp_path):
+    from scraper.tracker import ProgressTracker
+
+    tracker = ProgressTracker(str(tmp_path))
+    tracker.load()
+
+    page2_result = make_mock_result([make_mock_tweet(id="2")], next_result=None)
+    page1_result = make_mock_result([make_mock_tweet(id="1")], next_result=page2_result)
+    page1_result.cursor = "scroll:p1"
+    page2_result.cursor = "scroll:p2"
+
+    client = MagicMock()
+    client.get_bookmarks = AsyncMock(return_value=page1_result)
+
+    cursors_seen = []
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
+        async for page in iter_bookmark_pages(client, tracker=tracker):
+            # The cursor for the page being processed is not committed yet
+            cursors_seen.append(tracker.get_cursor())
+
+    assert cursors_seen == [None, "scroll:p1"]
+    assert tracker.get_cursor() == "scroll:p2"
+
+
+@pytest.mark.asyncio
+async def test_iter_bookmark_pages_explicit_cursor():
+    result = make_mock_result([make_mock_tweet(id="1")], next_result=None)
+    client = MagicMock()
+    client.get_bookmarks = AsyncMock(return_value=result)
+
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
+        [page async for page in iter_bookmark_pages(client, cursor="scroll:start")]
+
+    client.get_bookmarks.assert_called_once_with(count=20, cursor="scroll:start")
+
+
+@pytest.mark.asyncio
+async def test_iter_bookmarks_flattens_pages():
+    page2_result = make_mock_result([make_mock_tweet(id="3")], next_result=None)
+    page1_result = make_mock_result(
+        [make_mock_tweet(id="1"), make_mock_tweet(id="2")], next_result=page2_result,
+    )
+    client = MagicMock()
+    client.get_bookmarks = AsyncMock(return_value=page1_result)
+
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
+        ids = [bm.id async for bm in iter_bookmarks(client)]
+
+    assert ids == ["1", "2", "3"]
+
+
+@pytest.mark.asyncio
+async def test_incremental_stops_at_fully_known_page(tmp_path):
+    from scraper.tracker import ProgressTracker
+
+    tracker = ProgressTracker(str(tmp_path))
+    tracker.load()
+    tracker.save_cursor("scroll:backfill")
+    for known in ("3", "4"):
+        tracker.mark_scraped(known)
+
+    page3_result = make_mock_result([make_mock_tweet(id="5")], next_result=None)
+    page2_result = make_mock_result(
+        [make_mock_tweet(id="3"), make_mock_tweet(id="4")], next_result=page3_result,
+    )
+    page1_result = make_mock_result(
+        [make_mock_tweet(id="1"), make_mock_tweet(id="2")], next_result=page2_result,
+    )
+    page1_result.cursor = "scroll:p1"
+
+    client = MagicMock()
+    client.get_bookmarks = AsyncMock(return_value=page1_result)
+
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
+        bookmarks = await fetch_bookmarks(client, tracker=tracker, incremental=True)
+
+    assert [b.id for b in bookmarks] == ["1", "2"]
+    # Starts from the head, ignoring the saved backfill cursor
+    client.get_bookmarks.assert_called_once_with(count=20)
+    page2_result.next.assert_not_called()
+    assert tracker.get_cursor() == "scroll:backfill"
+    assert tracker.get_high_water() == "1"
+
+
+@pytest.mark.asyncio
+async def test_incremental_keeps_partially_known_page(tmp_path):
+    from scraper.tracker import ProgressTracker
+
+    tracker = ProgressTracker(str(tmp_path))
+    tracker.load()
+    tracker.mark_scraped("2")
+
+    result = make_mock_result(
+        [make_mock_tweet(id="1"), make_mock_tweet(id="2")], next_result=None,
+    )
+    client = MagicMock()
+    client.get_bookmarks = AsyncMock(return_value=result)
+
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
+        bookmarks = await fetch_bookmarks(client, tracker=tracker, incremental=True)
+
+    assert [b.id for b in bookmarks] == ["1", "2"]
+
+
+@pytest.mark.asyncio
+async def test_incremental_requires_tracker():
+    client = MagicMock()
+    with pytest.raises(ValueError):
+        await fetch_bookmarks(client, incremental=True)
+
+
+@pytest.mark.asyncio
+async def test_media_policy_applied():
+    from twikit.media import Video
+
+    from scraper.quality import MediaPolicy
+
+    video = Video(None, {"type": "video", "video_info": {
+        "duration_millis": 5_000,
+        "variants": [
+            {"content_type": "application/x-mpegURL", "url": "https://video.twimg.com/pl.m3u8"},
+            {"bitrate": 2_176_000, "content_type": "video/mp4", "url": "https://video.twimg.com/high.mp4"},
+            {"bitrate": 256_000, "content_type": "video/mp4", "url": "https://video.twimg.com/low.mp4"},
+        ],
+    }})
+
+    tweet = make_mock_tweet(id="500", media=[video])
+    client = MagicMock()
+    client.get_bookmarks = AsyncMock(return_value=make_mock_result([tweet], next_result=None))
+
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
+        bookmarks = await fetch_bookmarks(client, policy=MediaPolicy(max_bitrate=1_000_000))
+
+    assert bookmarks[0].media[0].url == "https://video.twimg.com/low.mp4"
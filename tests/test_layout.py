@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+from scraper.layout import Layout, reshard
+from scraper.models import Media, Tweet
+from scraper.renderer import render_bookmark
+
+# A real snowflake ID, posted in March 2024
+TWEET_ID = "1768000000000000000"
+
+
+def make_bookmark(id=TWEET_ID, handle="TestUser", created_at="Fri Mar 15 12:00:00 +0000 2024",
+                  media=()):
+    return Tweet(id=id, text="Hello", author=f"Test (@{handle})", handle=handle,
+                 created_at=created_at, media=media)
+
+
+def test_markdown_paths():
+    bm = make_bookmark()
+    assert Layout("flat").markdown_path(bm) == f"@TestUser-{TWEET_ID}.md"
+    assert Layout("date").markdown_path(bm) == f"2024/03/@TestUser-{TWEET_ID}.md"
+    assert Layout("handle").markdown_path(bm) == f"testuser/@TestUser-{TWEET_ID}.md"
+    shard, name = Layout("hash").markdown_path(bm).split("/")
+    assert len(shard) == 2 and name == f"@TestUser-{TWEET_ID}.md"
+
+
+def test_unparseable_date_goes_to_undated():
+    bm = make_bookmark(created_at="")
+    assert Layout("date").markdown_path(bm).startswith("undated/")
+
+
+def test_media_paths_come_from_the_tweet_id():
+    filename = f"{TWEET_ID}_0.jpg"
+    assert Layout("flat").media_path(filename) == filename
+    assert Layout("date").media_path(filename) == f"2024/03/{filename}"
+    hashed = Layout("hash").media_path(filename)
+    assert Layout("handle").media_path(filename) == hashed
+    assert hashed.split("/")[0] == Layout("hash").markdown_path(make_bookmark()).split("/")[0]
+
+
+def test_unknown_layout_is_rejected():
+    with pytest.raises(ValueError):
+        Layout("nested")
+
+
+def test_render_links_media_relative_to_the_markdown_file():
+    filename = f"{TWEET_ID}_0.jpg"
+    bm = make_bookmark(media=(Media("photo", "https://example.com/a.jpg", filename),))
+    assert f"![image](media/{filename})" in render_bookmark(bm)
+    md = render_bookmark(bm, layout=Layout("date"))
+    assert f"![image](../../media/2024/03/{filename})" in md
+
+
+def test_resolve_records_layout(tmp_path):
+    output = str(tmp_path)
+    assert Layout.resolve(output, "date") == Layout("date")
+    # Later runs keep the recorded layout without the flag
+    assert Layout.resolve(output, None) == Layout("date")
+    with pytest.raises(ValueError, match="--reshard"):
+        Layout.resolve(output, "hash")
+
+
+def test_existing_archives_without_a_record_are_flat(tmp_path):
+    output = str(tmp_path)
+    open(os.path.join(output, "manifest.json"), "w").close()
+    with pytest.raises(ValueError, match="flat"):
+        Layout.resolve(output, "date")
+    assert Layout.resolve(output, None) == Layout("flat")
+
+
+def _write(path, text=""):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def test_reshard_moves_files_and_rewrites_links(tmp_path):
+    output = str(tmp_path)
+    filename = f"{TWEET_ID}_0.jpg"
+    bm = make_bookmark(media=(Media("photo", "https://example.com/a.jpg", filename),))
+    name = f"@TestUser-{TWEET_ID}.md"
+    _write(os.path.join(output, name), render_bookmark(bm))
+    _write(os.path.join(output, "media", filename), "image")
+    _write(os.path.join(output, "media", "index.jsonl"))
+    Layout("flat").save(output)
+
+    assert reshard(output, Layout("date")) == (1, 1)
+
+    moved = os.path.join(output, "2024", "03", name)
+    with open(moved, encoding="utf-8") as f:
+        assert f.read() == render_bookmark(bm, layout=Layout("date"))
+    assert os.path.isfile(os.path.join(output, "media", "2024", "03", filename))
+    assert os.path.isfile(os.path.join(output, "media", "index.jsonl"))
+    assert not os.path.exists(os.path.join(output, name))
+    assert Layout.load(output) == Layout("date")
+
+    # And back again, leaving no empty shard folders behind
+    assert reshard(output, Layout("flat")) == (1, 1)
+    with open(os.path.join(output, name), encoding="utf-8") as f:
+        assert f.read() == render_bookmark(bm)
+    assert not os.path.exists(os.path.join(output, "2024"))
+    assert sorted(os.listdir(os.path.join(output, "media"))) == [filename, "index.jsonl"]
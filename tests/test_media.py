@@ -1,93 +1,114 @@
+import asyncio
+import dataclasses
 import os
-from unittest.mock import AsyncMock, patch
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import httpx
 import pytest
 
-from scraper.media import MediaDownloader
+from scraper.layout import Layout
+from scraper.media import AdaptivePacer, MediaDownloader, MediaPool
+from scraper.models import Media, Tweet
 
 
 def make_bookmark(id="123", media_items=None):
-    return {
-        "id": id,
-        "text": "Hello",
-        "author": "Test (@test)",
-        "handle": "test",
-        "created_at": "2024-03-15",
-        "likes": 10,
-        "retweets": 5,
-        "replies": 2,
-        "url": f"https://x.com/test/status/{id}",
-        "has_media": bool(media_items),
-        "is_reply": False,
-        "in_reply_to": None,
-        "media_items": media_items or [],
-    }
+    return Tweet(id=id, text="Hello", author="Test (@test)", handle="test",
+                 created_at="2024-03-15", likes=10, retweets=5, replies=2,
+                 media=tuple(media_items or ()))
 
 
 def make_media_item(tweet_id="123", index=0, type="photo"):
     ext = "jpg" if type == "photo" else "mp4"
-    return {
-        "type": type,
-        "url": f"https://pbs.twimg.com/{tweet_id}_{index}.{ext}",
-        "filename": f"{tweet_id}_{index}.{ext}",
-    }
+    return Media(type, f"https://pbs.twimg.com/{tweet_id}_{index}.{ext}", f"{tweet_id}_{index}.{ext}")
 
 
-def test_download_creates_media_dir(tmp_path):
-    output_dir = str(tmp_path / "output")
-    os.makedirs(output_dir)
-    MediaDownloader(output_dir)
-    assert os.path.isdir(os.path.join(output_dir, "media"))
+class FakeResponse:
+    def __init__(self, body=b"data", status_code=200, headers=None):
+        self.body = body
+        self.status_code = status_code
+        self.headers = headers or {}
 
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            request = httpx.Request("GET", "https://pbs.twimg.com/")
+            response = httpx.Response(self.status_code, headers=self.headers, request=request)
+            raise httpx.HTTPStatusError("error", request=request, response=response)
 
-@pytest.mark.asyncio
-async def test_download_photo(tmp_path):
-    output_dir = str(tmp_path / "output")
-    os.makedirs(output_dir)
-    downloader = MediaDownloader(output_dir)
+    async def aiter_bytes(self, chunk_size=None):
+        chunk_size = chunk_size or len(self.body) or 1
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
 
-    item = make_media_item(type="photo")
-    bm = make_bookmark(media_items=[item])
 
-    mock_resp = AsyncMock()
-    mock_resp.content = b"fake-image-data"
-    mock_resp.raise_for_status = lambda: None
+def make_stream_client(*responses, delay=0.0):
+    """A mock httpx client whose .stream() yields the given responses in turn
+    (or the single response repeatedly)."""
+    client = MagicMock()
+    calls = []
+    queue = list(responses)
 
-    with patch("scraper.media.httpx.AsyncClient") as mock_client_cls, \
-         patch("scraper.media.asyncio.sleep", new_callable=AsyncMock):
-        mock_client = AsyncMock()
-        mock_client.get.return_value = mock_resp
-        mock_client_cls.return_value.__aenter__ = AsyncMock(return_value=mock_client)
-        mock_client_cls.return_value.__aexit__ = AsyncMock(return_value=False)
+    @asynccontextmanager
+    async def stream(method, url, headers=None):
+        calls.append((url, headers))
+        if delay:
+            await asyncio.sleep(delay)
+        yield queue.pop(0) if len(queue) > 1 else queue[0]
 
-        downloaded, skipped = await downloader.download_all([bm], {})
+    client.stream = stream
+    client.calls = calls
+    client.aclose = AsyncMock()
+    return client
 
-    assert downloaded == 1
-    assert skipped == 0
-    assert os.path.isfile(os.path.join(output_dir, "media", "123_0.jpg"))
+
+def patch_client(client):
+    patcher = patch("scraper.media.httpx.AsyncClient")
+    mock_client_cls = patcher.start()
+    mock_client_cls.return_value = client
+    return patcher, mock_client_cls
+
+
+@pytest.fixture
+def output_dir(tmp_path):
+    path = str(tmp_path / "output")
+    os.makedirs(path)
+    return path
+
+
+def test_download_creates_media_dir(output_dir):
+    MediaDownloader(output_dir)
+    assert os.path.isdir(os.path.join(output_dir, "media"))
 
 
 @pytest.mark.asyncio
-async def test_download_video(tmp_path):
-    output_dir = str(tmp_path / "output")
-    os.makedirs(output_dir)
+async def test_download_photo(output_dir):
     downloader = MediaDownloader(output_dir)
+    bm = make_bookmark(media_items=[make_media_item(type="photo")])
 
-    item = make_media_item(type="video")
-    bm = make_bookmark(media_items=[item])
+    patcher, _ = patch_client(make_stream_client(FakeResponse(b"fake-image-data")))
+    try:
+        with patch("scraper.media.asyncio.sleep", new_callable=AsyncMock):
+            downloaded, skipped = await downloader.download_all([bm], {})
+    finally:
+        patcher.stop()
+
+    assert downloaded == 1
+    assert skipped == 0
+    with open(os.path.join(output_dir, "media", "123_0.jpg"), "rb") as f:
+        assert f.read() == b"fake-image-data"
 
-    mock_resp = AsyncMock()
-    mock_resp.content = b"fake-video-data"
-    mock_resp.raise_for_status = lambda: None
 
-    with patch("scraper.media.httpx.AsyncClient") as mock_client_cls, \
-         patch("scraper.media.asyncio.sleep", new_callable=AsyncMock):
-        mock_client = AsyncMock()
-        mock_client.get.return_value = mock_resp
-        mock_client_cls.return_value.__aenter__ = AsyncMock(return_value=mock_client)
-        mock_client_cls.return_value.__aexit__ = AsyncMock(return_value=False)
+@pytest.mark.asyncio
+async def test_download_video(output_dir):
+    downloader = MediaDownloader(output_dir)
+    bm = make_bookmark(media_items=[make_media_item(type="video")])
 
-        downloaded, skipped = await downloader.download_all([bm], {})
+    patcher, _ = patch_client(make_stream_client(FakeResponse(b"fake-video-data")))
+    try:
+        with patch("scraper.media.asyncio.sleep", new_callable=AsyncMock):
+            downloaded, skipped = await downloader.download_all([bm], {})
+    finally:
+        patcher.stop()
 
     assert downloaded == 1
     assert skipped == 0
@@ -95,9 +116,7 @@ async def test_download_video(tmp_path):
 
 
 @pytest.mark.asyncio
-async def test_skip_existing(tmp_path):
-    output_dir = str(tmp_path / "output")
-    os.makedirs(output_dir)
+async def test_skip_existing(output_dir):
     downloader = MediaDownloader(output_dir)
 
     # Pre-create the file
@@ -105,8 +124,7 @@ async def test_skip_existing(tmp_path):
     with open(filepath, "wb") as f:
         f.write(b"existing")
 
-    item = make_media_item(type="photo")
-    bm = make_bookmark(media_items=[item])
+    bm = make_bookmark(media_items=[make_media_item(type="photo")])
 
     with patch("scraper.media.asyncio.sleep", new_callable=AsyncMock):
         downloaded, skipped = await downloader.download_all([bm], {})
@@ -119,9 +137,7 @@ async def test_skip_existing(tmp_path):
 
 
 @pytest.mark.asyncio
-async def test_download_deduplicates_across_threads(tmp_path):
-    output_dir = str(tmp_path / "output")
-    os.makedirs(output_dir)
+async def test_download_deduplicates_across_threads(output_dir):
     downloader = MediaDownloader(output_dir)
 
     item = make_media_item(tweet_id="999", type="photo")
@@ -133,48 +149,439 @@ async def test_download_deduplicates_across_threads(tmp_path):
         "b": [shared_tweet, make_bookmark(id="b")],
     }
 
-    mock_resp = AsyncMock()
-    mock_resp.content = b"image-data"
-    mock_resp.raise_for_status = lambda: None
+    client = make_stream_client(FakeResponse(b"image-data"))
+    patcher, _ = patch_client(client)
+    try:
+        with patch("scraper.media.asyncio.sleep", new_callable=AsyncMock):
+            downloaded, skipped = await downloader.download_all([shared_tweet], threads)
+    finally:
+        patcher.stop()
 
-    with patch("scraper.media.httpx.AsyncClient") as mock_client_cls, \
-         patch("scraper.media.asyncio.sleep", new_callable=AsyncMock):
-        mock_client = AsyncMock()
-        mock_client.get.return_value = mock_resp
-        mock_client_cls.return_value.__aenter__ = AsyncMock(return_value=mock_client)
-        mock_client_cls.return_value.__aexit__ = AsyncMock(return_value=False)
+    # Only downloaded once despite appearing in multiple places
+    assert downloaded == 1
+    assert len(client.calls) == 1
 
-        downloaded, skipped = await downloader.download_all([shared_tweet], threads)
 
-    # Only downloaded once despite appearing in multiple places
+@pytest.mark.asyncio
+async def test_download_progress_callback(output_dir):
+    downloader = MediaDownloader(output_dir)
+    bm = make_bookmark(media_items=[make_media_item(index=0), make_media_item(index=1)])
+
+    progress_calls = []
+
+    patcher, _ = patch_client(make_stream_client(FakeResponse()))
+    try:
+        with patch("scraper.media.asyncio.sleep", new_callable=AsyncMock):
+            await downloader.download_all(
+                [bm], {},
+                on_progress=lambda i, total: progress_calls.append((i, total)),
+            )
+    finally:
+        patcher.stop()
+
+    assert progress_calls == [(1, 2), (2, 2)]
+
+
+@pytest.mark.asyncio
+async def test_download_reuses_one_client(output_dir):
+    downloader = MediaDownloader(output_dir)
+    pages = [
+        make_bookmark(id=str(page), media_items=[
+            make_media_item(tweet_id=str(page), index=i) for i in range(5)
+        ])
+        for page in range(2)
+    ]
+
+    client = make_stream_client(FakeResponse())
+    patcher, mock_client_cls = patch_client(client)
+    try:
+        with patch("scraper.media.asyncio.sleep", new_callable=AsyncMock):
+            # One call per page, as the pipeline makes them
+            for bm in pages:
+                downloaded, _ = await downloader.download_all([bm], {})
+        client.aclose.assert_not_awaited()
+        await downloader.aclose()
+    finally:
+        patcher.stop()
+
+    assert downloaded == 10
+    assert mock_client_cls.call_count == 1
+    assert len(client.calls) == 10
+    client.aclose.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_download_respects_per_host_limit(output_dir):
+    downloader = MediaDownloader(output_dir, concurrency=8, per_host=2)
+    bm = make_bookmark(media_items=[make_media_item(index=i) for i in range(6)])
+
+    active = 0
+    peak = 0
+    inner = make_stream_client(FakeResponse())
+
+    @asynccontextmanager
+    async def tracking_stream(method, url, headers=None):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        async with inner.stream(method, url, headers=headers) as resp:
+            yield resp
+        active -= 1
+
+    client = MagicMock()
+    client.stream = tracking_stream
+    patcher, _ = patch_client(client)
+    try:
+        downloaded, _ = await downloader.download_all([bm], {})
+    finally:
+        patcher.stop()
+
+    assert downloaded == 6
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_download_streams_in_chunks(output_dir):
+    downloader = MediaDownloader(output_dir)
+    bm = make_bookmark(media_items=[make_media_item(type="video")])
+    body = os.urandom(300 * 1024)
+
+    patcher, _ = patch_client(make_stream_client(FakeResponse(body)))
+    try:
+        with patch("scraper.media.CHUNK_SIZE", 1024):
+            await downloader.download_all([bm], {})
+    finally:
+        patcher.stop()
+
+    with open(os.path.join(output_dir, "media", "123_0.mp4"), "rb") as f:
+        assert f.read() == body
+    assert not os.path.exists(os.path.join(output_dir, "media", "123_0.mp4.part"))
+
+
+@pytest.mark.asyncio
+async def test_failed_download_leaves_no_final_file(output_dir):
+    downloader = MediaDownloader(output_dir)
+    bm = make_bookmark(media_items=[make_media_item()])
+
+    patcher, _ = patch_client(make_stream_client(FakeResponse(status_code=404)))
+    try:
+        with patch("scraper.media.asyncio.sleep", new_callable=AsyncMock):
+            downloaded, _ = await downloader.download_all([bm], {})
+    finally:
+        patcher.stop()
+
+    assert downloaded == 0
+    assert not os.path.exists(os.path.join(output_dir, "media", "123_0.jpg"))
+
+
+@pytest.mark.asyncio
+async def test_resume_partial_download_with_range(output_dir):
+    downloader = MediaDownloader(output_dir)
+    item = make_media_item(type="video")
+    bm = make_bookmark(media_items=[item])
+
+    part_path = os.path.join(output_dir, "media", "123_0.mp4.part")
+    with open(part_path, "wb") as f:
+        f.write(b"first-half-")
+    downloader.index.record(item.filename, url=item.url, status="partial")
+
+    client = make_stream_client(FakeResponse(b"second-half", status_code=206,
+                                             headers={"content-range": "bytes 11-21/22"}))
+    patcher, _ = patch_client(client)
+    try:
+        downloaded, _ = await downloader.download_all([bm], {})
+    finally:
+        patcher.stop()
+
     assert downloaded == 1
+    assert client.calls[0][1] == {"Range": "bytes=11-"}
+    with open(os.path.join(output_dir, "media", "123_0.mp4"), "rb") as f:
+        assert f.read() == b"first-half-second-half"
+    assert not os.path.exists(part_path)
 
 
 @pytest.mark.asyncio
-async def test_download_progress_callback(tmp_path):
-    output_dir = str(tmp_path / "output")
-    os.makedirs(output_dir)
+async def test_resume_restarts_when_range_ignored(output_dir):
     downloader = MediaDownloader(output_dir)
+    bm = make_bookmark(media_items=[make_media_item(type="video")])
 
-    items = [make_media_item(index=0), make_media_item(index=1)]
-    bm = make_bookmark(media_items=items)
+    part_path = os.path.join(output_dir, "media", "123_0.mp4.part")
+    with open(part_path, "wb") as f:
+        f.write(b"stale")
 
-    mock_resp = AsyncMock()
-    mock_resp.content = b"data"
-    mock_resp.raise_for_status = lambda: None
+    patcher, _ = patch_client(make_stream_client(FakeResponse(b"whole-file", status_code=200)))
+    try:
+        await downloader.download_all([bm], {})
+    finally:
+        patcher.stop()
+
+    with open(os.path.join(output_dir, "media", "123_0.mp4"), "rb") as f:
+        assert f.read() == b"whole-file"
+
+
+@pytest.mark.asyncio
+async def test_part_from_another_url_is_discarded(output_dir):
+    downloader = MediaDownloader(output_dir)
+    item = make_media_item(type="video")
+    bm = make_bookmark(media_items=[item])
+
+    # Left behind by a run whose media policy picked another variant
+    part_path = os.path.join(output_dir, "media", "123_0.mp4.part")
+    with open(part_path, "wb") as f:
+        f.write(b"other-variant")
+    downloader.index.record(item.filename, url="https://video.twimg.com/low.mp4", status="partial")
+
+    client = make_stream_client(FakeResponse(b"whole-file"))
+    patcher, _ = patch_client(client)
+    try:
+        await downloader.download_all([bm], {})
+    finally:
+        patcher.stop()
+
+    assert client.calls == [(item.url, None)]
+    with open(os.path.join(output_dir, "media", "123_0.mp4"), "rb") as f:
+        assert f.read() == b"whole-file"
+
+
+@pytest.mark.asyncio
+async def test_resume_refetches_when_range_starts_elsewhere(output_dir):
+    downloader = MediaDownloader(output_dir)
+    item = make_media_item(type="video")
+    bm = make_bookmark(media_items=[item])
+
+    part_path = os.path.join(output_dir, "media", "123_0.mp4.part")
+    with open(part_path, "wb") as f:
+        f.write(b"first-half-")
+    downloader.index.record(item.filename, url=item.url, status="partial")
+
+    client = make_stream_client(
+        FakeResponse(b"half-second-half", status_code=206, headers={"content-range": "bytes 6-21/22"}),
+        FakeResponse(b"first-half-second-half"),
+    )
+    patcher, _ = patch_client(client)
+    try:
+        await downloader.download_all([bm], {})
+    finally:
+        patcher.stop()
+
+    assert [headers for _, headers in client.calls] == [{"Range": "bytes=11-"}, None]
+    with open(os.path.join(output_dir, "media", "123_0.mp4"), "rb") as f:
+        assert f.read() == b"first-half-second-half"
+
+
+def test_pacer_backs_off_and_recovers():
+    pacer = AdaptivePacer()
+    assert pacer.delay == 0.0
+
+    pacer.on_throttle()
+    pacer.on_throttle()
+    assert pacer.delay == 1.0
+
+    for _ in range(10):
+        pacer.on_success()
+    assert pacer.delay == 0.0
+
+
+@pytest.mark.asyncio
+async def test_same_url_across_tweets_downloads_once(output_dir):
+    downloader = MediaDownloader(output_dir)
+    shared_url = "https://pbs.twimg.com/media/shared.jpg"
+    bookmarks = [
+        make_bookmark(id=tweet_id, media_items=[
+            Media("photo", shared_url, f"{tweet_id}_0.jpg"),
+        ])
+        for tweet_id in ("1", "2", "3")
+    ]
+
+    client = make_stream_client(FakeResponse(b"shared-image"))
+    patcher, _ = patch_client(client)
+    try:
+        downloaded, skipped = await downloader.download_all(bookmarks, {})
+    finally:
+        patcher.stop()
+
+    assert len(client.calls) == 1
+    assert (downloaded, skipped) == (1, 2)
+    paths = [os.path.join(output_dir, "media", f"{t}_0.jpg") for t in ("1", "2", "3")]
+    assert os.path.samefile(paths[0], paths[1])
+    assert os.path.samefile(paths[0], paths[2])
+
+
+@pytest.mark.asyncio
+async def test_url_in_store_needs_no_request(output_dir):
+    first = MediaDownloader(output_dir)
+    bm1 = make_bookmark(id="1", media_items=[make_media_item(tweet_id="1")])
+    patcher, _ = patch_client(make_stream_client(FakeResponse(b"image")))
+    try:
+        await first.download_all([bm1], {})
+    finally:
+        patcher.stop()
+    first.close()
+
+    # A later run sees the same URL under a different tweet filename
+    second = MediaDownloader(output_dir)
+    item = dataclasses.replace(make_media_item(tweet_id="1"), filename="2_0.jpg")
+    bm2 = make_bookmark(id="2", media_items=[item])
+    client = make_stream_client(FakeResponse(b"should-not-be-fetched"))
+    patcher, _ = patch_client(client)
+    try:
+        downloaded, skipped = await second.download_all([bm2], {})
+    finally:
+        patcher.stop()
+
+    assert client.calls == []
+    assert (downloaded, skipped) == (0, 1)
+    with open(os.path.join(output_dir, "media", "2_0.jpg"), "rb") as f:
+        assert f.read() == b"image"
+
+
+@pytest.mark.asyncio
+async def test_index_skips_without_stat(output_dir):
+    first = MediaDownloader(output_dir)
+    bm = make_bookmark(media_items=[make_media_item()])
+    patcher, _ = patch_client(make_stream_client(FakeResponse(b"image")))
+    try:
+        await first.download_all([bm], {})
+    finally:
+        patcher.stop()
+    first.close()
+
+    entry = MediaDownloader(output_dir).index.get("123_0.jpg")
+    assert entry["status"] == "done"
+    assert entry["size"] == 5
+    assert entry["url"] == "https://pbs.twimg.com/123_0.jpg"
+
+    second = MediaDownloader(output_dir)
+    with patch("scraper.media.os.path.exists", side_effect=AssertionError("stat")):
+        downloaded, skipped = await second.download_all([bm], {})
+    assert (downloaded, skipped) == (0, 1)
+
+
+@pytest.mark.asyncio
+async def test_failed_download_is_indexed_and_retried(output_dir):
+    downloader = MediaDownloader(output_dir)
+    bm = make_bookmark(media_items=[make_media_item()])
+    patcher, _ = patch_client(make_stream_client(FakeResponse(status_code=404)))
+    try:
+        with patch("scraper.media.asyncio.sleep", new_callable=AsyncMock):
+            await downloader.download_all([bm], {})
+    finally:
+        patcher.stop()
+
+    assert downloader.index.get("123_0.jpg")["status"] == "failed"
+    assert not downloader.index.is_done("123_0.jpg")
+
+
+@pytest.mark.asyncio
+async def test_verify_detects_truncated_file(output_dir):
+    downloader = MediaDownloader(output_dir)
+    bm = make_bookmark(media_items=[make_media_item()])
+    patcher, _ = patch_client(make_stream_client(FakeResponse(b"full-image")))
+    try:
+        await downloader.download_all([bm], {})
+    finally:
+        patcher.stop()
+    downloader.close()
+
+    path = os.path.join(output_dir, "media", "123_0.jpg")
+    with open(path, "r+b") as f:
+        f.truncate(4)
+
+    downloader = MediaDownloader(output_dir)
+    assert downloader.verify() == 1
+    assert downloader.index.get("123_0.jpg")["status"] == "corrupt"
+
+    client = make_stream_client(FakeResponse(b"full-image"))
+    patcher, _ = patch_client(client)
+    try:
+        downloaded, _ = await downloader.download_all([bm], {})
+    finally:
+        patcher.stop()
+
+    assert downloaded == 1
+    with open(path, "rb") as f:
+        assert f.read() == b"full-image"
 
-    progress_calls = []
 
-    with patch("scraper.media.httpx.AsyncClient") as mock_client_cls, \
-         patch("scraper.media.asyncio.sleep", new_callable=AsyncMock):
-        mock_client = AsyncMock()
-        mock_client.get.return_value = mock_resp
-        mock_client_cls.return_value.__aenter__ = AsyncMock(return_value=mock_client)
-        mock_client_cls.return_value.__aexit__ = AsyncMock(return_value=False)
+@pytest.mark.asyncio
+async def test_verify_checksums_detects_corruption(output_dir):
+    downloader = MediaDownloader(output_dir)
+    bm = make_bookmark(media_items=[make_media_item()])
+    patcher, _ = patch_client(make_stream_client(FakeResponse(b"image")))
+    try:
+        await downloader.download_all([bm], {})
+    finally:
+        patcher.stop()
+
+    with open(os.path.join(output_dir, "media", "123_0.jpg"), "r+b") as f:
+        f.write(b"IMAGE")
+
+    assert downloader.verify() == 0
+    assert downloader.verify(checksums=True) == 1
 
-        await downloader.download_all(
-            [bm], {},
-            on_progress=lambda i, total: progress_calls.append((i, total)),
+
+@pytest.mark.asyncio
+async def test_shared_pool_and_store_across_downloaders(tmp_path):
+    from scraper.store import MediaStore
+
+    pool = MediaPool(concurrency=2)
+    store = MediaStore(str(tmp_path / "media"))
+    alice = MediaDownloader(str(tmp_path / "alice"), store=store, pool=pool)
+    bob = MediaDownloader(str(tmp_path / "bob"), store=store, pool=pool)
+
+    item = make_media_item()
+    client = make_stream_client(FakeResponse(b"shared"))
+    client.aclose = AsyncMock()
+    with patch("scraper.media.httpx.AsyncClient", return_value=client):
+        await asyncio.gather(
+            alice.download_all([make_bookmark(media_items=[item])], {}),
+            bob.download_all([make_bookmark(media_items=[item])], {}),
         )
+        await pool.aclose()
 
-    assert progress_calls == [(1, 2), (2, 2)]
+    # One fetch, then the second account links the stored blob
+    assert len(client.calls) == 1
+    for name in ("alice", "bob"):
+        with open(tmp_path / name / "media" / "123_0.jpg", "rb") as f:
+            assert f.read() == b"shared"
+    client.aclose.assert_awaited_once()
+
+    alice.close()
+    assert store._index is not None  # the shared store stays open for its owner
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_download_records_bytes_and_retries(output_dir):
+    downloader = MediaDownloader(output_dir)
+    bm = make_bookmark(media_items=[make_media_item()])
+    client = make_stream_client(FakeResponse(status_code=503), FakeResponse(b"image"))
+    patcher, _ = patch_client(client)
+    try:
+        with patch("scraper.media.asyncio.sleep", new_callable=AsyncMock):
+            await downloader.download_all([bm], {})
+    finally:
+        patcher.stop()
+
+    assert downloader.metrics.get("media_bytes") == 5
+    assert downloader.metrics.get("media_retries") == 1
+
+
+@pytest.mark.asyncio
+async def test_sharded_layout_downloads_into_subfolders(output_dir):
+    layout = Layout("hash")
+    downloader = MediaDownloader(output_dir, layout=layout)
+    bm = make_bookmark(media_items=[make_media_item(type="photo")])
+
+    patcher, _ = patch_client(make_stream_client(FakeResponse(b"fake-image-data")))
+    try:
+        await downloader.download_all([bm], {})
+    finally:
+        patcher.stop()
+    downloader.close()
+
+    path = os.path.join(output_dir, "media", *layout.media_path("123_0.jpg").split("/"))
+    with open(path, "rb") as f:
+        assert f.read() == b"fake-image-data"
+    assert not os.path.exists(os.path.join(output_dir, "media", "123_0.jpg"))
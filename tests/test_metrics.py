@@ -0,0 +1,87 @@
+import asyncio
+import json
+import time
+from unittest.mock import patch
+
+import pytest
+
+from scraper.metrics import LoopLagMonitor, Metrics, write_prometheus
+
+
+def test_counters_and_labels():
+    metrics = Metrics()
+    metrics.add("media_bytes", 100)
+    metrics.add("media_bytes", 50)
+    metrics.add("api_calls", endpoint="Bookmarks")
+    metrics.add("api_calls", endpoint="Bookmarks")
+    metrics.add("api_calls", endpoint="TweetDetail")
+    metrics.set("tweet_cache_hit_ratio", 0.25)
+
+    data = metrics.to_dict()
+    assert data["media_bytes"] == 150
+    assert data["api_calls"] == {"Bookmarks": 2, "TweetDetail": 1}
+    assert data["tweet_cache_hit_ratio"] == 0.25
+    assert "run_seconds" in data
+
+
+def test_phase_accumulates_wall_time():
+    metrics = Metrics()
+    with patch("scraper.metrics.time.perf_counter", side_effect=[10.0, 12.5, 20.0, 21.0]):
+        with metrics.phase("fetch"):
+            pass
+        with metrics.phase("fetch"):
+            pass
+    assert metrics.get("phase_seconds", phase="fetch") == 3.5
+
+
+def test_phase_records_time_on_error():
+    metrics = Metrics()
+    with pytest.raises(RuntimeError):
+        with metrics.phase("resolve"):
+            raise RuntimeError("boom")
+    assert "resolve" in metrics.to_dict()["phase_seconds"]
+
+
+def test_only_one_label_per_metric():
+    with pytest.raises(ValueError):
+        Metrics().add("api_calls", endpoint="Bookmarks", account="a")
+
+
+def test_write_json(tmp_path):
+    metrics = Metrics()
+    metrics.add("media_retries", 2)
+    path = tmp_path / "metrics.json"
+    metrics.write_json(str(path))
+    assert json.loads(path.read_text())["media_retries"] == 2
+
+
+def test_write_prometheus_groups_runs(tmp_path):
+    alice, bob = Metrics(), Metrics()
+    alice.add("api_calls", 3, endpoint="Bookmarks")
+    bob.add("api_calls", 5, endpoint="Bookmarks")
+    bob.add("media_bytes", 1024)
+
+    path = tmp_path / "scraper.prom"
+    write_prometheus(str(path), [({"account": "alice"}, alice), ({"account": "bob"}, bob)])
+    lines = path.read_text().splitlines()
+
+    assert lines.count("# TYPE bookmarks_scraper_api_calls gauge") == 1
+    assert 'bookmarks_scraper_api_calls{account="alice",endpoint="Bookmarks"} 3' in lines
+    assert 'bookmarks_scraper_api_calls{account="bob",endpoint="Bookmarks"} 5' in lines
+    assert 'bookmarks_scraper_media_bytes{account="bob"} 1024' in lines
+    assert not (tmp_path / "scraper.prom.tmp").exists()
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_monitor_reports_blocking_calls(capsys):
+    metrics = Metrics()
+    monitor = LoopLagMonitor(metrics, threshold=0.05, interval=0.01)
+    monitor.start()
+    await asyncio.sleep(0.03)
+    time.sleep(0.15)  # blocks the loop
+    await asyncio.sleep(0.03)
+    await monitor.stop()
+
+    assert metrics.get("loop_stalls") == 1
+    assert metrics.get("loop_lag_max_seconds") >= 0.1
+    assert "Event loop stalled" in capsys.readouterr().out
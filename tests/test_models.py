@@ -0,0 +1,61 @@
+import dataclasses
+from unittest.mock import MagicMock
+
+import pytest
+
+from scraper.models import Media, Tweet
+
+
+def make_mock_tweet(id="1", screen_name="alice", media=None, in_reply_to=None):
+    tweet = MagicMock()
+    tweet.id = id
+    tweet.text = "Hello"
+    tweet.user.name = "Alice"
+    tweet.user.screen_name = screen_name
+    tweet.created_at = "2024-03-15"
+    tweet.favorite_count = 3
+    tweet.retweet_count = 2
+    tweet.reply_count = 1
+    tweet.media = media
+    tweet.in_reply_to = in_reply_to
+    return tweet
+
+
+def test_from_twikit():
+    photo = MagicMock(type="photo", media_url="https://pbs.twimg.com/media/a.jpg")
+    tweet = Tweet.from_twikit(make_mock_tweet(media=[photo], in_reply_to="0"))
+
+    assert tweet.author == "Alice (@alice)"
+    assert tweet.url == "https://x.com/alice/status/1"
+    assert (tweet.likes, tweet.retweets, tweet.replies) == (3, 2, 1)
+    assert tweet.is_reply and tweet.has_media
+    assert tweet.media == (Media("photo", "https://pbs.twimg.com/media/a.jpg", "1_0.jpg"),)
+
+
+def test_repeat_authors_share_strings():
+    # Build the handle at runtime so it is not a shared compile-time constant
+    first = Tweet.from_twikit(make_mock_tweet(id="1", screen_name="".join(["bo", "b"])))
+    second = Tweet.from_twikit(make_mock_tweet(id="2", screen_name="".join(["b", "ob"])))
+    assert first.handle is second.handle
+    assert first.author is second.author
+
+
+def test_records_are_frozen_and_slotted():
+    tweet = Tweet.placeholder("9")
+    assert not hasattr(tweet, "__dict__")
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        tweet.text = "changed"
+
+
+def test_placeholder():
+    tweet = Tweet.placeholder("9")
+    assert tweet.text == "[Tweet unavailable]"
+    assert tweet.handle == "unknown"
+    assert not tweet.is_reply and not tweet.has_media
+
+
+def test_dict_round_trip():
+    tweet = Tweet(id="1", text="Hi", author="A (@a)", handle="a", created_at="2024",
+                  likes=1, in_reply_to="0",
+                  media=(Media("video", "https://video.twimg.com/v.mp4", "1_0.mp4"),))
+    assert Tweet.from_dict(tweet.to_dict()) == tweet
@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+
+import pytest
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+from scraper.models import Media, Tweet
+from scraper.parquet import ParquetExporter, bookmark_schema, thread_schema
+
+
+def make_tweet(id="123", text="Hello", in_reply_to=None, media=(), likes=10):
+    return Tweet(id=id, text=text, author="Test (@test)", handle="test",
+                 created_at="Fri Mar 15 12:00:00 +0000 2024", likes=likes, retweets=5,
+                 replies=2, in_reply_to=in_reply_to, media=media)
+
+
+@pytest.mark.asyncio
+async def test_writes_bookmarks_and_threads(tmp_path):
+    exporter = ParquetExporter(str(tmp_path))
+    photo = Media("photo", "https://pbs.twimg.com/media/a.jpg", "3_0.jpg")
+    root = make_tweet(id="1", text="Root")
+    reply = make_tweet(id="2", text="Reply", in_reply_to="1")
+    await exporter.write_page([
+        (reply, [root, reply]),
+        (make_tweet(id="3", media=(photo,)), None),
+    ])
+    exporter.close()
+
+    bookmarks = pq.read_table(tmp_path / "bookmarks.parquet")
+    assert bookmarks.schema.equals(bookmark_schema())
+    rows = bookmarks.to_pylist()
+    assert [r["id"] for r in rows] == ["2", "3"]
+    assert [r["thread_length"] for r in rows] == [2, 1]
+    assert rows[0]["created_at_utc"] == datetime(2024, 3, 15, 12, tzinfo=timezone.utc)
+    assert rows[1]["media"] == [{"type": "photo", "url": photo.url, "filename": "3_0.jpg"}]
+    assert rows[1]["url"] == "https://x.com/test/status/3"
+
+    threads = pq.read_table(tmp_path / "threads.parquet")
+    assert threads.schema.equals(thread_schema())
+    assert [(r["bookmark_id"], r["position"], r["id"]) for r in threads.to_pylist()] == [
+        ("2", 0, "1"), ("2", 1, "2"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_writes_row_groups_as_rows_arrive(tmp_path):
+    exporter = ParquetExporter(str(tmp_path), row_group_size=3)
+    for page in range(3):
+        await exporter.write_page([(make_tweet(id=str(page * 4 + i)), None) for i in range(4)])
+    exporter.close()
+
+    parquet_file = pq.ParquetFile(tmp_path / "bookmarks.parquet")
+    assert parquet_file.metadata.num_rows == 12
+    assert parquet_file.num_row_groups == 4
+
+
+@pytest.mark.asyncio
+async def test_later_runs_keep_earlier_rows_and_replace_updated_ones(tmp_path):
+    first = ParquetExporter(str(tmp_path))
+    await first.write_page([
+        (make_tweet(id="1", likes=1), None),
+        (make_tweet(id="2", likes=1), None),
+    ])
+    first.close()
+
+    second = ParquetExporter(str(tmp_path))
+    await second.write_page([(make_tweet(id="2", likes=50), None), (make_tweet(id="3"), None)])
+    second.close()
+
+    rows = pq.read_table(tmp_path / "bookmarks.parquet").to_pylist()
+    assert sorted((r["id"], r["likes"]) for r in rows) == [("1", 1), ("2", 50), ("3", 10)]
+    assert not (tmp_path / "bookmarks.parquet.part").exists()
@@ -0,0 +1,239 @@
+import asyncio
+import os
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from scraper.archive import SqliteArchive
+from scraper.models import Media, Tweet
+from scraper.pipeline import FetchError, Pipeline
+from scraper.threads import ThreadResolver
+from scraper.tracker import ProgressTracker
+
+_real_sleep = asyncio.sleep
+
+
+def make_mock_result(tweets, next_result=None):
+    result = MagicMock()
+    result.__iter__ = MagicMock(return_value=iter(tweets))
+    result.next = AsyncMock(return_value=next_result)
+    result.__bool__ = MagicMock(return_value=True)
+    result.cursor = None
+    return result
+
+
+def make_mock_tweet(id="123", text="Test tweet", screen_name="test", in_reply_to=None):
+    tweet = MagicMock()
+    tweet.id = id
+    tweet.text = text
+    tweet.user.name = "Test"
+    tweet.user.screen_name = screen_name
+    tweet.created_at = "2024-03-15"
+    tweet.favorite_count = 10
+    tweet.retweet_count = 5
+    tweet.reply_count = 2
+    tweet.media = None
+    tweet.in_reply_to = in_reply_to
+    return tweet
+
+
+def make_pipeline(output_dir, client, refresh=False):
+    tracker = ProgressTracker(output_dir)
+    tracker.load()
+    downloader = MagicMock()
+    downloader.download_all = AsyncMock(return_value=(0, 0))
+    return Pipeline(
+        client, output_dir, tracker,
+        resolver=ThreadResolver(client),
+        downloader=downloader,
+        refresh=refresh,
+    )
+
+
+@pytest.mark.asyncio
+async def test_pipeline_writes_pages_before_pagination_finishes(tmp_path):
+    output_dir = str(tmp_path)
+    first_file = os.path.join(output_dir, "@test-1.md")
+
+    page2 = make_mock_result([make_mock_tweet(id="2")], next_result=None)
+    page1 = make_mock_result([make_mock_tweet(id="1")])
+
+    written_before_page2 = []
+
+    async def next_page():
+        # Give the downstream stages a chance to process page 1 first
+        for _ in range(50):
+            if os.path.isfile(first_file):
+                break
+            await _real_sleep(0)
+        written_before_page2.append(os.path.isfile(first_file))
+        return page2
+
+    page1.next = AsyncMock(side_effect=next_page)
+    client = MagicMock()
+    client.get_bookmarks = AsyncMock(return_value=page1)
+
+    pipeline = make_pipeline(output_dir, client)
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
+        await pipeline.run()
+
+    assert written_before_page2 == [True]
+    assert pipeline.total == 2
+    assert pipeline.written == 2
+    assert os.path.isfile(os.path.join(output_dir, "@test-2.md"))
+
+
+@pytest.mark.asyncio
+async def test_pipeline_downloads_media_per_page(tmp_path):
+    page2 = make_mock_result([make_mock_tweet(id="2")], next_result=None)
+    page1 = make_mock_result([make_mock_tweet(id="1")], next_result=page2)
+    for page, tweet_id in ((page1, "1"), (page2, "2")):
+        photo = MagicMock(type="photo", media_url=f"https://pbs.twimg.com/{tweet_id}.jpg")
+        tweet = make_mock_tweet(id=tweet_id)
+        tweet.media = [photo]
+        page.__iter__ = MagicMock(return_value=iter([tweet]))
+
+    client = MagicMock()
+    client.get_bookmarks = AsyncMock(return_value=page1)
+
+    pipeline = make_pipeline(str(tmp_path), client)
+    pipeline.downloader.download_all = AsyncMock(side_effect=[(1, 0), (2, 0)])
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
+        await pipeline.run()
+
+    assert pipeline.downloader.download_all.call_count == 2
+    assert pipeline.media_found == 2
+    assert pipeline.downloaded == 2
+
+
+@pytest.mark.asyncio
+async def test_pipeline_wraps_fetch_errors(tmp_path):
+    page1 = make_mock_result([make_mock_tweet(id="1")])
+    page1.next = AsyncMock(side_effect=RuntimeError("boom"))
+    client = MagicMock()
+    client.get_bookmarks = AsyncMock(return_value=page1)
+
+    pipeline = make_pipeline(str(tmp_path), client)
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock), \
+         pytest.raises(FetchError, match="boom"):
+        await pipeline.run()
+    # The page fetched before the failure is still written and committed
+    assert pipeline.written == 1
+    assert pipeline.tracker.is_scraped("1")
+
+
+@pytest.mark.asyncio
+async def test_pipeline_commits_cursor_after_page_is_written(tmp_path):
+    output_dir = str(tmp_path)
+    page2 = make_mock_result([make_mock_tweet(id="2")], next_result=None)
+    page2.cursor = "scroll:p2"
+    page1 = make_mock_result([make_mock_tweet(id="1")], next_result=page2)
+    page1.cursor = "scroll:p1"
+
+    client = MagicMock()
+    client.get_bookmarks = AsyncMock(return_value=page1)
+
+    pipeline = make_pipeline(output_dir, client)
+    committed = []
+    save_cursor = pipeline.tracker.save_cursor
+
+    def record(cursor):
+        committed.append((cursor, sorted(f for f in os.listdir(output_dir) if f.endswith(".md"))))
+        save_cursor(cursor)
+
+    pipeline.tracker.save_cursor = record
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
+        await pipeline.run()
+
+    assert committed[0] == ("scroll:p1", ["@test-1.md"])
+    assert committed[1][0] == "scroll:p2"
+    assert pipeline.tracker.get_cursor() == "scroll:p2"
+
+
+@pytest.mark.asyncio
+async def test_pipeline_does_not_commit_page_before_its_media(tmp_path):
+    output_dir = str(tmp_path)
+    page1 = make_mock_result([make_mock_tweet(id="1")])
+    page1.cursor = "scroll:p1"
+    client = MagicMock()
+    client.get_bookmarks = AsyncMock(return_value=page1)
+
+    pipeline = make_pipeline(output_dir, client)
+    pipeline.downloader.download_all = AsyncMock(side_effect=OSError("disk full"))
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock), \
+         patch("scraper.fetcher._extract_tweets", side_effect=lambda result, policy: [
+             Tweet(id="1", text="t", author="a", handle="test", created_at="",
+                   media=(Media("photo", "http://x/1.jpg", "1_0.jpg"),))]), \
+         pytest.raises(OSError):
+        await pipeline.run()
+
+    # The markdown was written, but the page must be fetched again
+    assert os.path.isfile(os.path.join(output_dir, "@test-1.md"))
+    assert pipeline.tracker.get_cursor() is None
+    assert not pipeline.tracker.is_scraped("1")
+
+
+@pytest.mark.asyncio
+async def test_pipeline_records_phase_metrics(tmp_path):
+    client = MagicMock()
+    client.get_bookmarks = AsyncMock(return_value=make_mock_result([make_mock_tweet(id="1")]))
+
+    pipeline = make_pipeline(str(tmp_path), client)
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
+        await pipeline.run()
+
+    data = pipeline.metrics.to_dict()
+    assert set(data["phase_seconds"]) >= {"fetch", "resolve", "render"}
+    assert data["bookmarks"] == 1
+    assert data["markdown_written"] == 1
+
+
+@pytest.mark.asyncio
+async def test_pipeline_exports_every_page_to_sqlite(tmp_path):
+    output_dir = str(tmp_path)
+    # Markdown for bookmark 1 already exists; it is still archived
+    with open(os.path.join(output_dir, "@test-1.md"), "w", encoding="utf-8") as f:
+        f.write("old")
+    page2 = make_mock_result([make_mock_tweet(id="2", text="Second page")], next_result=None)
+    page1 = make_mock_result([make_mock_tweet(id="1", text="First page")], next_result=page2)
+    client = MagicMock()
+    client.get_bookmarks = AsyncMock(return_value=page1)
+
+    pipeline = make_pipeline(output_dir, client)
+    pipeline.exporters = [SqliteArchive.in_output(output_dir)]
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
+        await pipeline.run()
+
+    assert pipeline.metrics.get("sqlite_written") == 2
+    assert "export" in pipeline.metrics.to_dict()["phase_seconds"]
+    archive = SqliteArchive.in_output(output_dir)
+    assert len(archive) == 2
+    assert [t.id for t in archive.search("page")] in (["1", "2"], ["2", "1"])
+    archive.close()
+
+
+@pytest.mark.asyncio
+async def test_pipeline_refresh_updates_existing_files(tmp_path):
+    output_dir = str(tmp_path)
+    client = MagicMock()
+    client.get_bookmarks = AsyncMock(return_value=make_mock_result([make_mock_tweet(id="1")]))
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
+        await make_pipeline(output_dir, client).run()
+
+    liked = make_mock_tweet(id="1")
+    liked.favorite_count = 42
+    page = make_mock_result([liked, make_mock_tweet(id="2")])
+    page.cursor = "scroll:next"
+    client.get_bookmarks = AsyncMock(return_value=page)
+    pipeline = make_pipeline(output_dir, client, refresh=True)
+    pipeline.tracker.save_cursor("scroll:deep")
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
+        await pipeline.run()
+
+    # Paging starts from the top and leaves the resume cursor alone
+    assert "cursor" not in client.get_bookmarks.call_args.kwargs
+    assert pipeline.tracker.get_cursor() == "scroll:deep"
+    with open(os.path.join(output_dir, "@test-1.md"), encoding="utf-8") as f:
+        assert "likes: 42" in f.read()
+    assert pipeline.written == 1
+    assert pipeline.metrics.get("markdown_frontmatter_updated") == 1
@@ -0,0 +1,82 @@
+from unittest.mock import MagicMock
+
+import pytest
+from twikit.media import AnimatedGif, Video
+
+from scraper.models import media_item
+from scraper.quality import MediaPolicy
+
+
+def make_variant(bitrate, size):
+    return {"bitrate": bitrate, "content_type": "video/mp4",
+            "url": f"https://video.twimg.com/vid/avc1/{size}/{bitrate}.mp4"}
+
+
+def make_video(duration_millis=60_000):
+    # Variants in the order and shape Twitter sends them
+    return Video(None, {"type": "video", "video_info": {
+        "aspect_ratio": [16, 9],
+        "duration_millis": duration_millis,
+        "variants": [
+            {"content_type": "application/x-mpegURL", "url": "https://video.twimg.com/pl.m3u8"},
+            make_variant(256_000, "480x270"),
+            make_variant(2_176_000, "1280x720"),
+            make_variant(832_000, "640x360"),
+        ],
+    }})
+
+
+def test_default_policy_keeps_last_stream():
+    item = media_item("1", 0, make_video())
+    assert item.url.endswith("/832000.mp4")
+    assert item.filename == "1_0.mp4"
+
+
+def test_smallest_picks_lowest_bitrate():
+    item = media_item("1", 0, make_video(), MediaPolicy(smallest=True))
+    assert item.url.endswith("/256000.mp4")
+
+
+def test_max_bitrate():
+    item = media_item("1", 0, make_video(), MediaPolicy(max_bitrate=1_000_000))
+    assert item.url.endswith("/832000.mp4")
+
+
+def test_max_resolution_uses_shorter_side():
+    item = media_item("1", 0, make_video(), MediaPolicy(max_resolution=360))
+    assert item.url.endswith("/832000.mp4")
+
+
+def test_max_bytes_estimated_from_duration():
+    # 60s at 832 kbit/s is ~6.2 MB, at 2176 kbit/s ~16.3 MB
+    policy = MediaPolicy(max_bytes=10_000_000)
+    assert media_item("1", 0, make_video(), policy).url.endswith("/832000.mp4")
+    assert media_item("1", 0, make_video(duration_millis=10_000), policy).url.endswith("/2176000.mp4")
+
+
+def test_falls_back_to_smallest_when_nothing_fits():
+    item = media_item("1", 0, make_video(), MediaPolicy(max_bitrate=1))
+    assert item.url.endswith("/256000.mp4")
+
+
+def test_animated_gif_uses_its_mp4():
+    gif = AnimatedGif(None, {"type": "animated_gif", "video_info": {
+        "aspect_ratio": [1, 1],
+        "variants": [{"bitrate": 0, "content_type": "video/mp4",
+                      "url": "https://video.twimg.com/tweet_video/abc.mp4"}],
+    }})
+    item = media_item("1", 0, gif, MediaPolicy(smallest=True))
+    assert item.url == "https://video.twimg.com/tweet_video/abc.mp4"
+
+
+def test_photo_size_variant():
+    photo = MagicMock(type="photo", media_url="https://pbs.twimg.com/media/abc.jpg")
+    assert media_item("1", 0, photo).url == "https://pbs.twimg.com/media/abc.jpg"
+    item = media_item("1", 0, photo, MediaPolicy(photo_size="small"))
+    assert item.url == "https://pbs.twimg.com/media/abc.jpg?name=small"
+    assert item.filename == "1_0.jpg"
+
+
+def test_unknown_photo_size_rejected():
+    with pytest.raises(ValueError):
+        MediaPolicy(photo_size="huge")
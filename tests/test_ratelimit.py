@@ -0,0 +1,117 @@
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import pytest
+from twikit.errors import ServerError, TooManyRequests
+
+from scraper.ratelimit import RateLimiter, TokenBucket
+
+
+def test_bucket_allows_burst_up_to_capacity():
+    bucket = TokenBucket(3, window=3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() > 0
+
+
+def test_bucket_queues_waiters():
+    bucket = TokenBucket(1, window=10)
+    bucket.reserve()
+    first = bucket.reserve()
+    second = bucket.reserve()
+    assert first == pytest.approx(10, abs=0.1)
+    assert second == pytest.approx(20, abs=0.1)
+
+
+def test_update_from_headers_blocks_until_reset():
+    limiter = RateLimiter()
+    limiter.update("TweetDetail", {
+        "x-rate-limit-limit": "150",
+        "x-rate-limit-remaining": "0",
+        "x-rate-limit-reset": str(int(time.time()) + 30),
+    })
+    assert limiter.bucket("TweetDetail").reserve() > 25
+
+
+def test_update_ignores_missing_headers():
+    limiter = RateLimiter()
+    limiter.update("TweetDetail", {})
+    assert limiter.bucket("TweetDetail").reserve() == 0.0
+
+
+@pytest.mark.asyncio
+async def test_attach_reads_response_headers():
+    limiter = RateLimiter()
+    reset = int(time.time()) + 60
+
+    def handler(request):
+        return httpx.Response(200, headers={
+            "x-rate-limit-limit": "500",
+            "x-rate-limit-remaining": "0",
+            "x-rate-limit-reset": str(reset),
+        })
+
+    client = MagicMock()
+    client.http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    limiter.attach(client)
+    await client.http.get("https://x.com/i/api/graphql/abc/Bookmarks")
+    await client.http.aclose()
+
+    assert limiter.bucket("Bookmarks").capacity == 500
+    assert limiter.bucket("Bookmarks").reserve() > 55
+
+
+@pytest.mark.asyncio
+async def test_call_retries_with_backoff():
+    limiter = RateLimiter()
+    fn = AsyncMock(side_effect=[ServerError("boom"), ServerError("boom"), "ok"])
+
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        assert await limiter.call("TweetDetail", fn, "1") == "ok"
+
+    waits = [call.args[0] for call in mock_sleep.call_args_list]
+    assert len(waits) == 2
+    assert 1 <= waits[0] <= 2
+    assert 2 <= waits[1] <= 4
+    fn.assert_called_with("1")
+
+
+@pytest.mark.asyncio
+async def test_call_gives_up_after_max_retries():
+    limiter = RateLimiter(max_retries=2)
+    fn = AsyncMock(side_effect=TooManyRequests("slow down"))
+
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock), \
+         pytest.raises(TooManyRequests):
+        await limiter.call("Bookmarks", fn)
+
+    assert fn.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_call_waits_for_rate_limit_reset():
+    limiter = RateLimiter()
+    reset = int(time.time()) + 40
+    error = TooManyRequests("rate limited", headers={"x-rate-limit-reset": str(reset)})
+    fn = AsyncMock(side_effect=[error, "ok"])
+
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        await limiter.call("Bookmarks", fn)
+
+    waits = [call.args[0] for call in mock_sleep.call_args_list]
+    assert waits and waits[0] > 35
+
+
+@pytest.mark.asyncio
+async def test_call_records_metrics():
+    limiter = RateLimiter(budgets={"TweetDetail": 1})
+    fn = AsyncMock(side_effect=[ServerError("boom"), "ok", "ok"])
+
+    with patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock):
+        await limiter.call("TweetDetail", fn)
+        await limiter.call("TweetDetail", fn)
+
+    data = limiter.metrics.to_dict()
+    assert data["api_calls"] == {"TweetDetail": 3}
+    assert data["api_retries"] == {"TweetDetail": 1}
+    assert data["rate_limit_sleep_seconds"]["TweetDetail"] > 0
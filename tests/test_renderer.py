@@ -1,3 +1,4 @@
+from scraper.models import Media, Tweet
 from scraper.renderer import render_bookmark, bookmark_filename
 
 
@@ -11,14 +12,10 @@ def make_bookmark(**overrides):
         "likes": 450,
         "retweets": 83,
         "replies": 12,
-        "url": "https://x.com/testuser/status/123",
-        "has_media": False,
-        "is_reply": False,
         "in_reply_to": None,
-        "media_items": [],
     }
     defaults.update(overrides)
-    return defaults
+    return Tweet(**defaults)
 
 
 def test_render_bookmark_frontmatter():
@@ -65,14 +62,10 @@ def test_bookmark_filename_different_handle():
 
 
 def test_render_thread():
-    bm = make_bookmark(text="Reply text", is_reply=True, in_reply_to="98")
+    bm = make_bookmark(text="Reply text", in_reply_to="98")
     thread = [
-        make_bookmark(id="98", text="Root tweet", handle="root_user",
-                      url="https://x.com/root_user/status/98",
-                      is_reply=False, in_reply_to=None),
-        make_bookmark(id="99", text="Middle tweet", handle="mid_user",
-                      url="https://x.com/mid_user/status/99",
-                      is_reply=True, in_reply_to="98"),
+        make_bookmark(id="98", text="Root tweet", handle="root_user", in_reply_to=None),
+        make_bookmark(id="99", text="Middle tweet", handle="mid_user", in_reply_to="98"),
         bm,
     ]
     md = render_bookmark(bm, thread=thread)
@@ -106,17 +99,17 @@ def test_render_thread_none_same_as_no_thread():
 
 
 def test_render_photo_media():
-    bm = make_bookmark(media_items=[
-        {"type": "photo", "url": "https://example.com/img.jpg", "filename": "123_0.jpg"},
-    ])
+    bm = make_bookmark(media=(
+        Media("photo", "https://example.com/img.jpg", "123_0.jpg"),
+    ))
     md = render_bookmark(bm)
     assert "![image](media/123_0.jpg)" in md
 
 
 def test_render_video_media():
-    bm = make_bookmark(media_items=[
-        {"type": "video", "url": "https://example.com/vid.mp4", "filename": "123_0.mp4"},
-    ])
+    bm = make_bookmark(media=(
+        Media("video", "https://example.com/vid.mp4", "123_0.mp4"),
+    ))
     md = render_bookmark(bm)
     assert "[video](media/123_0.mp4)" in md
 
@@ -124,12 +117,12 @@ def test_render_video_media():
 def test_render_thread_with_media():
     parent = make_bookmark(
         id="98", text="Parent with image",
-        media_items=[
-            {"type": "photo", "url": "https://example.com/p.jpg", "filename": "98_0.jpg"},
-        ],
+        media=(
+            Media("photo", "https://example.com/p.jpg", "98_0.jpg"),
+        ),
     )
     child = make_bookmark(
-        id="99", text="Reply", is_reply=True, in_reply_to="98",
+        id="99", text="Reply", in_reply_to="98",
     )
     md = render_bookmark(child, thread=[parent, child])
 
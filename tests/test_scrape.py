@@ -1,3 +1,4 @@
+import asyncio
 import importlib
 import json
 import os
@@ -7,6 +8,8 @@ import pytest
 
 from scraper.cli import Config
 
+_real_sleep = asyncio.sleep
+
 
 def make_mock_result(tweets, next_result=None):
     result = MagicMock()
@@ -54,10 +57,11 @@ async def test_end_to_end(tmp_path, capsys):
 
     mock_downloader = MagicMock()
     mock_downloader.download_all = AsyncMock(return_value=(0, 0))
+    mock_downloader.aclose = AsyncMock()
 
     with patch("scraper.auth.Client", return_value=mock_client), \
          patch("scraper.cli.parse_args", return_value=mock_config), \
-         patch("scraper.fetcher.asyncio.sleep", new_callable=AsyncMock), \
+         patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock), \
          patch("scraper.media.MediaDownloader", return_value=mock_downloader):
         import scrape
         importlib.reload(scrape)
@@ -80,6 +84,12 @@ async def test_end_to_end(tmp_path, capsys):
     output = capsys.readouterr().out
     assert "Done. 1 bookmarks saved to" in output
 
+    with open(os.path.join(output_dir, "metrics.json"), encoding="utf-8") as f:
+        metrics = json.load(f)
+    assert metrics["bookmarks"] == 1
+    assert metrics["api_calls"]["Bookmarks"] >= 1
+    assert "login" in metrics["phase_seconds"]
+
 
 @pytest.mark.asyncio
 async def test_end_to_end_with_thread(tmp_path, capsys):
@@ -97,25 +107,23 @@ async def test_end_to_end_with_thread(tmp_path, capsys):
     tweet_reply = make_mock_tweet(id="200", text="Reply tweet", in_reply_to="199")
     mock_result = make_mock_result([tweet_normal, tweet_reply], next_result=None)
 
-    # Mock the tweet object returned by get_tweet_by_id for thread resolution
+    # Thread resolution looks up the reply's parent
     parent_tweet = make_mock_tweet(id="199", text="Parent tweet", in_reply_to=None)
-    reply_tweet_obj = MagicMock()
-    reply_tweet_obj.id = "200"
-    reply_tweet_obj.reply_to = [parent_tweet]
-    reply_tweet_obj.in_reply_to = "199"
+    parent_tweet.reply_to = []
 
     mock_client = MagicMock()
     mock_client.login = AsyncMock()
     mock_client.save_cookies = MagicMock()
     mock_client.get_bookmarks = AsyncMock(return_value=mock_result)
-    mock_client.get_tweet_by_id = AsyncMock(return_value=reply_tweet_obj)
+    mock_client.get_tweet_by_id = AsyncMock(return_value=parent_tweet)
 
     mock_downloader = MagicMock()
     mock_downloader.download_all = AsyncMock(return_value=(0, 0))
+    mock_downloader.aclose = AsyncMock()
 
     with patch("scraper.auth.Client", return_value=mock_client), \
          patch("scraper.cli.parse_args", return_value=mock_config), \
-         patch("scraper.fetcher.asyncio.sleep", new_callable=AsyncMock), \
+         patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock), \
          patch("scraper.threads.asyncio.sleep", new_callable=AsyncMock), \
          patch("scraper.media.MediaDownloader", return_value=mock_downloader):
         import scrape
@@ -169,10 +177,11 @@ async def test_end_to_end_with_media(tmp_path, capsys):
 
     mock_downloader = MagicMock()
     mock_downloader.download_all = AsyncMock(return_value=(1, 0))
+    mock_downloader.aclose = AsyncMock()
 
     with patch("scraper.auth.Client", return_value=mock_client), \
          patch("scraper.cli.parse_args", return_value=mock_config), \
-         patch("scraper.fetcher.asyncio.sleep", new_callable=AsyncMock), \
+         patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock), \
          patch("scraper.media.MediaDownloader", return_value=mock_downloader):
         import scrape
         importlib.reload(scrape)
@@ -218,11 +227,12 @@ async def test_end_to_end_resumability(tmp_path, capsys):
 
     mock_downloader = MagicMock()
     mock_downloader.download_all = AsyncMock(return_value=(0, 0))
+    mock_downloader.aclose = AsyncMock()
 
     # First run
     with patch("scraper.auth.Client", return_value=mock_client), \
          patch("scraper.cli.parse_args", return_value=mock_config), \
-         patch("scraper.fetcher.asyncio.sleep", new_callable=AsyncMock), \
+         patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock), \
          patch("scraper.media.MediaDownloader", return_value=mock_downloader):
         import scrape
         importlib.reload(scrape)
@@ -244,7 +254,7 @@ async def test_end_to_end_resumability(tmp_path, capsys):
 
     with patch("scraper.auth.Client", return_value=mock_client), \
          patch("scraper.cli.parse_args", return_value=mock_config), \
-         patch("scraper.fetcher.asyncio.sleep", new_callable=AsyncMock), \
+         patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock), \
          patch("scraper.media.MediaDownloader", return_value=mock_downloader):
         importlib.reload(scrape)
         await scrape.main()
@@ -253,6 +263,128 @@ async def test_end_to_end_resumability(tmp_path, capsys):
     assert "Skipped 1 existing markdown files" in output
 
 
+@pytest.mark.asyncio
+async def test_fetch_failure_saves_progress(tmp_path, capsys):
+    """Pages committed before a fetch error are checkpointed before exiting."""
+    output_dir = str(tmp_path / "bookmarks")
+
+    mock_config = Config(
+        output=output_dir,
+        username="user1",
+        email="e@mail.com",
+        password="pass123",
+    )
+
+    mock_result = make_mock_result([make_mock_tweet(id="123")])
+    mock_result.cursor = "scroll:page1"
+    mock_result.next = AsyncMock(side_effect=RuntimeError("connection reset"))
+
+    mock_client = MagicMock()
+    mock_client.login = AsyncMock()
+    mock_client.save_cookies = MagicMock()
+    mock_client.get_bookmarks = AsyncMock(return_value=mock_result)
+
+    mock_downloader = MagicMock()
+    mock_downloader.download_all = AsyncMock(return_value=(0, 0))
+    mock_downloader.aclose = AsyncMock()
+
+    with patch("scraper.auth.Client", return_value=mock_client), \
+         patch("scraper.cli.parse_args", return_value=mock_config), \
+         patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock), \
+         patch("scraper.media.MediaDownloader", return_value=mock_downloader):
+        import scrape
+        importlib.reload(scrape)
+        with pytest.raises(SystemExit):
+            await scrape.main()
+
+    with open(os.path.join(output_dir, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    assert manifest["cursor"] == "scroll:page1"
+    assert "123" in manifest["scraped_ids"]
+    assert not os.path.exists(os.path.join(output_dir, "manifest.journal"))
+    assert "Failed to fetch bookmarks" in capsys.readouterr().err
+
+
+@pytest.mark.asyncio
+async def test_cancel_checkpoints_committed_pages(tmp_path, capsys):
+    """Cancelling the run, as Ctrl-C and SIGTERM do, still checkpoints
+    every committed page and writes metrics.json."""
+    output_dir = str(tmp_path / "bookmarks")
+    mock_config = Config(output=output_dir, username="user1", email="e@mail.com", password="pass123")
+
+    async def next_page():
+        await asyncio.Event().wait()  # the second page never arrives
+
+    mock_result = make_mock_result([make_mock_tweet(id="123")])
+    mock_result.cursor = "scroll:page1"
+    mock_result.next = AsyncMock(side_effect=next_page)
+
+    mock_client = MagicMock()
+    mock_client.login = AsyncMock()
+    mock_client.save_cookies = MagicMock()
+    mock_client.get_bookmarks = AsyncMock(return_value=mock_result)
+
+    mock_downloader = MagicMock()
+    mock_downloader.download_all = AsyncMock(return_value=(0, 0))
+    mock_downloader.aclose = AsyncMock()
+
+    with patch("scraper.auth.Client", return_value=mock_client), \
+         patch("scraper.cli.parse_args", return_value=mock_config), \
+         patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock), \
+         patch("scraper.media.MediaDownloader", return_value=mock_downloader):
+        import scrape
+        importlib.reload(scrape)
+        task = asyncio.create_task(scrape.main())
+        # Wait for page 1 to be committed to the journal, mid-run
+        journal = os.path.join(output_dir, "manifest.journal")
+        for _ in range(200):
+            if os.path.isfile(journal):
+                break
+            await _real_sleep(0.01)
+        assert not task.done()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    with open(os.path.join(output_dir, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    assert manifest["cursor"] == "scroll:page1"
+    assert "123" in manifest["scraped_ids"]
+    assert not os.path.exists(journal)
+    assert os.path.isfile(os.path.join(output_dir, "metrics.json"))
+    mock_downloader.close.assert_called_once()
+    assert "Interrupted, saving progress" in capsys.readouterr().err
+
+
+@pytest.mark.asyncio
+async def test_failed_queued_write_still_closes_and_writes_metrics(tmp_path):
+    output_dir = str(tmp_path / "bookmarks")
+    mock_config = Config(output=output_dir, username="user1", email="e@mail.com", password="pass123")
+
+    mock_client = MagicMock()
+    mock_client.login = AsyncMock()
+    mock_client.save_cookies = MagicMock()
+    mock_client.get_bookmarks = AsyncMock(return_value=make_mock_result([make_mock_tweet(id="123")]))
+
+    mock_downloader = MagicMock()
+    mock_downloader.download_all = AsyncMock(return_value=(0, 0))
+    mock_downloader.aclose = AsyncMock()
+
+    with patch("scraper.auth.Client", return_value=mock_client), \
+         patch("scraper.cli.parse_args", return_value=mock_config), \
+         patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock), \
+         patch("scraper.media.MediaDownloader", return_value=mock_downloader), \
+         patch("scraper.diskio.DiskIO.drain", AsyncMock(side_effect=OSError("disk full"))):
+        import scrape
+        importlib.reload(scrape)
+        with pytest.raises(OSError, match="disk full"):
+            await scrape.main()
+
+    assert os.path.isfile(os.path.join(output_dir, "metrics.json"))
+    mock_downloader.aclose.assert_awaited_once()
+    mock_downloader.close.assert_called_once()
+
+
 @pytest.mark.asyncio
 async def test_end_to_end_skip_existing_markdown(tmp_path, capsys):
     """Pre-create a markdown file; verify the scraper doesn't overwrite it."""
@@ -282,10 +414,11 @@ async def test_end_to_end_skip_existing_markdown(tmp_path, capsys):
 
     mock_downloader = MagicMock()
     mock_downloader.download_all = AsyncMock(return_value=(0, 0))
+    mock_downloader.aclose = AsyncMock()
 
     with patch("scraper.auth.Client", return_value=mock_client), \
          patch("scraper.cli.parse_args", return_value=mock_config), \
-         patch("scraper.fetcher.asyncio.sleep", new_callable=AsyncMock), \
+         patch("scraper.ratelimit.asyncio.sleep", new_callable=AsyncMock), \
          patch("scraper.media.MediaDownloader", return_value=mock_downloader):
         import scrape
         importlib.reload(scrape)
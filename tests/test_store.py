@@ -0,0 +1,61 @@
+import os
+
+from scraper.store import MediaStore, normalize_url
+
+
+def write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def test_normalize_url():
+    assert normalize_url("HTTPS://PBS.twimg.com/media/a.jpg?name=orig&format=jpg#x") == \
+        "https://pbs.twimg.com/media/a.jpg?format=jpg&name=orig"
+    assert normalize_url("https://video.twimg.com/v.mp4?tag=12") == "https://video.twimg.com/v.mp4"
+
+
+def test_add_and_lookup(tmp_path):
+    store = MediaStore(str(tmp_path))
+    part = os.path.join(str(tmp_path), "1_0.jpg.part")
+    write(part, b"image")
+
+    blob = store.add("https://pbs.twimg.com/a.jpg", part, "ab" + "0" * 62)
+
+    assert not os.path.exists(part)
+    assert blob.endswith(".jpg")
+    assert store.lookup("https://PBS.twimg.com/a.jpg") == blob
+    assert store.lookup("https://pbs.twimg.com/b.jpg") is None
+    store.close()
+
+
+def test_index_persists(tmp_path):
+    store = MediaStore(str(tmp_path))
+    part = os.path.join(str(tmp_path), "1_0.jpg.part")
+    write(part, b"image")
+    blob = store.add("https://pbs.twimg.com/a.jpg", part, "cd" + "0" * 62)
+    store.close()
+
+    assert MediaStore(str(tmp_path)).lookup("https://pbs.twimg.com/a.jpg") == blob
+
+
+def test_identical_bytes_share_one_blob(tmp_path):
+    store = MediaStore(str(tmp_path))
+    digest = "ef" + "0" * 62
+    for name, url in (("1_0.jpg.part", "https://a/1.jpg"), ("2_0.jpg.part", "https://a/2.jpg")):
+        part = os.path.join(str(tmp_path), name)
+        write(part, b"same")
+        store.add(url, part, digest)
+
+    assert store.lookup("https://a/1.jpg") == store.lookup("https://a/2.jpg")
+    assert os.listdir(os.path.join(store.root, "ef")) == [digest + ".jpg"]
+    store.close()
+
+
+def test_link_creates_hardlink(tmp_path):
+    blob = os.path.join(str(tmp_path), "blob.jpg")
+    write(blob, b"data")
+    dest = os.path.join(str(tmp_path), "1_0.jpg")
+
+    MediaStore.link(blob, dest)
+
+    assert os.path.samefile(blob, dest)
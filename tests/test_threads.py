@@ -3,7 +3,8 @@ from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
-from scraper.threads import ThreadResolver, _tweet_to_dict, _placeholder
+from scraper.models import Tweet
+from scraper.threads import ThreadResolver
 
 
 def make_bookmark(**overrides):
@@ -16,13 +17,10 @@ def make_bookmark(**overrides):
         "likes": 10,
         "retweets": 5,
         "replies": 2,
-        "url": "https://x.com/testuser/status/100",
-        "has_media": False,
-        "is_reply": True,
         "in_reply_to": "99",
     }
     defaults.update(overrides)
-    return defaults
+    return Tweet(**defaults)
 
 
 def make_mock_tweet(id="99", text="Parent tweet", name="Parent",
@@ -44,11 +42,19 @@ def make_mock_tweet(id="99", text="Parent tweet", name="Parent",
     return tweet
 
 
+def detail_client(*tweets):
+    """A client whose get_tweet_by_id answers from the given mock tweets."""
+    by_id = {t.id: t for t in tweets}
+    client = MagicMock()
+    client.get_tweet_by_id = AsyncMock(side_effect=lambda tweet_id: by_id[tweet_id])
+    return client
+
+
 @pytest.mark.asyncio
 async def test_non_reply_returns_single():
     client = MagicMock()
     resolver = ThreadResolver(client)
-    bm = make_bookmark(in_reply_to=None, is_reply=False)
+    bm = make_bookmark(in_reply_to=None)
 
     result = await resolver.resolve(bm)
 
@@ -59,17 +65,10 @@ async def test_non_reply_returns_single():
 @pytest.mark.asyncio
 async def test_reply_resolves_via_reply_to():
     root_tweet = make_mock_tweet(id="98", text="Root", in_reply_to=None)
-    parent_tweet = make_mock_tweet(id="99", text="Parent", in_reply_to="98")
-
-    # The bookmarked tweet object has reply_to with parent chain
-    bookmark_tweet_obj = make_mock_tweet(
-        id="100", text="Reply tweet",
-        in_reply_to="99",
-        reply_to=[root_tweet, parent_tweet],
-    )
-
-    client = MagicMock()
-    client.get_tweet_by_id = AsyncMock(return_value=bookmark_tweet_obj)
+    # The parent's TweetDetail carries the rest of the chain in reply_to
+    parent_tweet = make_mock_tweet(id="99", text="Parent", in_reply_to="98",
+                                   reply_to=[root_tweet])
+    client = detail_client(parent_tweet)
 
     resolver = ThreadResolver(client)
     bm = make_bookmark()
@@ -78,28 +77,20 @@ async def test_reply_resolves_via_reply_to():
         result = await resolver.resolve(bm)
 
     assert len(result) == 3
-    assert result[0]["id"] == "98"
-    assert result[0]["text"] == "Root"
-    assert result[1]["id"] == "99"
-    assert result[1]["text"] == "Parent"
+    assert result[0].id == "98"
+    assert result[0].text == "Root"
+    assert result[1].id == "99"
+    assert result[1].text == "Parent"
     assert result[2] == bm
+    client.get_tweet_by_id.assert_called_once_with("99")
 
 
 @pytest.mark.asyncio
 async def test_fallback_manual_walk():
-    """When reply_to is empty, walk in_reply_to chain manually."""
-    bookmark_tweet_obj = make_mock_tweet(
-        id="100", text="Reply",
-        in_reply_to="99",
-        reply_to=[],  # empty — triggers fallback
-    )
-    parent_tweet_obj = make_mock_tweet(
-        id="99", text="Parent",
-        in_reply_to=None,
-    )
-
-    client = MagicMock()
-    client.get_tweet_by_id = AsyncMock(side_effect=[bookmark_tweet_obj, parent_tweet_obj])
+    """Without reply_to, the walk fetches one ancestor per request."""
+    parent_tweet_obj = make_mock_tweet(id="99", text="Parent", in_reply_to="98", reply_to=[])
+    root_tweet_obj = make_mock_tweet(id="98", text="Root", in_reply_to=None, reply_to=[])
+    client = detail_client(parent_tweet_obj, root_tweet_obj)
 
     resolver = ThreadResolver(client)
     bm = make_bookmark()
@@ -107,56 +98,41 @@ async def test_fallback_manual_walk():
     with patch("scraper.threads.asyncio.sleep", new_callable=AsyncMock):
         result = await resolver.resolve(bm)
 
-    assert len(result) == 2
-    assert result[0]["id"] == "99"
-    assert result[1] == bm
+    assert [t.id for t in result] == ["98", "99", "100"]
+    assert result[2] == bm
+    assert client.get_tweet_by_id.call_count == 2
 
 
 @pytest.mark.asyncio
 async def test_cache_hit():
     """Second resolve for same parent doesn't re-fetch."""
     root_tweet = make_mock_tweet(id="98", text="Root", in_reply_to=None)
-    parent_tweet = make_mock_tweet(id="99", text="Parent", in_reply_to="98")
-
-    tweet_obj = make_mock_tweet(
-        id="100", reply_to=[root_tweet, parent_tweet], in_reply_to="99",
-    )
-    tweet_obj2 = make_mock_tweet(
-        id="200", reply_to=[root_tweet, parent_tweet], in_reply_to="99",
-    )
-
-    client = MagicMock()
-    client.get_tweet_by_id = AsyncMock(side_effect=[tweet_obj, tweet_obj2])
+    parent_tweet = make_mock_tweet(id="99", text="Parent", in_reply_to="98",
+                                   reply_to=[root_tweet])
+    client = detail_client(parent_tweet)
 
     resolver = ThreadResolver(client)
     bm1 = make_bookmark(id="100")
-    bm2 = make_bookmark(id="200", url="https://x.com/testuser/status/200")
+    bm2 = make_bookmark(id="200")
 
     with patch("scraper.threads.asyncio.sleep", new_callable=AsyncMock):
         r1 = await resolver.resolve(bm1)
         r2 = await resolver.resolve(bm2)
 
     # Both resolved, parents came from cache on second call
-    assert r1[0]["id"] == "98"
-    assert r2[0]["id"] == "98"
-    # Same dict objects from cache
+    assert r1[0].id == "98"
+    assert r2[0].id == "98"
+    # Same objects from cache
     assert r1[0] is r2[0]
+    assert client.get_tweet_by_id.call_count == 1
 
 
 @pytest.mark.asyncio
 async def test_deleted_parent_placeholder():
     from twikit.errors import TweetNotAvailable
 
-    bookmark_tweet_obj = make_mock_tweet(
-        id="100", text="Reply",
-        in_reply_to="99",
-        reply_to=[],  # fallback path
-    )
-
     client = MagicMock()
-    client.get_tweet_by_id = AsyncMock(
-        side_effect=[bookmark_tweet_obj, TweetNotAvailable("gone")]
-    )
+    client.get_tweet_by_id = AsyncMock(side_effect=TweetNotAvailable("gone"))
 
     resolver = ThreadResolver(client)
     bm = make_bookmark()
@@ -165,8 +141,8 @@ async def test_deleted_parent_placeholder():
         result = await resolver.resolve(bm)
 
     assert len(result) == 2
-    assert result[0]["text"] == "[Tweet unavailable]"
-    assert result[0]["id"] == "99"
+    assert result[0].text == "[Tweet unavailable]"
+    assert result[0].id == "99"
     assert result[1] == bm
 
 
@@ -177,16 +153,11 @@ async def test_rate_limit_backoff():
     reset_time = int(time.time()) + 10
     error = TooManyRequests("rate limited", headers={"x-rate-limit-reset": str(reset_time)})
 
-    bookmark_tweet_obj = make_mock_tweet(
-        id="100", reply_to=[], in_reply_to="99",
-    )
     parent_tweet_obj = make_mock_tweet(id="99", in_reply_to=None)
 
     client = MagicMock()
-    # First call succeeds (get bookmark tweet), second call (get parent) hits 429 then succeeds
-    client.get_tweet_by_id = AsyncMock(
-        side_effect=[bookmark_tweet_obj, error, parent_tweet_obj]
-    )
+    # The parent lookup hits 429 once, then succeeds
+    client.get_tweet_by_id = AsyncMock(side_effect=[error, parent_tweet_obj])
 
     resolver = ThreadResolver(client)
     bm = make_bookmark()
@@ -198,3 +169,243 @@ async def test_rate_limit_backoff():
     # Verify backoff sleep was called
     sleep_args = [call.args[0] for call in mock_sleep.call_args_list]
     assert any(s > 2 for s in sleep_args)
+
+
+@pytest.mark.asyncio
+async def test_resolve_many_fetches_a_shared_parent_once():
+    """Two replies to the same tweet are planned into one lookup."""
+    import asyncio
+
+    tweets = {"99": make_mock_tweet(id="99", text="Parent", in_reply_to=None)}
+    calls = []
+
+    async def get_tweet_by_id(tweet_id):
+        calls.append(tweet_id)
+        await asyncio.sleep(0.01)
+        return tweets[tweet_id]
+
+    client = MagicMock()
+    client.get_tweet_by_id = AsyncMock(side_effect=get_tweet_by_id)
+
+    resolver = ThreadResolver(client, concurrency=4)
+    bm1 = make_bookmark(id="100")
+    bm2 = make_bookmark(id="200")
+
+    threads = await resolver.resolve_many([bm1, bm2])
+
+    assert calls == ["99"]
+    assert resolver.derived == 1
+    assert [t.id for t in threads["100"]] == ["99", "100"]
+    assert [t.id for t in threads["200"]] == ["99", "200"]
+    assert threads["100"][0] is threads["200"][0]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_of_one_tweet_are_coalesced():
+    import asyncio
+
+    calls = []
+
+    async def get_tweet_by_id(tweet_id):
+        calls.append(tweet_id)
+        await asyncio.sleep(0.01)
+        return make_mock_tweet(id="99", in_reply_to=None)
+
+    client = MagicMock()
+    client.get_tweet_by_id = AsyncMock(side_effect=get_tweet_by_id)
+
+    resolver = ThreadResolver(client)
+    results = await asyncio.gather(resolver.resolve(make_bookmark(id="100")),
+                                   resolver.resolve(make_bookmark(id="200")))
+
+    assert calls == ["99"]
+    assert resolver.coalesced == 1
+    assert results[0][0] is results[1][0]
+
+
+@pytest.mark.asyncio
+async def test_resolve_many_derives_chains_from_the_batch():
+    """Replies to other bookmarks, or to cached tweets, need no request."""
+    root = make_mock_tweet(id="1", text="Root", in_reply_to=None)
+    client = detail_client(make_mock_tweet(id="2", in_reply_to="1", reply_to=[root]))
+
+    resolver = ThreadResolver(client)
+    page = [
+        make_bookmark(id="10", in_reply_to=None),   # a plain bookmark
+        make_bookmark(id="11", in_reply_to="10"),   # replies to it
+        make_bookmark(id="12", in_reply_to="11"),   # and deeper
+        make_bookmark(id="3", in_reply_to="2"),     # needs tweet 2 once
+        make_bookmark(id="4", in_reply_to="3"),     # then derives from 3
+    ]
+    threads = await resolver.resolve_many(page)
+
+    assert [t.id for t in threads["12"]] == ["10", "11", "12"]
+    assert [t.id for t in threads["4"]] == ["1", "2", "3", "4"]
+    assert "10" not in threads
+    client.get_tweet_by_id.assert_called_once_with("2")
+    assert resolver.derived == 3
+
+
+@pytest.mark.asyncio
+async def test_resolve_many_keeps_only_thread_members():
+    resolver = ThreadResolver(MagicMock())
+    page = [
+        make_bookmark(id="10", in_reply_to=None),   # an ancestor of 11
+        make_bookmark(id="11", in_reply_to="10"),
+        make_bookmark(id="20", in_reply_to=None),   # in no thread
+    ]
+    threads = await resolver.resolve_many(page)
+
+    assert [t.id for t in threads["11"]] == ["10", "11"]
+    assert set(resolver._cache) == {"10", "11"}
+
+
+@pytest.mark.asyncio
+async def test_resolve_many_runs_concurrently():
+    import asyncio
+
+    active = 0
+    peak = 0
+
+    async def get_tweet_by_id(tweet_id):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        parent = make_mock_tweet(id=f"p{tweet_id}")
+        return make_mock_tweet(id=tweet_id, reply_to=[parent], in_reply_to=f"p{tweet_id}")
+
+    client = MagicMock()
+    client.get_tweet_by_id = AsyncMock(side_effect=get_tweet_by_id)
+
+    resolver = ThreadResolver(client, concurrency=3)
+    bookmarks = [make_bookmark(id=str(i), in_reply_to=f"p{i}") for i in range(6)]
+    progress = []
+
+    threads = await resolver.resolve_many(
+        bookmarks, on_progress=lambda i, total: progress.append((i, total)),
+    )
+
+    assert len(threads) == 6
+    assert peak == 3
+    assert progress[-1] == (6, 6)
+
+
+@pytest.mark.asyncio
+async def test_resolve_many_reports_failures():
+    client = MagicMock()
+    client.get_tweet_by_id = AsyncMock(side_effect=RuntimeError("boom"))
+
+    resolver = ThreadResolver(client)
+    threads = await resolver.resolve_many([make_bookmark(id="100")])
+
+    assert threads == {}
+
+
+@pytest.mark.asyncio
+async def test_persistent_cache_skips_parent_fetch(tmp_path):
+    from scraper.cache import TweetCache
+
+    cache = TweetCache.in_output(str(tmp_path))
+    cache.put("99", Tweet.from_twikit(make_mock_tweet(id="99", text="Cached parent")))
+
+    client = MagicMock()
+    client.get_tweet_by_id = AsyncMock()
+
+    resolver = ThreadResolver(client, cache=cache)
+    result = await resolver.resolve(make_bookmark())
+
+    assert [t.id for t in result] == ["99", "100"]
+    assert result[0].text == "Cached parent"
+    # The whole chain was known, so not even the bookmark is fetched
+    client.get_tweet_by_id.assert_not_called()
+    assert cache.hits == 1
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_fetched_parents_are_persisted(tmp_path):
+    from scraper.cache import TweetCache
+
+    cache = TweetCache.in_output(str(tmp_path))
+    root_tweet = make_mock_tweet(id="98", text="Root", in_reply_to=None)
+    client = detail_client(make_mock_tweet(id="99", in_reply_to="98", reply_to=[root_tweet]))
+
+    resolver = ThreadResolver(client, cache=cache)
+    await resolver.resolve(make_bookmark())
+    cache.close()
+
+    reopened = TweetCache.in_output(str(tmp_path))
+    assert reopened.get("98").text == "Root"
+    assert reopened.get("99").id == "99"
+    assert reopened.get("100").id == "100"
+    reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_truncated_ancestors_continue_with_a_conversation_fetch():
+    """When TweetDetail returns only the nearest ancestors, the next request
+    is for the oldest missing one, whose response carries the rest."""
+    tweets = {str(i): make_mock_tweet(id=str(i), in_reply_to=str(i - 1) if i > 1 else None)
+              for i in range(1, 7)}
+    client = detail_client(
+        make_mock_tweet(id="6", in_reply_to="5", reply_to=[tweets["4"], tweets["5"]]),
+        make_mock_tweet(id="3", in_reply_to="2", reply_to=[tweets["1"], tweets["2"]]),
+    )
+
+    resolver = ThreadResolver(client)
+    result = await resolver.resolve(make_bookmark(in_reply_to="6"))
+
+    assert [t.id for t in result] == ["1", "2", "3", "4", "5", "6", "100"]
+    assert [c.args[0] for c in client.get_tweet_by_id.call_args_list] == ["6", "3"]
+    # Hop by hop, ancestors 1, 2, 4 and 5 would each have cost a request
+    assert resolver.calls_saved == 4
+    assert resolver.threads == 1
+
+
+@pytest.mark.asyncio
+async def test_saved_calls_count_once_per_cached_ancestor():
+    root = make_mock_tweet(id="97", in_reply_to=None)
+    grandparent = make_mock_tweet(id="98", in_reply_to="97")
+    client = detail_client(
+        make_mock_tweet(id="99", in_reply_to="98", reply_to=[root, grandparent]),
+    )
+
+    resolver = ThreadResolver(client)
+    await resolver.resolve(make_bookmark(id="100"))
+    await resolver.resolve(make_bookmark(id="200"))
+
+    # The second thread's ancestors would have been cache hits anyway
+    assert resolver.calls_saved == 2
+    assert resolver.threads == 2
+
+
+@pytest.mark.asyncio
+async def test_self_thread_is_cached_in_bulk(tmp_path):
+    from scraper.cache import TweetCache
+
+    cache = TweetCache.in_output(str(tmp_path))
+    continuation = make_mock_tweet(id="101", in_reply_to="99")
+    detail = make_mock_tweet(id="99", in_reply_to="98",
+                             reply_to=[make_mock_tweet(id="98", in_reply_to=None)])
+    detail.thread = [continuation]
+    client = detail_client(detail)
+
+    resolver = ThreadResolver(client, cache=cache)
+    await resolver.resolve(make_bookmark())
+
+    assert cache.get("101").in_reply_to == "99"
+    assert cache.get("98") is not None
+    cache.close()
+
+
+def test_from_twikit_applies_policy():
+    from scraper.quality import MediaPolicy
+
+    photo = MagicMock(type="photo", media_url="https://pbs.twimg.com/media/p.jpg")
+    tweet = make_mock_tweet(id="99")
+    tweet.media = [photo]
+
+    record = Tweet.from_twikit(tweet, MediaPolicy(photo_size="orig"))
+    assert record.media[0].url == "https://pbs.twimg.com/media/p.jpg?name=orig"
@@ -1,6 +1,10 @@
 import json
 import os
+from unittest.mock import patch
 
+import pytest
+
+from scraper.diskio import DiskIO
 from scraper.tracker import ProgressTracker
 
 
@@ -68,3 +72,170 @@ def test_cursor_defaults_none(tmp_path):
     tracker = ProgressTracker(str(tmp_path))
     tracker.load()
     assert tracker.get_cursor() is None
+
+
+def test_high_water_persists(tmp_path):
+    tracker = ProgressTracker(str(tmp_path))
+    tracker.load()
+    assert tracker.get_high_water() is None
+    tracker.save_high_water("1770000000000000000")
+    tracker.save()
+
+    tracker2 = ProgressTracker(str(tmp_path))
+    tracker2.load()
+    assert tracker2.get_high_water() == "1770000000000000000"
+
+
+def test_progress_survives_without_save(tmp_path):
+    """mark_scraped/save_cursor are journaled immediately, so a crash before
+    save() loses nothing."""
+    tracker = ProgressTracker(str(tmp_path))
+    tracker.load()
+    tracker.mark_scraped("123")
+    tracker.save_cursor("scroll:abc")
+    tracker.close()
+
+    tracker2 = ProgressTracker(str(tmp_path))
+    tracker2.load()
+    assert tracker2.is_scraped("123")
+    assert tracker2.get_cursor() == "scroll:abc"
+
+
+def test_journal_ignores_torn_last_line(tmp_path):
+    tracker = ProgressTracker(str(tmp_path))
+    tracker.load()
+    tracker.mark_scraped("1")
+    tracker.close()
+    with open(os.path.join(str(tmp_path), "manifest.journal"), "a") as f:
+        f.write('{"id": "2"')
+
+    tracker2 = ProgressTracker(str(tmp_path))
+    tracker2.load()
+    assert tracker2.is_scraped("1")
+    assert not tracker2.is_scraped("2")
+
+
+def test_save_compacts_journal(tmp_path):
+    tracker = ProgressTracker(str(tmp_path))
+    tracker.load()
+    tracker.mark_scraped("1")
+    tracker.save()
+
+    assert not os.path.exists(os.path.join(str(tmp_path), "manifest.journal"))
+    with open(os.path.join(str(tmp_path), "manifest.json")) as f:
+        assert json.load(f)["scraped_ids"] == ["1"]
+
+    # Journaling resumes after compaction
+    tracker.mark_scraped("2")
+    tracker.close()
+    tracker2 = ProgressTracker(str(tmp_path))
+    tracker2.load()
+    assert tracker2.is_scraped("1") and tracker2.is_scraped("2")
+
+
+def test_auto_compaction(tmp_path):
+    tracker = ProgressTracker(str(tmp_path), compact_every=3)
+    tracker.load()
+    for i in range(3):
+        tracker.mark_scraped(str(i))
+
+    assert not os.path.exists(os.path.join(str(tmp_path), "manifest.journal"))
+    with open(os.path.join(str(tmp_path), "manifest.json")) as f:
+        assert sorted(json.load(f)["scraped_ids"]) == ["0", "1", "2"]
+
+
+def test_loads_legacy_manifest(tmp_path):
+    with open(os.path.join(str(tmp_path), "manifest.json"), "w") as f:
+        json.dump({"scraped_ids": ["1", "2"], "cursor": "scroll:old"}, f, indent=2)
+
+    tracker = ProgressTracker(str(tmp_path))
+    tracker.load()
+    assert tracker.is_scraped("1") and tracker.is_scraped("2")
+    assert tracker.get_cursor() == "scroll:old"
+    assert tracker.get_high_water() is None
+
+
+@pytest.mark.asyncio
+async def test_io_buffers_journal_until_flush(tmp_path):
+    io = DiskIO()
+    tracker = ProgressTracker(str(tmp_path), io=io)
+    await io.run(tracker.load)
+    tracker.mark_scraped("123")
+    tracker.save_cursor("scroll:abc")
+    journal = tmp_path / "manifest.journal"
+    assert not journal.exists()
+
+    await tracker.flush()
+    await io.drain()
+    assert len(journal.read_text().splitlines()) == 2
+
+    await tracker.flush(compact=True)
+    assert not journal.exists()
+    io.close()
+
+    reloaded = ProgressTracker(str(tmp_path))
+    reloaded.load()
+    assert reloaded.is_scraped("123")
+    assert reloaded.get_cursor() == "scroll:abc"
+
+
+@pytest.mark.asyncio
+async def test_io_flush_compacts_after_threshold(tmp_path):
+    io = DiskIO()
+    tracker = ProgressTracker(str(tmp_path), compact_every=3, io=io)
+    await io.run(tracker.load)
+    for i in range(3):
+        tracker.mark_scraped(str(i))
+    await tracker.flush()
+    await io.drain()
+    io.close()
+
+    assert not (tmp_path / "manifest.journal").exists()
+    data = json.loads((tmp_path / "manifest.json").read_text())
+    assert sorted(data["scraped_ids"]) == ["0", "1", "2"]
+
+
+@pytest.mark.asyncio
+async def test_flush_checkpoints_every_n_pages(tmp_path):
+    tracker = ProgressTracker(str(tmp_path), checkpoint_pages=2, checkpoint_seconds=3600)
+    tracker.load()
+    manifest = tmp_path / "manifest.json"
+
+    tracker.save_cursor("page1")
+    await tracker.flush()
+    assert not manifest.exists()
+
+    tracker.save_cursor("page2")
+    await tracker.flush()
+    assert json.loads(manifest.read_text())["cursor"] == "page2"
+    assert not (tmp_path / "manifest.journal").exists()
+    assert tracker.checkpoints == 1
+
+
+@pytest.mark.asyncio
+async def test_flush_checkpoints_after_interval(tmp_path):
+    io = DiskIO()
+    with patch("scraper.tracker.time.monotonic", return_value=0.0):
+        tracker = ProgressTracker(str(tmp_path), io=io, checkpoint_seconds=30)
+    await io.run(tracker.load)
+
+    tracker.save_cursor("page1")
+    with patch("scraper.tracker.time.monotonic", return_value=10.0):
+        await tracker.flush()
+    tracker.save_cursor("page2")
+    with patch("scraper.tracker.time.monotonic", return_value=31.0):
+        await tracker.flush()
+    await io.drain()
+    io.close()
+
+    assert json.loads((tmp_path / "manifest.json").read_text())["cursor"] == "page2"
+    assert tracker.checkpoints == 1
+
+
+@pytest.mark.asyncio
+async def test_flush_without_changes_takes_no_checkpoint(tmp_path):
+    tracker = ProgressTracker(str(tmp_path), checkpoint_pages=1)
+    tracker.load()
+    await tracker.flush()
+    assert not (tmp_path / "manifest.json").exists()
+    assert tracker.checkpoints == 0
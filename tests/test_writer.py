@@ -0,0 +1,245 @@
+import asyncio
+import os
+from dataclasses import replace
+from unittest.mock import patch
+
+import pytest
+
+from scraper.layout import Layout, reshard
+from scraper.models import Media, Tweet
+from scraper.renderer import render_bookmark
+from scraper.writer import MarkdownWriter, RenderIndex
+
+
+def make_bookmark(id="123", handle="test", text="Hello"):
+    return Tweet(id=id, text=text, author=f"Test (@{handle})", handle=handle,
+                 created_at="2024-03-15", likes=10, retweets=5, replies=2)
+
+
+@pytest.mark.asyncio
+async def test_write_all_renders_files(tmp_path):
+    writer = MarkdownWriter(str(tmp_path), workers=2)
+    await writer.prepare()
+
+    items = [(make_bookmark(id=str(i), text=f"Tweet {i}"), None) for i in range(5)]
+    await writer.write_all(items)
+    writer.close()
+
+    assert writer.written == 5
+    for i in range(5):
+        with open(os.path.join(str(tmp_path), f"@test-{i}.md"), encoding="utf-8") as f:
+            assert f"Tweet {i}" in f.read()
+    assert writer.files_per_sec > 0
+
+
+@pytest.mark.asyncio
+async def test_files_per_sec_leaves_out_idle_time(tmp_path):
+    writer = MarkdownWriter(str(tmp_path))
+    await writer.prepare()
+    await writer.write_all([(make_bookmark(id="1"), None), (make_bookmark(id="2"), None)])
+    await asyncio.sleep(0.5)  # waiting on the next page
+    await writer.write_all([(make_bookmark(id="3"), None), (make_bookmark(id="4"), None)])
+    writer.close()
+
+    # Four small files take far less than the half second in between
+    assert writer.files_per_sec > 4 / 0.5
+
+
+@pytest.mark.asyncio
+async def test_write_all_includes_thread(tmp_path):
+    writer = MarkdownWriter(str(tmp_path))
+    await writer.prepare()
+
+    bm = make_bookmark(id="2", text="Reply")
+    thread = [make_bookmark(id="1", text="Root"), bm]
+    await writer.write_all([(bm, thread)])
+    writer.close()
+
+    with open(os.path.join(str(tmp_path), "@test-2.md"), encoding="utf-8") as f:
+        content = f.read()
+    assert "is_thread: true" in content
+    assert "Root" in content
+
+
+@pytest.mark.asyncio
+async def test_exists_uses_single_listing(tmp_path):
+    open(os.path.join(str(tmp_path), "@test-1.md"), "w").close()
+
+    writer = MarkdownWriter(str(tmp_path))
+    await writer.prepare()
+
+    with patch("os.path.isfile", side_effect=AssertionError("no per-file stat")), \
+         patch("os.path.exists", side_effect=AssertionError("no per-file stat")):
+        assert writer.exists(make_bookmark(id="1"))
+        assert not writer.exists(make_bookmark(id="2"))
+
+    await writer.write_all([(make_bookmark(id="2"), None)])
+    writer.close()
+    assert writer.exists(make_bookmark(id="2"))
+
+
+@pytest.mark.asyncio
+async def test_sharded_layout_writes_into_subfolders(tmp_path):
+    writer = MarkdownWriter(str(tmp_path), layout=Layout("handle"))
+    await writer.prepare()
+    await writer.write_all([(make_bookmark(id="1", handle="Alice"), None),
+                            (make_bookmark(id="2", handle="bob"), None)])
+    writer.close()
+    assert os.path.isfile(os.path.join(str(tmp_path), "alice", "@Alice-1.md"))
+    assert os.path.isfile(os.path.join(str(tmp_path), "bob", "@bob-2.md"))
+
+    # A fresh writer finds them in their shards
+    again = MarkdownWriter(str(tmp_path), layout=Layout("handle"))
+    await again.prepare()
+    assert again.exists(make_bookmark(id="1", handle="Alice"))
+    assert not again.exists(make_bookmark(id="3", handle="Alice"))
+    again.close()
+
+
+def with_counts(bookmark, likes):
+    return Tweet(id=bookmark.id, text=bookmark.text, author=bookmark.author,
+                 handle=bookmark.handle, created_at=bookmark.created_at,
+                 likes=likes, retweets=bookmark.retweets, replies=bookmark.replies)
+
+
+@pytest.mark.asyncio
+async def test_refresh_skips_unchanged_files(tmp_path):
+    writer = MarkdownWriter(str(tmp_path))
+    await writer.prepare()
+    await writer.write_all([(make_bookmark(id="1"), None)])
+
+    with patch("scraper.writer.open", side_effect=AssertionError("file touched")):
+        await writer.refresh_all([(make_bookmark(id="1"), None)])
+    writer.close()
+    assert (writer.unchanged, writer.refreshed, writer.rerendered) == (1, 0, 0)
+
+
+@pytest.mark.asyncio
+async def test_refresh_updates_frontmatter_and_keeps_body(tmp_path):
+    writer = MarkdownWriter(str(tmp_path))
+    await writer.prepare()
+    bm = make_bookmark(id="1")
+    await writer.write_all([(bm, None)])
+    path = os.path.join(str(tmp_path), "@test-1.md")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("My notes\n")
+
+    await writer.refresh_all([(with_counts(bm, likes=99), None)])
+    writer.close()
+
+    with open(path, encoding="utf-8") as f:
+        content = f.read()
+    assert "likes: 99" in content
+    assert content.endswith("My notes\n")
+    assert writer.refreshed == 1
+
+    # The new hashes are kept for the next run
+    again = MarkdownWriter(str(tmp_path))
+    await again.prepare()
+    await again.refresh_all([(with_counts(bm, likes=99), None)])
+    again.close()
+    assert again.unchanged == 1
+
+
+@pytest.mark.asyncio
+async def test_refresh_rerenders_changed_body(tmp_path):
+    writer = MarkdownWriter(str(tmp_path))
+    await writer.prepare()
+    bm = make_bookmark(id="2", text="Reply")
+    await writer.write_all([(bm, None)])
+
+    await writer.refresh_all([(bm, [make_bookmark(id="1", text="Root"), bm])])
+    writer.close()
+
+    with open(os.path.join(str(tmp_path), "@test-2.md"), encoding="utf-8") as f:
+        assert "Root" in f.read()
+    assert writer.rerendered == 1
+
+
+@pytest.mark.asyncio
+async def test_refresh_hashes_files_written_before_the_index(tmp_path):
+    bm = make_bookmark(id="1")
+    path = os.path.join(str(tmp_path), "@test-1.md")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(render_bookmark(bm))
+
+    writer = MarkdownWriter(str(tmp_path))
+    await writer.prepare()
+    await writer.refresh_all([(bm, None)])
+    await writer.refresh_all([(with_counts(bm, likes=11), None)])
+    writer.close()
+
+    assert (writer.unchanged, writer.refreshed) == (1, 1)
+    with open(path, encoding="utf-8") as f:
+        assert "likes: 11" in f.read()
+
+
+async def write_thread(tmp_path):
+    writer = MarkdownWriter(str(tmp_path))
+    await writer.prepare()
+    root = make_bookmark(id="1", text="Root")
+    bm = replace(make_bookmark(id="2", text="Reply"), in_reply_to="1")
+    await writer.write_all([(bm, [root, bm])])
+    return writer, bm, os.path.join(str(tmp_path), "@test-2.md")
+
+
+@pytest.mark.asyncio
+async def test_refresh_keeps_thread_when_resolution_fails(tmp_path):
+    writer, bm, path = await write_thread(tmp_path)
+
+    await writer.refresh_all([(replace(bm, likes=99), None)])
+    writer.close()
+
+    with open(path, encoding="utf-8") as f:
+        content = f.read()
+    assert "Root" in content
+    assert "is_thread: true" in content and "thread_length: 2" in content
+    assert "likes: 99" in content
+    assert (writer.refreshed, writer.rerendered) == (1, 0)
+
+
+@pytest.mark.asyncio
+async def test_refresh_keeps_thread_when_parent_was_deleted(tmp_path):
+    writer, bm, path = await write_thread(tmp_path)
+
+    await writer.refresh_all([(bm, [Tweet.placeholder("1"), bm])])
+    # Once the whole thread resolves again it can be re-rendered
+    await writer.refresh_all([(bm, [make_bookmark(id="1", text="Root, edited"), bm])])
+    writer.close()
+
+    with open(path, encoding="utf-8") as f:
+        assert "Root, edited" in f.read()
+    assert (writer.unchanged, writer.rerendered) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_refresh_after_reshard_keeps_edited_files(tmp_path):
+    output = str(tmp_path)
+    bookmarks = [
+        replace(make_bookmark(id=i), media=(Media("photo", f"https://example.com/{i}.jpg", f"{i}_0.jpg"),))
+        for i in ("1", "2")
+    ]
+    writer = MarkdownWriter(output)
+    await writer.prepare()
+    await writer.write_all([(bm, None) for bm in bookmarks])
+    writer.close()
+    with open(os.path.join(output, "@test-2.md"), "a", encoding="utf-8") as f:
+        f.write("My notes\n")
+    Layout("flat").save(output)
+
+    index = RenderIndex(output)
+    index.load()
+    reshard(output, Layout("date"), index=index)
+    index.close()
+
+    writer = MarkdownWriter(output, layout=Layout("date"))
+    await writer.prepare()
+    await writer.refresh_all([(bookmarks[0], None), (replace(bookmarks[1], likes=99), None)])
+    writer.close()
+
+    assert (writer.unchanged, writer.refreshed, writer.rerendered) == (1, 1, 0)
+    with open(os.path.join(output, "2024", "03", "@test-2.md"), encoding="utf-8") as f:
+        content = f.read()
+    assert "likes: 99" in content
+    assert Layout("date").media_link(bookmarks[1], "2_0.jpg") in content
+    assert content.endswith("My notes\n")